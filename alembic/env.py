@@ -15,7 +15,7 @@ from alembic import context
 
 # Add the project root to the Python path to find the models module
 sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__), '..')))
-from models import Base
+from models import Base, get_database_url
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -24,10 +24,11 @@ config = context.config
 # --- ADD THIS ---
 # Set the sqlalchemy.url from the environment variable
 # This ensures alembic uses the same database as your app
-db_url = os.getenv("DATABASE_URL")
-if not db_url:
-    raise ValueError("DATABASE_URL environment variable not set. Please check your .env file.")
-config.set_main_option('sqlalchemy.url', db_url)
+# (DATABASE_URL, or the Azure SQL URL built from the DB_* variables, as models.py does)
+db_url = get_database_url()
+config.set_main_option('sqlalchemy.url', db_url.replace('%', '%%'))
+# SQLite cannot ALTER most constraints in place; batch mode rebuilds the table instead.
+render_as_batch = db_url.startswith("sqlite")
 # --- END ADD ---
 
 
@@ -59,6 +60,7 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        render_as_batch=render_as_batch,
     )
 
     with context.begin_transaction():
@@ -80,7 +82,7 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata, render_as_batch=render_as_batch
         )
 
         with context.begin_transaction():
@@ -0,0 +1,79 @@
+"""Add inventoryitem_cost_index table
+
+Revision ID: 3f9a1c7d2b6e
+Revises: 24ab033290b5
+Create Date: 2026-10-16 09:12:41.518203
+
+"""
+from collections import Counter, defaultdict
+from decimal import Decimal
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9a1c7d2b6e'
+down_revision: Union[str, None] = '24ab033290b5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('inventoryitem_cost_index',
+    sa.Column('inventoryitem_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('total_landed_cost', sa.Numeric(precision=18, scale=6), nullable=False),
+    sa.Column('total_quantity_grams', sa.Numeric(precision=18, scale=3), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['inventoryitem_id'], ['inventoryitems.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('inventoryitem_id')
+    )
+    op.create_index(op.f('ix_inventoryitem_cost_index_user_id'), 'inventoryitem_cost_index', ['user_id'], unique=False)
+    backfill_cost_index()
+
+
+def backfill_cost_index() -> None:
+    """
+    Fills the index from the existing purchase history, as utils/cost_index.rebuild_cost_index does
+    (each line's landed cost is its item cost plus an equal share of its PO's shipping, rounded to
+    6 places), so costing and PO edits see complete totals straight after the upgrade. Uses its own
+    table definitions so later model changes cannot break this revision.
+    """
+    stock_additions = sa.table('stock_additions',
+        sa.column('purchase_order_id', sa.Integer()), sa.column('inventoryitem_id', sa.Integer()),
+        sa.column('item_cost', sa.Numeric(10, 2)), sa.column('quantity_added_grams', sa.Numeric(10, 3)))
+    purchase_orders = sa.table('purchase_orders',
+        sa.column('id', sa.Integer()), sa.column('user_id', sa.Integer()), sa.column('shipping_cost', sa.Numeric(10, 2)))
+    cost_index = sa.table('inventoryitem_cost_index',
+        sa.column('inventoryitem_id', sa.Integer()), sa.column('user_id', sa.Integer()),
+        sa.column('total_landed_cost', sa.Numeric(18, 6)), sa.column('total_quantity_grams', sa.Numeric(18, 3)))
+
+    lines = op.get_bind().execute(
+        sa.select(stock_additions.c.purchase_order_id, stock_additions.c.inventoryitem_id, purchase_orders.c.user_id,
+                  stock_additions.c.item_cost, stock_additions.c.quantity_added_grams, purchase_orders.c.shipping_cost)
+        .select_from(stock_additions.join(purchase_orders, stock_additions.c.purchase_order_id == purchase_orders.c.id))
+    ).all()
+    line_counts = Counter(po_id for po_id, *_ in lines)
+    totals = defaultdict(lambda: [None, Decimal('0.0'), Decimal('0.0')])
+    for po_id, item_id, user_id, item_cost, quantity, shipping_cost in lines:
+        shipping_share = (Decimal(str(shipping_cost or 0)) / line_counts[po_id]).quantize(Decimal('0.000001'))
+        entry = totals[item_id]
+        entry[0] = user_id
+        entry[1] += Decimal(str(item_cost)) + shipping_share
+        entry[2] += Decimal(str(quantity))
+    rows = [
+        {"inventoryitem_id": item_id, "user_id": user_id, "total_landed_cost": cost, "total_quantity_grams": quantity}
+        for item_id, (user_id, cost, quantity) in totals.items()
+    ]
+    if rows:
+        op.bulk_insert(cost_index, rows)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_inventoryitem_cost_index_user_id'), table_name='inventoryitem_cost_index')
+    op.drop_table('inventoryitem_cost_index')
@@ -0,0 +1,56 @@
+"""Add user-scoped composite and foreign key indexes
+
+Revision ID: 5d8f0b3c7a14
+Revises: c41d7a9e5f20
+Create Date: 2026-10-16 11:20:54.381906
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d8f0b3c7a14'
+down_revision: Union[str, None] = 'c41d7a9e5f20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_transactions_user_id_date', 'transactions', ['user_id', 'date'], unique=False)
+    op.create_index('ix_transactions_purchase_order_id', 'transactions', ['purchase_order_id'], unique=False)
+    op.create_index('ix_transactions_invoice_id', 'transactions', ['invoice_id'], unique=False)
+    op.create_index('ix_transaction_documents_transaction_id', 'transaction_documents', ['transaction_id'], unique=False)
+    op.create_index('ix_invoices_user_id_invoice_date', 'invoices', ['user_id', 'invoice_date'], unique=False)
+    op.create_index('ix_invoice_line_items_invoice_id', 'invoice_line_items', ['invoice_id'], unique=False)
+    op.create_index('ix_invoice_line_items_product_id', 'invoice_line_items', ['product_id'], unique=False)
+    op.create_index('ix_purchase_orders_user_id_order_date', 'purchase_orders', ['user_id', 'order_date'], unique=False)
+    op.create_index('ix_purchase_documents_purchase_order_id', 'purchase_documents', ['purchase_order_id'], unique=False)
+    op.create_index('ix_stock_additions_purchase_order_id', 'stock_additions', ['purchase_order_id'], unique=False)
+    op.create_index('ix_stock_additions_inventoryitem_id_remaining', 'stock_additions', ['inventoryitem_id', 'quantity_remaining_grams'], unique=False)
+    op.create_index('ix_product_production_tasks_product_id', 'product_production_tasks', ['product_id'], unique=False)
+    op.create_index('ix_product_shipping_tasks_product_id', 'product_shipping_tasks', ['product_id'], unique=False)
+    op.create_index('ix_production_runs_user_id_run_date', 'production_runs', ['user_id', 'run_date'], unique=False)
+    op.create_index('ix_batch_records_user_id_manufacturing_date', 'batch_records', ['user_id', 'manufacturing_date'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_batch_records_user_id_manufacturing_date', table_name='batch_records')
+    op.drop_index('ix_production_runs_user_id_run_date', table_name='production_runs')
+    op.drop_index('ix_product_shipping_tasks_product_id', table_name='product_shipping_tasks')
+    op.drop_index('ix_product_production_tasks_product_id', table_name='product_production_tasks')
+    op.drop_index('ix_stock_additions_inventoryitem_id_remaining', table_name='stock_additions')
+    op.drop_index('ix_stock_additions_purchase_order_id', table_name='stock_additions')
+    op.drop_index('ix_purchase_documents_purchase_order_id', table_name='purchase_documents')
+    op.drop_index('ix_purchase_orders_user_id_order_date', table_name='purchase_orders')
+    op.drop_index('ix_invoice_line_items_product_id', table_name='invoice_line_items')
+    op.drop_index('ix_invoice_line_items_invoice_id', table_name='invoice_line_items')
+    op.drop_index('ix_invoices_user_id_invoice_date', table_name='invoices')
+    op.drop_index('ix_transaction_documents_transaction_id', table_name='transaction_documents')
+    op.drop_index('ix_transactions_invoice_id', table_name='transactions')
+    op.drop_index('ix_transactions_purchase_order_id', table_name='transactions')
+    op.drop_index('ix_transactions_user_id_date', table_name='transactions')
@@ -0,0 +1,36 @@
+"""Add batch_code_counters table
+
+Revision ID: 8b2e4f61a9d3
+Revises: 3f9a1c7d2b6e
+Create Date: 2026-10-16 10:03:27.904611
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b2e4f61a9d3'
+down_revision: Union[str, None] = '3f9a1c7d2b6e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('batch_code_counters',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('prefix', sa.String(length=255), nullable=False),
+    sa.Column('date_str', sa.String(length=6), nullable=False),
+    sa.Column('last_seq', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'prefix', 'date_str')
+    )
+    # Counters are created lazily and seeded from existing batch codes, so no backfill is needed.
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('batch_code_counters')
@@ -0,0 +1,74 @@
+"""Add monthly_financial_rollups table
+
+Revision ID: 9e6a2c5d8f31
+Revises: 5d8f0b3c7a14
+Create Date: 2026-10-16 12:05:19.640258
+
+"""
+from collections import defaultdict
+from decimal import Decimal
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e6a2c5d8f31'
+down_revision: Union[str, None] = '5d8f0b3c7a14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('monthly_financial_rollups',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('year_month', sa.String(length=7), nullable=False),
+    sa.Column('transaction_type', sa.Enum('EXPENSE', 'SALE', 'DRAWING', 'CAPITAL_INJECTION', name='transaction_type_enum'), nullable=False),
+    sa.Column('category_id', sa.Integer(), nullable=True),
+    sa.Column('total_amount', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('transaction_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['category_id'], ['expense_categories.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'year_month', 'transaction_type', 'category_id', name='uq_monthly_financial_rollup')
+    )
+    op.create_index(op.f('ix_monthly_financial_rollups_id'), 'monthly_financial_rollups', ['id'], unique=False)
+    backfill_rollup()
+
+
+def backfill_rollup() -> None:
+    """
+    Fills the rollup from the existing transactions, as utils/financial_rollup.rebuild_financial_rollup
+    does, so reports read complete months straight after the upgrade. Uses its own table definitions so
+    later model changes cannot break this revision.
+    """
+    transactions = sa.table('transactions',
+        sa.column('user_id', sa.Integer()), sa.column('date', sa.Date()), sa.column('transaction_type', sa.String()),
+        sa.column('category_id', sa.Integer()), sa.column('amount', sa.Numeric(10, 2)))
+    rollups = sa.table('monthly_financial_rollups',
+        sa.column('user_id', sa.Integer()), sa.column('year_month', sa.String()), sa.column('transaction_type', sa.String()),
+        sa.column('category_id', sa.Integer()), sa.column('total_amount', sa.Numeric(14, 2)), sa.column('transaction_count', sa.Integer()))
+
+    totals = defaultdict(lambda: [Decimal('0.0'), 0])
+    result = op.get_bind().execution_options(yield_per=1000).execute(
+        sa.select(transactions.c.user_id, transactions.c.date, transactions.c.transaction_type, transactions.c.category_id, transactions.c.amount)
+    )
+    for user_id, t_date, t_type, category_id, amount in result:
+        entry = totals[(user_id, f"{t_date.year:04d}-{t_date.month:02d}", t_type, category_id)]
+        entry[0] += Decimal(str(amount))
+        entry[1] += 1
+    rows = [
+        {"user_id": user_id, "year_month": ym, "transaction_type": t_type, "category_id": category_id, "total_amount": total, "transaction_count": count}
+        for (user_id, ym, t_type, category_id), (total, count) in totals.items()
+    ]
+    if rows:
+        op.bulk_insert(rollups, rows)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_monthly_financial_rollups_id'), table_name='monthly_financial_rollups')
+    op.drop_table('monthly_financial_rollups')
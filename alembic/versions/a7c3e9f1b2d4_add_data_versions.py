@@ -0,0 +1,34 @@
+"""Add data_versions table
+
+Revision ID: a7c3e9f1b2d4
+Revises: 9e6a2c5d8f31
+Create Date: 2026-10-16 14:21:47.318604
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c3e9f1b2d4'
+down_revision: Union[str, None] = '9e6a2c5d8f31'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('data_versions',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('scope', sa.String(length=50), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'scope')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('data_versions')
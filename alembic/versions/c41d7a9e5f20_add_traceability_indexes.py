@@ -0,0 +1,32 @@
+"""Add traceability indexes on batch usages and supplier lot numbers
+
+Revision ID: c41d7a9e5f20
+Revises: 8b2e4f61a9d3
+Create Date: 2026-10-16 10:41:08.117392
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41d7a9e5f20'
+down_revision: Union[str, None] = '8b2e4f61a9d3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_batch_usages_stock_addition', 'batch_inventoryitem_usages', ['stock_addition_id'], unique=False, mssql_include=['batch_record_id', 'inventoryitem_id', 'quantity_used_grams'])
+    op.create_index('ix_batch_usages_batch_record', 'batch_inventoryitem_usages', ['batch_record_id'], unique=False, mssql_include=['stock_addition_id', 'inventoryitem_id', 'quantity_used_grams'])
+    op.create_index(op.f('ix_stock_additions_supplier_lot_number'), 'stock_additions', ['supplier_lot_number'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_stock_additions_supplier_lot_number'), table_name='stock_additions')
+    op.drop_index('ix_batch_usages_batch_record', table_name='batch_inventoryitem_usages')
+    op.drop_index('ix_batch_usages_stock_addition', table_name='batch_inventoryitem_usages')
@@ -1,9 +1,11 @@
 # app_pages/p10_sales_invoices.py
 import streamlit as st
 import pandas as pd
+import numpy as np
+from sqlalchemy import insert
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy.exc import IntegrityError
-from decimal import Decimal
+from decimal import Decimal, ROUND_HALF_UP
 import datetime
 import sys
 import os
@@ -11,6 +13,8 @@ import os
 # --- Boilerplate: Add project root to path ---
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from models import SessionLocal, User, Customer, Product, Invoice, InvoiceLineItem, InvoiceStatus
+from utils.data_versions import CUSTOMERS
+from utils.reference_cache import get_reference_options
 
 def initialize_state():
     """Initializes session state variables for the invoice page."""
@@ -35,6 +39,14 @@ def get_next_invoice_number(db: Session, user_id: int):
     except:
         return f"{last_invoice.invoice_number}-1"
 
+def get_invoice_list(db: Session, user_id: int):
+    """Rows for the invoice list (newest first), read as plain columns in one statement."""
+    rows = db.query(
+        Invoice.id, Invoice.invoice_number, Customer.name, Invoice.invoice_date, Invoice.total_amount, Invoice.status
+    ).outerjoin(Customer, Invoice.customer_id == Customer.id).filter(Invoice.user_id == user_id).order_by(Invoice.invoice_date.desc()).all()
+    return [{"id": inv_id, "Invoice #": number, "Customer": customer_name or "N/A", "Date": invoice_date, "Total": f"€{total:,.2f}", "Status": status.value}
+            for inv_id, number, customer_name, invoice_date, total, status in rows]
+
 def render_list_view(db: Session, user: User):
     """Displays the list of existing invoices and handles creation/selection."""
     st.subheader("Existing Invoices")
@@ -43,12 +55,11 @@ def render_list_view(db: Session, user: User):
         st.session_state.invoice_to_edit_id = None
         st.rerun()
 
-    invoices = db.query(Invoice).options(joinedload(Invoice.customer_ref)).filter(Invoice.user_id == user.id).order_by(Invoice.invoice_date.desc()).all()
-    if not invoices:
+    df_data = get_invoice_list(db, user.id)
+    if not df_data:
         st.info("No invoices found. Click the button above to create one.")
         return
 
-    df_data = [{"id": inv.id, "Invoice #": inv.invoice_number, "Customer": inv.customer_ref.name if inv.customer_ref else "N/A", "Date": inv.invoice_date, "Total": f"€{inv.total_amount:,.2f}", "Status": inv.status.value} for inv in invoices]
     df = pd.DataFrame(df_data)
     
     selection = st.dataframe(df, on_select="rerun", selection_mode="single-row", hide_index=True, use_container_width=True, column_config={"id": None, "Date": st.column_config.DateColumn("Date", format="YYYY-MM-DD")})
@@ -58,6 +69,29 @@ def render_list_view(db: Session, user: User):
         st.session_state.invoice_view_state = 'edit'
         st.rerun()
 
+LINE_ITEM_COLUMNS = ["Product", "Description", "Quantity", "Unit Price", "VAT %"]
+CENT = Decimal("0.01")
+
+def _hundredths(column: pd.Series) -> np.ndarray:
+    """An editor number column (stored with 2 decimal places) as exact integer hundredths; blanks count as 0."""
+    return np.rint(pd.to_numeric(column, errors="coerce").fillna(0).to_numpy(dtype=float) * 100).astype(np.int64)
+
+def price_line_items(line_items: pd.DataFrame):
+    """
+    Returns (lines, subtotal, vat) for the invoice editor's rows. lines holds the rows that are saved
+    (those with a description) with Quantity, Unit Price and VAT % as integer hundredths and Line Total
+    in ten-thousandths, so the totals are exact integer sums per column rather than a Decimal per cell.
+    VAT is summed per rate and multiplied out as Python ints, so only quantity x price has to fit in int64.
+    """
+    description = line_items["Description"]
+    lines = line_items[description.notna() & description.astype(str).str.strip().ne("")].copy()
+    for column in ("Quantity", "Unit Price", "VAT %"):
+        lines[column] = _hundredths(lines[column])
+    lines["Line Total"] = lines["Quantity"] * lines["Unit Price"]
+    subtotal = Decimal(int(lines["Line Total"].sum())).scaleb(-4)
+    vat = Decimal(sum(int(rate) * int(amount) for rate, amount in lines.groupby("VAT %")["Line Total"].sum().items())).scaleb(-8)
+    return lines, subtotal.quantize(CENT, rounding=ROUND_HALF_UP), vat.quantize(CENT, rounding=ROUND_HALF_UP)
+
 def render_form_view(db: Session, user: User):
     """Renders the form for creating or editing an invoice, including confirmation dialogs."""
     is_edit_mode = st.session_state.invoice_view_state == 'edit'
@@ -106,8 +140,7 @@ def render_form_view(db: Session, user: User):
     else:
         st.subheader("Create New Sales Invoice")
 
-    customers = db.query(Customer).filter(Customer.user_id == user.id).all()
-    customer_map = {c.name: c.id for c in customers}
+    customer_map = {name: customer_id for customer_id, name in get_reference_options(db, user.id, CUSTOMERS)}
     products = db.query(Product).filter(Product.user_id == user.id).all()
     product_map = {p.product_name: p for p in products}
 
@@ -123,10 +156,9 @@ def render_form_view(db: Session, user: User):
         st.markdown("---")
         st.markdown("#### Line Items")
         line_items_data = [{"Product": item.product_ref.product_name if item.product_ref else None, "Description": item.description, "Quantity": float(item.quantity), "Unit Price": float(item.unit_price), "VAT %": float(item.vat_rate_percent)} for item in invoice.line_items] if is_edit_mode and invoice else [{"Product": None, "Description": "", "Quantity": 1.0, "Unit Price": 0.0, "VAT %": 23.0}]
-        edited_df = st.data_editor(pd.DataFrame(line_items_data), num_rows="dynamic", use_container_width=True, hide_index=True, key="line_items_editor", column_config={"Product": st.column_config.SelectboxColumn("Product", options=list(product_map.keys()), required=False), "Description": st.column_config.TextColumn("Description*", required=True), "Quantity": st.column_config.NumberColumn("Quantity*", min_value=0, format="%.2f"), "Unit Price": st.column_config.NumberColumn("Unit Price (€)*", min_value=0, format="%.2f"), "VAT %": st.column_config.NumberColumn("VAT %", min_value=0, default=23.0, format="%.1f")})
+        edited_df = st.data_editor(pd.DataFrame(line_items_data, columns=LINE_ITEM_COLUMNS), num_rows="dynamic", use_container_width=True, hide_index=True, key="line_items_editor", column_config={"Product": st.column_config.SelectboxColumn("Product", options=list(product_map.keys()), required=False), "Description": st.column_config.TextColumn("Description*", required=True), "Quantity": st.column_config.NumberColumn("Quantity*", min_value=0, format="%.2f"), "Unit Price": st.column_config.NumberColumn("Unit Price (€)*", min_value=0, format="%.2f"), "VAT %": st.column_config.NumberColumn("VAT %", min_value=0, default=23.0, format="%.1f")})
         
-        subtotal = sum(Decimal(str(row.get("Quantity", 0))) * Decimal(str(row.get("Unit Price", 0))) for _, row in edited_df.iterrows())
-        vat = sum((Decimal(str(r.get("Quantity",0))) * Decimal(str(r.get("Unit Price",0)))) * (Decimal(str(r.get("VAT %",0))) / 100) for _, r in edited_df.iterrows())
+        lines, subtotal, vat = price_line_items(edited_df)
         total = subtotal + vat
         
         st.markdown("---")
@@ -146,10 +178,15 @@ def render_form_view(db: Session, user: User):
                     target.subtotal=subtotal; target.vat_amount=vat; target.total_amount=total;
                     transaction_db.flush()
                     transaction_db.query(InvoiceLineItem).filter(InvoiceLineItem.invoice_id == target.id).delete()
-                    for _, row in edited_df.iterrows():
-                        if row['Description']:
-                            prod_obj = product_map.get(row["Product"])
-                            transaction_db.add(InvoiceLineItem(invoice_id=target.id, product_id=prod_obj.id if prod_obj else None, description=row["Description"], quantity=Decimal(str(row["Quantity"])), unit_price=Decimal(str(row["Unit Price"])), vat_rate_percent=Decimal(str(row["VAT %"])), line_total=Decimal(str(row["Quantity"])) * Decimal(str(row["Unit Price"]))))
+                    product_ids = {name: p.id for name, p in product_map.items()}
+                    line_rows = [
+                        {"invoice_id": target.id, "product_id": product_ids.get(product), "description": description,
+                         "quantity": Decimal(int(quantity)).scaleb(-2), "unit_price": Decimal(int(unit_price)).scaleb(-2), "vat_rate_percent": Decimal(int(vat_rate)).scaleb(-2),
+                         "line_total": Decimal(int(line_total)).scaleb(-4).quantize(CENT, rounding=ROUND_HALF_UP)}
+                        for product, description, quantity, unit_price, vat_rate, line_total in zip(lines["Product"], lines["Description"], lines["Quantity"], lines["Unit Price"], lines["VAT %"], lines["Line Total"])
+                    ]
+                    if line_rows:
+                        transaction_db.execute(insert(InvoiceLineItem.__table__), line_rows)
                     transaction_db.commit()
                     st.success(f"Invoice {invoice_number} saved!")
                     st.session_state.invoice_view_state = 'list'
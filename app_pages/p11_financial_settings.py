@@ -9,6 +9,14 @@ import os
 # --- Boilerplate: Add project root to path ---
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from models import SessionLocal, User, ExpenseCategory
+from utils.editor_sync import apply_row_diff, deleted_rows_in_use, diff_editor_frames, normalize_key
+
+def category_values(row):
+    """Editor row -> category columns, or None for a row without a name (skipped)."""
+    name = normalize_key(row.get("Category Name"))
+    if not name:
+        return None
+    return {"name": str(name), "description": normalize_key(row.get("Description"))}
 
 def render(db: Session, user: User, is_mobile: bool):
     st.header("⚙️ Financial Settings")
@@ -20,7 +28,7 @@ def render(db: Session, user: User, is_mobile: bool):
     categories_db = db.query(ExpenseCategory).filter(ExpenseCategory.user_id == user.id).order_by(ExpenseCategory.name).all()
     
     data_for_editor = [{"ID": cat.id, "Category Name": cat.name, "Description": cat.description} for cat in categories_db]
-    df_for_editor = pd.DataFrame(data_for_editor)
+    df_for_editor = pd.DataFrame(data_for_editor, columns=["ID", "Category Name", "Description"])
 
     edited_df = st.data_editor(
         df_for_editor,
@@ -38,28 +46,15 @@ def render(db: Session, user: User, is_mobile: bool):
     if st.button("💾 Save Category Changes", type="primary"):
         with SessionLocal() as transaction_db:
             try:
-                # Simple brute-force sync: delete all and re-add.
-                transaction_db.query(ExpenseCategory).filter(ExpenseCategory.user_id == user.id).delete(synchronize_session=False)
-                
-                all_cat_names = set()
-                for _, row in edited_df.iterrows():
-                    name_val = row.get("Category Name")
-                    if name_val and str(name_val).strip():
-                        clean_name = str(name_val).strip()
-                        if clean_name not in all_cat_names:
-                            new_cat = ExpenseCategory(
-                                user_id=user.id, 
-                                name=clean_name,
-                                description=row.get("Description")
-                            )
-                            transaction_db.add(new_cat)
-                            all_cat_names.add(clean_name)
+                # Renamed categories keep their IDs, so the transactions filed under them stay linked.
+                diff = diff_editor_frames(df_for_editor, edited_df, "ID", category_values)
+                apply_row_diff(transaction_db, ExpenseCategory, diff, scope={"user_id": user.id})
                 
                 transaction_db.commit()
                 st.success("Expense categories saved successfully!")
-            except IntegrityError:
+            except IntegrityError as e:
                 transaction_db.rollback()
-                st.error("Save failed. Category names must be unique.")
+                st.error("Save failed. Categories used by transactions cannot be deleted." if deleted_rows_in_use(e) else "Save failed. Category names must be unique.")
             except Exception as e:
                 transaction_db.rollback()
                 st.error(f"An error occurred: {e}")
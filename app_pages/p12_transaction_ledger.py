@@ -11,7 +11,10 @@ import pathlib
 
 # --- Boilerplate: Add project root to path ---
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from models import SessionLocal, User, Transaction, TransactionType, ExpenseCategory, Supplier, Customer, TransactionDocument
+from models import SessionLocal, User, Transaction, TransactionType, TransactionDocument
+from utils.ledger import get_ledger_page, count_ledger_rows, LEDGER_PAGE_SIZE
+from utils.data_versions import CUSTOMERS, EXPENSE_CATEGORIES, SUPPLIERS
+from utils.reference_cache import get_reference_options
 
 # --- State Management ---
 def initialize_state():
@@ -23,6 +26,10 @@ def initialize_state():
         st.session_state.show_cancel_dialog = False
     if 'show_delete_dialog' not in st.session_state:
         st.session_state.show_delete_dialog = False
+    if 'ledger_cursor_stack' not in st.session_state:
+        st.session_state.ledger_cursor_stack = []
+    if 'ledger_filter_key' not in st.session_state:
+        st.session_state.ledger_filter_key = None
 
 # --- Helper function for saving files ---
 def save_uploaded_files(user_id: int, transaction_id: int, uploaded_files):
@@ -38,40 +45,39 @@ def save_uploaded_files(user_id: int, transaction_id: int, uploaded_files):
 
 # --- UI Rendering Functions ---
 
+def render_ledger_filters(db: Session, user: User) -> dict:
+    cat_options = {None: "All Categories", **dict(get_reference_options(db, user.id, EXPENSE_CATEGORIES))}
+    type_options = [None] + [t.value for t in TransactionType]
+    with st.expander("🔍 Filters", expanded=False):
+        c1, c2, c3, c4 = st.columns(4)
+        start_date = c1.date_input("From", value=None, key="ledger_filter_start")
+        end_date = c2.date_input("To", value=None, key="ledger_filter_end")
+        type_val = c3.selectbox("Type", options=type_options, format_func=lambda x: x or "All Types", key="ledger_filter_type")
+        category_id = c4.selectbox("Category", options=list(cat_options.keys()), format_func=lambda x: cat_options[x], key="ledger_filter_category")
+        search = st.text_input("Description contains", key="ledger_filter_search")
+    return {"start_date": start_date, "end_date": end_date, "transaction_type": TransactionType(type_val) if type_val else None, "category_id": category_id, "search": search}
+
 def render_list_view(db: Session, user: User):
     st.subheader("Transaction History")
     if st.button("➕ Add New Transaction", type="primary"):
         st.session_state.transaction_view_state = 'create'
         st.session_state.transaction_to_edit_id = None
         st.rerun()
-        
-    transactions = db.query(Transaction).options(
-        joinedload(Transaction.category_ref), 
-        joinedload(Transaction.supplier_ref), 
-        joinedload(Transaction.customer_ref)
-    ).filter(Transaction.user_id == user.id).order_by(Transaction.date.desc()).all()
-    
-    if not transactions:
+
+    filters = render_ledger_filters(db, user)
+    filter_key = tuple(filters.values())
+    if st.session_state.ledger_filter_key != filter_key:
+        st.session_state.ledger_filter_key = filter_key
+        st.session_state.ledger_cursor_stack = []
+
+    cursor_stack = st.session_state.ledger_cursor_stack
+    df_data, next_cursor = get_ledger_page(db, user.id, cursor=cursor_stack[-1] if cursor_stack else None, **filters)
+
+    if not df_data and not cursor_stack:
+        if any(v for v in filters.values()):
+            st.info("No transactions match these filters."); return
         st.info("No transactions recorded. Click the button above to add one."); return
-    
-    df_data = []
-    for t in transactions:
-        source = "Manual Entry"
-        if t.purchase_order_id:
-            source = f"PO #{t.purchase_order_id}"
-        elif t.invoice_id:
-            source = f"Invoice #{t.invoice_id}"
-
-        df_data.append({
-            "id": t.id, 
-            "Date": t.date, 
-            "Description": t.description, 
-            "Type": t.transaction_type.value, 
-            "Amount": t.amount, 
-            "Category": t.category_ref.name if t.category_ref else "N/A",
-            "Source": source
-        })
-    
+
     df = pd.DataFrame(df_data)
     
     selection = st.dataframe(
@@ -89,6 +95,18 @@ def render_list_view(db: Session, user: User):
         st.session_state.transaction_view_state = 'edit'
         st.rerun()
 
+    c1, c2, c3 = st.columns([1, 1, 3])
+    if c1.button("⬅️ Newer", use_container_width=True, disabled=not cursor_stack):
+        cursor_stack.pop(); st.rerun()
+    if c2.button("Older ➡️", use_container_width=True, disabled=next_cursor is None):
+        cursor_stack.append(next_cursor); st.rerun()
+    page_number = len(cursor_stack) + 1
+    if c3.toggle("Show total count", key="ledger_show_count"):
+        total = count_ledger_rows(db, user.id, **filters)
+        c3.caption(f"Page {page_number} of {max(1, -(-total // LEDGER_PAGE_SIZE))} · {total} transactions")
+    else:
+        c3.caption(f"Page {page_number}")
+
 def render_cancel_dialog():
     st.subheader("Confirm Cancel")
     with st.container(border=True):
@@ -162,12 +180,9 @@ def render_form_view(db: Session, user: User):
             st.markdown("#### Current Attachments")
             # ... (document display logic is unchanged) ...
 
-    categories = db.query(ExpenseCategory).filter(ExpenseCategory.user_id == user.id).order_by(ExpenseCategory.name).all()
-    cat_options = {cat.id: cat.name for cat in categories}
-    suppliers = db.query(Supplier).filter(Supplier.user_id == user.id).order_by(Supplier.name).all()
-    sup_options = {sup.id: sup.name for sup in suppliers}; sup_options[None] = "N/A"
-    customers = db.query(Customer).filter(Customer.user_id == user.id).order_by(Customer.name).all()
-    cust_options = {cust.id: cust.name for cust in customers}; cust_options[None] = "N/A"
+    cat_options = dict(get_reference_options(db, user.id, EXPENSE_CATEGORIES))
+    sup_options = dict(get_reference_options(db, user.id, SUPPLIERS)); sup_options[None] = "N/A"
+    cust_options = dict(get_reference_options(db, user.id, CUSTOMERS)); cust_options[None] = "N/A"
 
     with st.form("transaction_form"):
         c1, c2 = st.columns(2)
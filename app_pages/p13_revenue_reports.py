@@ -1,130 +1,30 @@
 # app_pages/p13_revenue_reports.py
 import streamlit as st
 import pandas as pd
-from sqlalchemy.orm import Session, joinedload # <-- IMPORT joinedload
-from sqlalchemy import func, and_
+from sqlalchemy.orm import Session
+from sqlalchemy import func, and_, select
 from decimal import Decimal
 import datetime
 import sys
 import os
-import io
-from openpyxl import Workbook
-from openpyxl.utils import get_column_letter
 
 # --- Boilerplate: Add project root to path ---
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from models import User, Invoice, PurchaseOrder, Transaction, TransactionType, ExpenseCategory, InvoiceStatus
+from models import User, Invoice, PurchaseOrder, TransactionType, InvoiceStatus
+from utils.financial_rollup import get_period_totals
+from utils.data_versions import LEDGER_DATA, get_data_version
+from utils.report_jobs import JOB_DONE, JOB_FAILED, REPORT_POLL_SECONDS, find_report_job, get_report_job, submit_report_job
 
 # ==============================================================================
-# --- NEW: Excel Report Generation Logic ---
+# --- Helper Functions ---
 # ==============================================================================
-def generate_excel_report(db: Session, user: User, start_date: datetime.date, end_date: datetime.date) -> io.BytesIO:
-    """
-    Generates an Excel file mirroring the structure of the provided spreadsheet.
-    """
-    # 1. Fetch all necessary data in the date range
-    # --- FIX: Use joinedload correctly ---
-    transactions = db.query(Transaction).options(
-        joinedload(Transaction.category_ref)
-    ).filter(
-        Transaction.user_id == user.id,
-        Transaction.date.between(start_date, end_date)
-    ).order_by(Transaction.date.asc()).all()
-
-    # 2. Create an in-memory Excel workbook
-    wb = Workbook()
-    wb.remove(wb.active) # Remove the default sheet
-
-    # 3. Pre-process data and create a mapping for expense columns
-    df = pd.DataFrame([{
-        'date': t.date,
-        'description': t.description,
-        'type': t.transaction_type,
-        'amount': t.amount,
-        'category': t.category_ref.name if t.category_ref else 'Misc'
-    } for t in transactions])
-    
-    if not df.empty:
-        df['month_name'] = pd.to_datetime(df['date']).dt.strftime('%B')
-    
-    expense_categories = [cat.name for cat in db.query(ExpenseCategory).filter(ExpenseCategory.user_id == user.id).order_by(ExpenseCategory.name).all()]
-    category_to_column = {cat: i + 4 for i, cat in enumerate(expense_categories)} # D is 4, E is 5 etc.
-
-    # --- Generate Monthly Sheets ---
-    months = pd.date_range(start_date, end_date, freq='MS').strftime('%B').unique()
-    for month_name in months:
-        ws = wb.create_sheet(title=month_name)
-        
-        headers = ["Date", "Who", "Ref", "Amount"] + expense_categories + ["Total"]
-        ws.append(headers)
-        
-        month_df = df[(df['month_name'] == month_name) & (df['type'] == TransactionType.EXPENSE)]
-        
-        row_num = 2
-        for _, row in month_df.iterrows():
-            excel_row = [None] * len(headers)
-            excel_row[0] = row['date']
-            excel_row[1] = row['description']
-            excel_row[3] = row['amount']
-            
-            col_idx = category_to_column.get(row['category'])
-            if col_idx:
-                excel_row[col_idx + 1] = row['amount']
-            
-            excel_row[-1] = f"=SUM(E{row_num}:{get_column_letter(len(headers)-1)}{row_num})"
-            ws.append(excel_row)
-            row_num += 1
-
-        total_row_idx = 33
-        ws.cell(row=total_row_idx, column=1, value="Total")
-        for i in range(3, len(headers)):
-            col_letter = get_column_letter(i + 1)
-            ws.cell(row=total_row_idx, column=i + 1, value=f"=SUM({col_letter}2:{col_letter}{total_row_idx-1})")
-
-    # --- Generate Summary Sheet ---
-    ws_summary = wb.create_sheet(title="Summary", index=0)
-    ws_summary.append(["Summary for year"])
-    summary_headers = ["", "Amount"] + expense_categories + ["Total", "Sales"]
-    ws_summary.append(summary_headers)
-
-    row_num = 4
-    for month_name in months:
-        month_row = [month_name]
-        # These formulas pull the totals from each monthly sheet
-        for i in range(len(summary_headers) - 2): # Loop through Amount, categories, Total
-             col_letter = get_column_letter(i + 2) # B, C, D...
-             month_row.append(f"='{month_name}'!{col_letter}33")
-        
-        # Add formula for sales for that month
-        sales_formula = f"=SUMIFS('Bank Transactions'!E:E, 'Bank Transactions'!A:A, \">=\"&DATE({start_date.year},{pd.to_datetime(month_name, format='%B').month},1), 'Bank Transactions'!A:A, \"<=\"&EOMONTH(DATE({start_date.year},{pd.to_datetime(month_name, format='%B').month},1),0))"
-        month_row.append(sales_formula)
-        ws_summary.append(month_row)
-        row_num += 1
-    
-    # --- Generate Bank Transactions Sheet ---
-    ws_bank = wb.create_sheet(title="Bank Transactions", index=1)
-    ws_bank.append(["Date", "Who", "Ref", "Out", "In", "Balance"])
-
-    balance = Decimal('0.0')
-    for _, row in df.iterrows():
-        is_income = row['type'] in [TransactionType.SALE, TransactionType.CAPITAL_INJECTION]
-        amount = row['amount']
-        
-        out_val = float(amount) if not is_income else None
-        in_val = float(amount) if is_income else None
-        
-        if is_income:
-            balance += amount
-        else:
-            balance -= amount
-            
-        ws_bank.append([row['date'], row['description'], "", out_val, in_val, float(balance)])
-
-    # 4. Save workbook to a memory buffer
-    buffer = io.BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
-    return buffer
+@st.fragment(run_every=REPORT_POLL_SECONDS)
+def render_report_job_progress(job_key: str):
+    """Polls a queued report job without rerunning the whole page; reruns the page once it finishes."""
+    job = get_report_job(job_key)
+    if job is None or job["status"] in (JOB_DONE, JOB_FAILED):
+        st.rerun(scope="app")
+    st.info("⏳ Your Excel report is being generated in the background. You can keep working; the download appears here when it is ready.")
 
 # ==============================================================================
 # --- Main Render Function ---
@@ -148,16 +48,20 @@ def render(db: Session, user: User, is_mobile: bool):
         st.subheader("🇮🇪 VAT 3 Summary (Irish Revenue)")
         st.info("This report summarizes the Value Added Tax (VAT) on your sales and purchases for your selected period, as required for a VAT 3 return.")
 
-        vat_on_sales = db.query(func.sum(Invoice.vat_amount)).filter(
-            Invoice.user_id == user.id,
-            Invoice.status != InvoiceStatus.VOID,
-            Invoice.invoice_date.between(start_date, end_date)
-        ).scalar() or Decimal('0.0')
-
-        vat_on_purchases = db.query(func.sum(PurchaseOrder.total_vat)).filter(
-            PurchaseOrder.user_id == user.id,
-            PurchaseOrder.order_date.between(start_date, end_date)
-        ).scalar() or Decimal('0.0')
+        # Both T1 and T2 in one round trip
+        vat_on_sales, vat_on_purchases = db.execute(select(
+            select(func.sum(Invoice.vat_amount)).where(
+                Invoice.user_id == user.id,
+                Invoice.status != InvoiceStatus.VOID,
+                Invoice.invoice_date.between(start_date, end_date)
+            ).scalar_subquery(),
+            select(func.sum(PurchaseOrder.total_vat)).where(
+                PurchaseOrder.user_id == user.id,
+                PurchaseOrder.order_date.between(start_date, end_date)
+            ).scalar_subquery()
+        )).one()
+        vat_on_sales = vat_on_sales or Decimal('0.0')
+        vat_on_purchases = vat_on_purchases or Decimal('0.0')
 
         net_vat_payable = vat_on_sales - vat_on_purchases
 
@@ -169,13 +73,11 @@ def render(db: Session, user: User, is_mobile: bool):
 
     st.subheader("Profit & Loss Statement")
     
-    transactions = db.query(Transaction).filter(
-        Transaction.user_id == user.id,
-        Transaction.date.between(start_date, end_date)
-    ).all()
+    # One grouped statement: aggregate rows per (type, category), read from the monthly rollup where possible
+    period_totals = get_period_totals(db, user.id, start_date, end_date)
 
-    total_sales = sum(t.amount for t in transactions if t.transaction_type == TransactionType.SALE)
-    total_expenses = sum(t.amount for t in transactions if t.transaction_type == TransactionType.EXPENSE)
+    total_sales = sum((r["total"] for r in period_totals if r["transaction_type"] == TransactionType.SALE), Decimal('0.0'))
+    total_expenses = sum((r["total"] for r in period_totals if r["transaction_type"] == TransactionType.EXPENSE), Decimal('0.0'))
     net_profit = total_sales - total_expenses
     
     p1, p2, p3 = st.columns(3)
@@ -184,23 +86,14 @@ def render(db: Session, user: User, is_mobile: bool):
     p3.metric("Net Profit / Loss", f"€{net_profit:,.2f}", delta=f"{net_profit:,.2f}")
 
     st.subheader("Expense Breakdown by Category")
-    expense_transactions = [t for t in transactions if t.transaction_type == TransactionType.EXPENSE]
+    expense_totals = [r for r in period_totals if r["transaction_type"] == TransactionType.EXPENSE]
 
-    if not expense_transactions:
+    if not expense_totals:
         st.info("No expenses recorded in this period.")
     else:
-        expense_data = {}
-        for t in expense_transactions:
-            category_name = t.category_ref.name if t.category_ref else "Uncategorized"
-            if category_name not in expense_data:
-                expense_data[category_name] = Decimal('0.0')
-            expense_data[category_name] += t.amount
-        
-        df_expenses = pd.DataFrame(list(expense_data.items()), columns=['Category', 'Amount'])
+        # Each expense row is already one category's total; convert to float for charting
+        df_expenses = pd.DataFrame([{"Category": r["category"], "Amount": float(r["total"])} for r in expense_totals])
         df_expenses = df_expenses.sort_values('Amount', ascending=False)
-        
-        # --- FIX: Convert 'Amount' to float for charting ---
-        df_expenses['Amount'] = df_expenses['Amount'].astype(float)
 
         c1, c2 = st.columns([1,1])
         with c1:
@@ -214,17 +107,24 @@ def render(db: Session, user: User, is_mobile: bool):
     st.markdown("---")
 
     st.subheader("Download Full Report")
-    if 'excel_data' not in st.session_state:
-        st.session_state.excel_data = None
-
-    if st.button("Generate Excel Report"):
-        with st.spinner("Generating your Excel report..."):
-            st.session_state.excel_data = generate_excel_report(db, user, start_date, end_date)
-    
-    if st.session_state.excel_data:
-        st.download_button(
-            label="📥 Download Excel File",
-            data=st.session_state.excel_data,
-            file_name=f"Financial_Report_{start_date}_to_{end_date}.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
\ No newline at end of file
+    # Reports are cached per period and ledger version, so an unchanged ledger is served from the last build.
+    data_version = get_data_version(db, user.id, LEDGER_DATA)
+    job = find_report_job(user.id, start_date, end_date, data_version)
+
+    if job and job["status"] == JOB_DONE:
+        with open(job["artifact_path"], "rb") as report_file:
+            st.download_button(
+                label="📥 Download Excel File",
+                data=report_file.read(),
+                file_name=f"Financial_Report_{start_date}_to_{end_date}.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            )
+        st.caption(f"Generated {job['finished_at'].replace('T', ' ')} from your current ledger.")
+    elif job and job["status"] != JOB_FAILED:
+        render_report_job_progress(job["job_key"])
+    else:
+        if job:
+            st.error(f"The last attempt to generate this report failed: {job['error']}")
+        if st.button("Generate Excel Report"):
+            submit_report_job(user.id, start_date, end_date, data_version)
+            st.rerun()
\ No newline at end of file
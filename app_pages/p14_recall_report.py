@@ -0,0 +1,79 @@
+# app_pages/p14_recall_report.py
+import streamlit as st
+import pandas as pd
+from sqlalchemy.orm import Session
+import sys
+import os
+
+# --- Boilerplate: Add project root to path ---
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from models import User, BatchRecord
+from utils.traceability import get_traceability_graph, get_supplier_lot_numbers
+
+# --- Helper Functions ---
+def lots_dataframe(graph: dict) -> pd.DataFrame:
+    return pd.DataFrame([{
+        "Supplier Lot #": lot["supplier_lot_number"] or "N/A", "Item": lot["item"], "Supplier": lot["supplier"], "PO #": lot["purchase_order_id"], "Order Date": lot["order_date"],
+        "Received (g)": float(lot["quantity_added"]), "Used (g)": float(lot["quantity_used"]), "Remaining (g)": float(lot["quantity_remaining"])
+    } for lot in sorted(graph["lots"].values(), key=lambda l: (l["order_date"], l["lot_id"]))])
+
+def batches_dataframe(graph: dict) -> pd.DataFrame:
+    used_by_batch = {}
+    for usage in graph["usages"]:
+        used_by_batch[usage["batch_id"]] = used_by_batch.get(usage["batch_id"], 0) + float(usage["quantity_used"])
+    return pd.DataFrame([{
+        "Batch Code": b["batch_code"], "Product": b["product"], "Manufactured": b["manufacturing_date"],
+        "Lots Used": ", ".join(sorted(graph["lots"][lot_id]["supplier_lot_number"] or f"#{lot_id}" for lot_id in b["lot_ids"])),
+        "Qty from Lots (g)": used_by_batch.get(b["batch_id"], 0), "Possibly Shipped On": len(graph["batch_invoices"].get(b["batch_id"], []))
+    } for b in sorted(graph["batches"].values(), key=lambda b: b["batch_code"])])
+
+def invoices_dataframe(graph: dict) -> pd.DataFrame:
+    linked_ids = {inv_id for inv_ids in graph["batch_invoices"].values() for inv_id in inv_ids}
+    products = {b["product_id"]: b["product"] for b in graph["batches"].values()}
+    return pd.DataFrame([{
+        "Invoice #": inv["invoice_number"], "Date": inv["invoice_date"], "Customer": inv["customer"], "Status": inv["status"],
+        "Products": ", ".join(f"{products.get(pid, pid)} × {qty}" for pid, qty in inv["products"].items())
+    } for inv in sorted((graph["invoices"][i] for i in linked_ids), key=lambda inv: (inv["invoice_date"], inv["invoice_number"]))])
+
+# --- Main Render Function ---
+def render(db: Session, user: User, is_mobile: bool):
+    st.header("🔎 Recall & Traceability Report")
+    st.write("Trace a supplier lot forward to the batches and invoices it reached, or a batch back to the lots that went into it.")
+
+    mode = st.radio("Trace by", ["Supplier Lot (forward)", "Batch (backward)"], horizontal=not is_mobile)
+    if mode == "Supplier Lot (forward)":
+        lot_numbers = get_supplier_lot_numbers(db, user.id)
+        if not lot_numbers: st.info("No stock additions with a supplier lot number have been recorded yet."); return
+        selected_lot = st.selectbox("Supplier Lot Number", options=lot_numbers)
+        graph = get_traceability_graph(db, user.id, supplier_lot_number=selected_lot)
+    else:
+        batches = db.query(BatchRecord.id, BatchRecord.batch_code).filter(BatchRecord.user_id == user.id).order_by(BatchRecord.batch_code.desc()).all()
+        if not batches: st.info("No batches have been recorded yet."); return
+        batch_options = {b.id: b.batch_code for b in batches}
+        selected_batch_id = st.selectbox("Batch", options=list(batch_options.keys()), format_func=lambda x: batch_options[x])
+        graph = get_traceability_graph(db, user.id, batch_id=selected_batch_id)
+
+    if not graph["lots"]: st.info("No lots found for this selection."); return
+
+    cols = st.columns(1 if is_mobile else 3)
+    cols[0].metric("Lots", len(graph["lots"]))
+    cols[0 if is_mobile else 1].metric("Batches", len(graph["batches"]))
+    cols[0 if is_mobile else 2].metric("Possibly Affected Invoices", len({i for ids in graph["batch_invoices"].values() for i in ids}))
+
+    st.subheader("📦 Lots")
+    st.dataframe(lots_dataframe(graph), hide_index=True, use_container_width=True)
+
+    st.subheader("🧪 Batches")
+    if graph["batches"]:
+        st.dataframe(batches_dataframe(graph), hide_index=True, use_container_width=True)
+    else:
+        st.info("These lots have not been used in any batch.")
+
+    st.subheader("🧾 Possibly Affected Invoices")
+    st.caption("Invoices for the same product dated on or after the batch's manufacturing date.")
+    invoices_df = invoices_dataframe(graph)
+    if not invoices_df.empty:
+        st.dataframe(invoices_df, hide_index=True, use_container_width=True)
+        st.download_button("📥 Download Invoice List (CSV)", data=invoices_df.to_csv(index=False).encode('utf-8'), file_name="recall_affected_invoices.csv", mime="text/csv")
+    else:
+        st.info("No invoices found for the traced batches.")
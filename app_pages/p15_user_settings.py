@@ -8,6 +8,7 @@ import os
 # --- Boilerplate: Add project root to path ---
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from models import User, SessionLocal, UserLayoutEnumDef
+from utils.user_session import invalidate_current_user
 
 # --- A simple list of countries for the dropdown ---
 COUNTRY_CODES = {
@@ -73,6 +74,7 @@ def render(db: Session, user: User, authenticator, config, config_path, **kwargs
                             yaml.dump(config, file, default_flow_style=False)
                         
                         st.session_state['name'] = user_to_update.name
+                        invalidate_current_user()
                         
                         st.success("User details updated successfully!")
                         st.rerun()
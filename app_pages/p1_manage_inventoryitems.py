@@ -10,6 +10,7 @@ import os
 # --- Boilerplate: Add project root to path ---
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from models import SessionLocal, User, InventoryItem, InventoryItemType
+from utils.editor_sync import diff_editor_frames, apply_row_diff
 
 def render(db: Session, user: User, is_mobile: bool):
     st.header("🌿 Manage Inventory Items")
@@ -36,8 +37,9 @@ def render(db: Session, user: User, is_mobile: bool):
         for item in inventory_items_db
     ]
     
+    original_df = pd.DataFrame(data_for_editor, columns=["ID", "Item Name", "INCI Name", "Type", "Description", "Reorder Point"])
     edited_df = st.data_editor(
-        pd.DataFrame(data_for_editor), 
+        original_df, 
         num_rows="dynamic", 
         key="inventoryitems_editor",
         column_config={
@@ -56,42 +58,27 @@ def render(db: Session, user: User, is_mobile: bool):
     if st.button("Save Inventory Item Changes", type="primary"):
         with SessionLocal() as transaction_db:
             try:
-                original_ids = set(d['ID'] for d in data_for_editor if d['ID'] is not None)
-                edited_ids = set(edited_df['ID'].dropna().astype(int))
-
-                ids_to_delete = original_ids - edited_ids
-                if ids_to_delete:
-                    transaction_db.query(InventoryItem).filter(InventoryItem.id.in_(ids_to_delete), InventoryItem.user_id == user.id).delete(synchronize_session=False)
-
                 type_map = {t.name: t.id for t in item_types_db}
 
-                for _, row in edited_df.iterrows():
-                    item_id = int(row['ID']) if pd.notna(row['ID']) else None
+                def item_values(row):
                     name = row["Item Name"]
                     item_type_name = row["Type"]
-                    
-                    if not name or not str(name).strip() or not item_type_name: continue
-                    
+                    if pd.isna(name) or not str(name).strip() or pd.isna(item_type_name) or not item_type_name:
+                        return None
                     type_id = type_map.get(item_type_name)
                     if not type_id:
                         st.error(f"Type '{item_type_name}' is not valid. Skipping row for item '{name}'.")
-                        continue
-
-                    data_dict = {
-                        "name": name.strip(),
+                        return None
+                    return {
+                        "name": str(name).strip(),
                         "inci_name": row["INCI Name"].strip() if pd.notna(row["INCI Name"]) and row["INCI Name"] else None,
                         "inventoryitem_type_id": type_id,
                         "description": row["Description"].strip() if pd.notna(row["Description"]) and row["Description"] else None,
                         "reorder_threshold_grams": Decimal(str(row["Reorder Point"])) if pd.notna(row["Reorder Point"]) else None
                     }
 
-                    if item_id:
-                        if item_id not in ids_to_delete:
-                            transaction_db.query(InventoryItem).filter(InventoryItem.id == item_id, InventoryItem.user_id == user.id).update(data_dict)
-                    else:
-                        new_inventoryitem = InventoryItem(user_id=user.id, **data_dict)
-                        transaction_db.add(new_inventoryitem)
-                
+                diff = diff_editor_frames(original_df, edited_df, "ID", item_values)
+                apply_row_diff(transaction_db, InventoryItem, diff, scope={"user_id": user.id})
                 transaction_db.commit()
                 st.success("Inventory item changes saved successfully!")
             except IntegrityError:
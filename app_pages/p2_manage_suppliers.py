@@ -8,6 +8,7 @@ import os
 # --- Boilerplate: Add project root to path ---
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from models import get_db, User, Supplier
+from utils.data_versions import bump_model_versions
 
 # --- Page-specific content ---
 def render(db: Session, user: User, is_mobile: bool):
@@ -63,6 +64,8 @@ def render(db: Session, user: User, is_mobile: bool):
                     )
                     db.add(new_supplier)
             
+            # Bulk deletes/updates skip the flush hook, so move the version the dropdown cache checks.
+            bump_model_versions(db, user.id, Supplier)
             db.commit()
             st.success("Supplier changes saved successfully!")
             st.rerun()
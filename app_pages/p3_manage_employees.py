@@ -10,6 +10,7 @@ import os
 # --- Boilerplate: Add project root to path ---
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from models import SessionLocal, User, Employee, GlobalSalary
+from utils.editor_sync import RowDiff, normalize_key, diff_rows, apply_row_diff
 
 # --- Helper Function to fetch combined data ---
 def get_employee_data(db: Session, user_id: int):
@@ -45,7 +46,7 @@ def render(db: Session, user: User, is_mobile: bool):
     
     # Fetch the combined employee and salary data
     employee_salary_data = get_employee_data(db, user.id)
-    df_employees = pd.DataFrame(employee_salary_data)
+    df_employees = pd.DataFrame(employee_salary_data, columns=["ID", "Name", "Hourly Rate (€)", "Role", "Monthly Salary (€)"])
     
     # Use the dataframe to power the data editor
     edited_df = st.data_editor(
@@ -66,64 +67,52 @@ def render(db: Session, user: User, is_mobile: bool):
     if st.button("Save All Employee Changes", type="primary"):
         with SessionLocal() as transaction_db:
             try:
-                # Get IDs before and after editing to handle deletions
-                ids_before = set(df_employees['ID'].dropna())
-                ids_after = set(edited_df['ID'].dropna())
-                ids_to_delete = ids_before - ids_after
-                
-                # Process deletions
-                if ids_to_delete:
-                    transaction_db.query(Employee).filter(
-                        Employee.id.in_(ids_to_delete),
-                        Employee.user_id == user.id
-                    ).delete(synchronize_session=False)
-
-                # Process updates and inserts
-                for _, row in edited_df.iterrows():
-                    emp_id = row.get("ID")
+                def employee_values(row):
                     name = row.get("Name")
                     rate = row.get("Hourly Rate (€)")
-                    salary = row.get("Monthly Salary (€)")
+                    if pd.isna(name) or not str(name).strip() or pd.isna(rate):
+                        return None # Skip rows without a name or rate
+                    role = row.get("Role")
+                    return {
+                        "name": str(name).strip(),
+                        "hourly_rate": Decimal(str(rate)),
+                        "role": (str(role).strip() or None) if pd.notna(role) else None,
+                    }
 
-                    if not name or pd.isna(rate):
-                        continue # Skip rows without a name or rate
+                def salary_amount(row):
+                    salary = row.get("Monthly Salary (€)")
+                    return Decimal(str(salary if not pd.isna(salary) else '0.0'))
 
-                    # Convert to Decimal for precision
-                    rate_decimal = Decimal(str(rate))
-                    salary_decimal = Decimal(str(salary if not pd.isna(salary) else '0.0'))
+                original = {}
+                original_salaries = {}
+                for _, row in df_employees.iterrows():
+                    emp_id = normalize_key(row["ID"])
+                    original[emp_id] = employee_values(row)
+                    if salary_amount(row) > 0:
+                        original_salaries[emp_id] = {"monthly_amount": salary_amount(row)}
 
-                    if pd.notna(emp_id): # Update existing employee
-                        employee = transaction_db.query(Employee).filter_by(id=int(emp_id), user_id=user.id).one()
-                        employee.name = name.strip()
-                        employee.hourly_rate = rate_decimal
-                        employee.role = row.get("Role", "").strip() or None
-                        
-                        # Handle salary (update, create, or delete)
-                        salary_entry = transaction_db.query(GlobalSalary).filter_by(employee_id=employee.id).first()
-                        if salary_decimal > 0:
-                            if salary_entry:
-                                salary_entry.monthly_amount = salary_decimal
-                            else:
-                                new_salary = GlobalSalary(user_id=user.id, employee_id=employee.id, monthly_amount=salary_decimal)
-                                transaction_db.add(new_salary)
-                        elif salary_entry: # Salary is 0 or None, so delete existing entry
-                            transaction_db.delete(salary_entry)
+                edited = [(normalize_key(row["ID"]), employee_values(row), salary_amount(row)) for _, row in edited_df.iterrows()]
+                employee_diff = diff_rows(original, ((emp_id, values) for emp_id, values, _ in edited))
 
-                    else: # Insert new employee
-                        new_employee = Employee(
-                            user_id=user.id,
-                            name=name.strip(),
-                            hourly_rate=rate_decimal,
-                            role=row.get("Role", "").strip() or None
-                        )
-                        transaction_db.add(new_employee)
-                        transaction_db.flush() # Flush to get the new_employee.id
+                # Salaries are keyed by employee: a salary of 0 (or a removed employee) deletes the entry,
+                # and rows that failed validation keep theirs. Applied first so removed employees lose their salary before they go.
+                salary_diff = diff_rows(original_salaries, (
+                    (emp_id, None if values is None else {"monthly_amount": salary})
+                    for emp_id, values, salary in edited
+                    if emp_id in original and (values is None or salary > 0)
+                ))
+                apply_row_diff(transaction_db, GlobalSalary, salary_diff, key_attr="employee_id", scope={"user_id": user.id})
+                new_ids = apply_row_diff(transaction_db, Employee, employee_diff, scope={"user_id": user.id}, return_keys=True)
 
-                        # If salary is provided for the new employee, create it
-                        if salary_decimal > 0:
-                            new_salary = GlobalSalary(user_id=user.id, employee_id=new_employee.id, monthly_amount=salary_decimal)
-                            transaction_db.add(new_salary)
-                
+                # New employees' salaries, matched to their new IDs by (unique) name
+                new_salaries = {values["name"]: salary for emp_id, values, salary in edited if values is not None}
+                new_salary_diff = RowDiff()
+                new_salary_diff.inserts = [
+                    (new_id, {"monthly_amount": new_salaries[values["name"]]})
+                    for (_, values), new_id in zip(employee_diff.inserts, new_ids)
+                    if new_salaries[values["name"]] > 0
+                ]
+                apply_row_diff(transaction_db, GlobalSalary, new_salary_diff, key_attr="employee_id", scope={"user_id": user.id})
                 transaction_db.commit()
                 st.success("✅ Employee and salary changes saved successfully!")
             except IntegrityError:
@@ -10,6 +10,12 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 # --- THE FIX: Import SessionLocal directly to create a new session ---
 from models import SessionLocal, User, StandardProductionTask, StandardShippingTask
+from utils.editor_sync import apply_row_diff, deleted_rows_in_use, diff_editor_frames, normalize_key
+
+def task_values(row):
+    """Editor row -> task columns, or None for a blank row (skipped)."""
+    name = normalize_key(row["Task Name"])
+    return {"task_name": name} if name else None
 
 def render(db: Session, user: User, is_mobile: bool):
     """
@@ -25,14 +31,14 @@ def render(db: Session, user: User, is_mobile: bool):
     
     # Use the provided 'db' session for initial, read-only loading
     prod_tasks_db = db.query(StandardProductionTask).filter(StandardProductionTask.user_id == user.id).order_by(StandardProductionTask.task_name).all()
-    prod_task_data = [{"Task Name": task.task_name} for task in prod_tasks_db]
-    df_prod_tasks = pd.DataFrame(prod_task_data, columns=["Task Name"])
+    prod_task_data = [{"ID": task.id, "Task Name": task.task_name} for task in prod_tasks_db]
+    df_prod_tasks = pd.DataFrame(prod_task_data, columns=["ID", "Task Name"])
     
     edited_df_prod = st.data_editor(
         df_prod_tasks, 
         num_rows="dynamic", 
         key="prod_tasks_editor",
-        column_config={"Task Name": st.column_config.TextColumn("Task Name*", required=True, help="Names must be unique.")},
+        column_config={"ID": None, "Task Name": st.column_config.TextColumn("Task Name*", required=True, help="Names must be unique.")},
         use_container_width=True, 
         hide_index=True
     )
@@ -41,21 +47,17 @@ def render(db: Session, user: User, is_mobile: bool):
         # --- THE FIX: Create a new, dedicated session for this transaction ---
         with SessionLocal() as transaction_db:
             try:
-                final_names = {name.strip() for name in edited_df_prod["Task Name"].dropna() if name.strip()}
-
-                # Delete all existing tasks for this user within the new transaction
-                transaction_db.query(StandardProductionTask).filter(StandardProductionTask.user_id == user.id).delete(synchronize_session=False)
-                
-                # Add all the tasks from the UI back into the database
-                for name in final_names:
-                    transaction_db.add(StandardProductionTask(user_id=user.id, task_name=name))
+                # Only changed rows are written, so kept and renamed tasks keep their IDs
+                # (and the product and batch workflows that reference them).
+                diff = diff_editor_frames(df_prod_tasks, edited_df_prod, "ID", task_values)
+                apply_row_diff(transaction_db, StandardProductionTask, diff, scope={"user_id": user.id})
                 
                 # Commit the transaction
                 transaction_db.commit()
                 st.success("Production Tasks updated successfully!")
-            except IntegrityError:
+            except IntegrityError as e:
                 transaction_db.rollback()
-                st.error("Save failed. Task names must be unique. Please remove any duplicate entries.")
+                st.error("Save failed. Tasks used in a product workflow cannot be removed." if deleted_rows_in_use(e) else "Save failed. Task names must be unique. Please remove any duplicate entries.")
             except Exception as e:
                 transaction_db.rollback()
                 st.error(f"An unexpected error occurred: {e}")
@@ -70,14 +72,14 @@ def render(db: Session, user: User, is_mobile: bool):
 
     # Use the provided 'db' session for initial, read-only loading
     ship_tasks_db = db.query(StandardShippingTask).filter(StandardShippingTask.user_id == user.id).order_by(StandardShippingTask.task_name).all()
-    ship_task_data = [{"Task Name": task.task_name} for task in ship_tasks_db]
-    df_ship_tasks = pd.DataFrame(ship_task_data, columns=["Task Name"])
+    ship_task_data = [{"ID": task.id, "Task Name": task.task_name} for task in ship_tasks_db]
+    df_ship_tasks = pd.DataFrame(ship_task_data, columns=["ID", "Task Name"])
 
     edited_df_ship = st.data_editor(
         df_ship_tasks, 
         num_rows="dynamic", 
         key="ship_tasks_editor",
-        column_config={"Task Name": st.column_config.TextColumn("Task Name*", required=True, help="Names must be unique.")},
+        column_config={"ID": None, "Task Name": st.column_config.TextColumn("Task Name*", required=True, help="Names must be unique.")},
         use_container_width=True, 
         hide_index=True
     )
@@ -86,18 +88,14 @@ def render(db: Session, user: User, is_mobile: bool):
         # --- APPLYING THE SAME FIX HERE ---
         with SessionLocal() as transaction_db:
             try:
-                final_names = {name.strip() for name in edited_df_ship["Task Name"].dropna() if name.strip()}
-
-                transaction_db.query(StandardShippingTask).filter(StandardShippingTask.user_id == user.id).delete(synchronize_session=False)
-                
-                for name in final_names:
-                    transaction_db.add(StandardShippingTask(user_id=user.id, task_name=name))
+                diff = diff_editor_frames(df_ship_tasks, edited_df_ship, "ID", task_values)
+                apply_row_diff(transaction_db, StandardShippingTask, diff, scope={"user_id": user.id})
                     
                 transaction_db.commit()
                 st.success("Shipping Tasks updated successfully!")
-            except IntegrityError:
+            except IntegrityError as e:
                 transaction_db.rollback()
-                st.error("Save failed. Task names must be unique. Please remove any duplicate entries.")
+                st.error("Save failed. Tasks used in a product workflow cannot be removed." if deleted_rows_in_use(e) else "Save failed. Task names must be unique. Please remove any duplicate entries.")
             except Exception as e:
                 transaction_db.rollback()
                 st.error(f"An unexpected error occurred: {e}")
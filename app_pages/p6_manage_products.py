@@ -2,7 +2,6 @@
 import streamlit as st
 import pandas as pd
 from sqlalchemy.orm import Session, joinedload, selectinload
-from sqlalchemy import func
 from sqlalchemy.exc import IntegrityError
 from decimal import Decimal, ROUND_HALF_UP
 import sys
@@ -11,121 +10,17 @@ import os
 # --- Boilerplate: Add project root to path ---
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from models import (
-    SessionLocal, User, Product, InventoryItem, ProductMaterial, GlobalCosts, GlobalSalary,
-    Employee, StandardProductionTask, ProductProductionTask, StockAddition, PurchaseOrder
+    SessionLocal, User, Product, InventoryItem, ProductMaterial, GlobalSalary,
+    Employee, StandardProductionTask, ProductProductionTask
 )
+from utils.costing import calculate_product_costs
+from utils.data_versions import INVENTORY_ITEMS, EMPLOYEES, PRODUCTION_TASKS
+from utils.reference_cache import get_reference_options
+from utils.editor_sync import apply_row_diff, diff_editor_frames
 
-# --- REBUILT Cost Calculation Logic ---
+# --- Cost Calculation (delegates to the bulk costing engine) ---
 def calculate_full_costs(product_id: int, db: Session, user_id: int):
-    # This function remains largely the same, but we'll ensure variable names are clear
-    product = db.query(Product).options(
-        selectinload(Product.materials).joinedload(ProductMaterial.inventoryitem_ref),
-        selectinload(Product.production_tasks).joinedload(ProductProductionTask.standard_task_ref),
-        selectinload(Product.production_tasks).joinedload(ProductProductionTask.employee_ref),
-        selectinload(Product.shipping_tasks),
-        joinedload(Product.salary_alloc_employee_ref).joinedload(Employee.global_salary_entry)
-    ).filter(Product.id == product_id, Product.user_id == user_id).first()
-
-    if not product: return None
-
-    breakdown = {}
-    
-    material_cost_per_item = Decimal('0.0')
-    missing_inventoryitem_costs = []
-    material_details = []
-    if product.materials:
-        for material in product.materials:
-            additions = db.query(StockAddition).join(PurchaseOrder).filter(
-                StockAddition.inventoryitem_id == material.inventoryitem_id,
-                PurchaseOrder.user_id == user_id
-            ).all()
-            if not additions:
-                missing_inventoryitem_costs.append(material.inventoryitem_ref.name)
-                continue
-            total_cost_for_inventoryitem = Decimal('0.0')
-            total_quantity_for_inventoryitem = Decimal('0.0')
-            for add in additions:
-                total_items_in_po = db.query(func.count(StockAddition.id)).filter(StockAddition.purchase_order_id == add.purchase_order_id).scalar()
-                shipping_per_item = add.purchase_order_ref.shipping_cost / total_items_in_po if total_items_in_po > 0 else Decimal('0.0')
-                true_cost_of_addition = add.item_cost + shipping_per_item
-                total_cost_for_inventoryitem += true_cost_of_addition
-                total_quantity_for_inventoryitem += add.quantity_added_grams
-            
-            if total_quantity_for_inventoryitem > 0:
-                avg_cost_per_unit = total_cost_for_inventoryitem / total_quantity_for_inventoryitem
-                cost_for_material = material.quantity_grams * avg_cost_per_unit
-                material_cost_per_item += cost_for_material
-                material_details.append({"Item": material.inventoryitem_ref.name, "Qty": material.quantity_grams, "Cost": cost_for_material})
-            else:
-                missing_inventoryitem_costs.append(material.inventoryitem_ref.name)
-    
-    breakdown['material_details'] = material_details
-    breakdown['total_material_cost_per_item'] = material_cost_per_item
-    breakdown['missing_inventoryitem_costs'] = missing_inventoryitem_costs
-
-    labor_cost_per_item = Decimal('0.0')
-    labor_details = []
-    for p_task in product.production_tasks:
-        if p_task.standard_task_ref and p_task.employee_ref and p_task.time_minutes:
-            hourly_rate = p_task.employee_ref.hourly_rate or Decimal('0.0')
-            cost = (Decimal(str(p_task.time_minutes)) / 60) * hourly_rate
-            labor_cost_per_item += cost
-            labor_details.append({"Task": p_task.standard_task_ref.task_name, "Employee": p_task.employee_ref.name, "Time (min)": p_task.time_minutes, "Cost": cost})
-    breakdown['labor_details'] = labor_details
-    breakdown['total_labor_cost_per_item'] = labor_cost_per_item
-
-    allocated_salary_cost_per_item = Decimal('0.0')
-    if product.salary_allocation_employee_id and product.salary_alloc_employee_ref and product.salary_alloc_employee_ref.global_salary_entry:
-        monthly_salary = product.salary_alloc_employee_ref.global_salary_entry.monthly_amount or Decimal('0.0')
-        alloc_items = product.salary_allocation_items_per_month or 1
-        if alloc_items > 0:
-            allocated_salary_cost_per_item = monthly_salary / Decimal(alloc_items)
-    
-    allocated_rent_utilities_cost_per_item = Decimal('0.0')
-    global_costs = db.query(GlobalCosts).filter(GlobalCosts.user_id == user_id).first()
-    if global_costs:
-        total_monthly_overheads = (global_costs.monthly_rent or Decimal('0.0')) + (global_costs.monthly_utilities or Decimal('0.0'))
-        alloc_items = product.rent_utilities_allocation_items_per_month or 1
-        if alloc_items > 0:
-            allocated_rent_utilities_cost_per_item = total_monthly_overheads / Decimal(alloc_items)
-    
-    breakdown['allocated_salary_cost_per_item'] = allocated_salary_cost_per_item
-    breakdown['allocated_rent_utilities_cost_per_item'] = allocated_rent_utilities_cost_per_item
-    breakdown['total_allocated_overheads_per_item'] = allocated_salary_cost_per_item + allocated_rent_utilities_cost_per_item
-
-    total_production_cost = material_cost_per_item + labor_cost_per_item + breakdown['total_allocated_overheads_per_item']
-    breakdown['total_production_cost_per_item'] = total_production_cost
-    
-    retail_price = product.retail_price_per_item or Decimal('0.0')
-    retail_cc_fee = retail_price * (product.retail_cc_fee_percent or Decimal('0.0'))
-    retail_platform_fee = retail_price * (product.retail_platform_fee_percent or Decimal('0.0'))
-    total_retail_channel_costs = retail_cc_fee + retail_platform_fee + (product.retail_shipping_cost_paid_by_you or Decimal('0.0'))
-    total_cost_retail_item = total_production_cost + total_retail_channel_costs
-    profit_retail = retail_price - total_cost_retail_item
-    margin_retail = (profit_retail / retail_price) * 100 if retail_price > 0 else Decimal('0.0')
-    breakdown['retail_metrics'] = {"price": retail_price, "total_channel_costs": total_retail_channel_costs, "total_cost_item": total_cost_retail_item, "profit": profit_retail, "margin_percent": margin_retail}
-
-    wholesale_price = product.wholesale_price_per_item or Decimal('0.0')
-    ws_commission = wholesale_price * (product.wholesale_commission_percent or Decimal('0.0'))
-    ws_processing_fee = wholesale_price * (product.wholesale_processing_fee_percent or Decimal('0.0'))
-    ws_flat_fee = product.wholesale_flat_fee_per_order or Decimal('0.0')
-    total_wholesale_channel_costs = ws_commission + ws_processing_fee + ws_flat_fee
-    total_cost_wholesale_item = total_production_cost + total_wholesale_channel_costs
-    profit_wholesale = wholesale_price - total_cost_wholesale_item
-    margin_wholesale = (profit_wholesale / wholesale_price) * 100 if wholesale_price > 0 else Decimal('0.0')
-    breakdown['wholesale_metrics'] = {"price": wholesale_price, "total_channel_costs": total_wholesale_channel_costs, "total_cost_item": total_cost_wholesale_item, "profit": profit_wholesale, "margin_percent": margin_wholesale}
-
-    dist_ws = product.distribution_wholesale_percentage or Decimal('0.5')
-    dist_rt = Decimal('1.0') - dist_ws
-    breakdown['blended_avg_price'] = (retail_price * dist_rt) + (wholesale_price * dist_ws)
-    breakdown['blended_avg_total_cost'] = (total_cost_retail_item * dist_rt) + (total_cost_wholesale_item * dist_ws)
-    breakdown['blended_avg_profit'] = breakdown['blended_avg_price'] - breakdown['blended_avg_total_cost']
-    breakdown['blended_avg_margin_percent'] = (breakdown['blended_avg_profit'] / breakdown['blended_avg_price']) * 100 if breakdown['blended_avg_price'] > 0 else Decimal('0.0')
-    
-    buffer = product.buffer_percentage or Decimal('0.0')
-    breakdown['cost_plus_buffer'] = total_production_cost * (Decimal('1.0') + buffer)
-
-    return breakdown
+    return calculate_product_costs(db, user_id, [product_id]).get(product_id)
 
 def render_new_product_form(user: User):
     st.subheader("➕ Add New Product")
@@ -160,7 +55,7 @@ def render_product_editor(db: Session, user: User, product: Product, is_mobile:
 
     with tab1:
         st.subheader("Bill of Materials")
-        all_inventoryitems = db.query(InventoryItem).filter(InventoryItem.user_id == user.id).order_by(InventoryItem.name).all()
+        all_inventoryitems = get_reference_options(db, user.id, INVENTORY_ITEMS)
         
         prerequisites_met_bom = bool(all_inventoryitems)
         
@@ -182,7 +77,7 @@ def render_product_editor(db: Session, user: User, product: Product, is_mobile:
             disabled=not prerequisites_met_bom,
             column_config={
                 "ID": None,
-                "Item": st.column_config.SelectboxColumn("Item*", options=[item.name for item in all_inventoryitems], required=True),
+                "Item": st.column_config.SelectboxColumn("Item*", options=[name for _, name in all_inventoryitems], required=True),
                 "Quantity": st.column_config.NumberColumn("Quantity*", help="For ingredients, use grams. For packaging, use units (e.g., 1 for one box).", required=True, min_value=0.0, format="%.3f")
             }, 
             use_container_width=True, 
@@ -192,14 +87,13 @@ def render_product_editor(db: Session, user: User, product: Product, is_mobile:
         if st.button("💾 Save Bill of Materials", type="primary", disabled=not prerequisites_met_bom):
             with SessionLocal() as transaction_db:
                 try:
-                    transaction_db.query(ProductMaterial).filter(ProductMaterial.product_id == product.id).delete(synchronize_session=False)
-                    item_map = {item.name: item.id for item in all_inventoryitems}
-                    for _, row in edited_bom_df.iterrows():
+                    item_map = {name: item_id for item_id, name in all_inventoryitems}
+                    def material_values(row):
                         item_name, quantity = row["Item"], row["Quantity"]
-                        if not item_name or pd.isna(quantity) or quantity <= 0: continue
-                        item_id = item_map.get(item_name)
-                        if item_id:
-                            transaction_db.add(ProductMaterial(product_id=product.id, inventoryitem_id=item_id, quantity_grams=Decimal(str(quantity))))
+                        if not item_name or pd.isna(quantity) or quantity <= 0 or item_name not in item_map: return None
+                        return {"inventoryitem_id": item_map[item_name], "quantity_grams": Decimal(str(quantity))}
+                    diff = diff_editor_frames(df_bom, edited_bom_df, "ID", material_values)
+                    apply_row_diff(transaction_db, ProductMaterial, diff, scope={"product_id": product.id})
                     transaction_db.commit()
                     st.success("Bill of Materials updated successfully!")
                 except Exception as e:
@@ -208,11 +102,11 @@ def render_product_editor(db: Session, user: User, product: Product, is_mobile:
 
     with tab2:
         st.subheader("Production Tasks & Labor")
-        all_tasks = db.query(StandardProductionTask).filter(StandardProductionTask.user_id == user.id).all()
-        all_employees = db.query(Employee).filter(Employee.user_id == user.id).all()
+        all_tasks = get_reference_options(db, user.id, PRODUCTION_TASKS)
+        all_employees = get_reference_options(db, user.id, EMPLOYEES)
 
-        task_names = [t.task_name for t in all_tasks]
-        employee_names = [e.name for e in all_employees]
+        task_names = [name for _, name in all_tasks]
+        employee_names = [name for _, name in all_employees]
         
         prerequisites_met_workflow = bool(task_names and employee_names)
 
@@ -251,15 +145,16 @@ def render_product_editor(db: Session, user: User, product: Product, is_mobile:
         if st.button("💾 Save Workflow Changes", type="primary", disabled=not prerequisites_met_workflow):
             with SessionLocal() as transaction_db:
                 try:
-                    transaction_db.query(ProductProductionTask).filter(ProductProductionTask.product_id == product.id).delete(synchronize_session=False)
-                    task_map = {t.task_name: t.id for t in all_tasks}
-                    emp_map = {e.name: e.id for e in all_employees}
-                    for _, row in edited_workflow_df.iterrows():
+                    task_map = {name: task_id for task_id, name in all_tasks}
+                    emp_map = {name: emp_id for emp_id, name in all_employees}
+                    def workflow_values(row):
                         task_name, emp_name, time = row["Task"], row["Assigned To"], row["Time (minutes)"]
-                        if not all([task_name, emp_name, pd.notna(time)]): continue
+                        if not all([task_name, emp_name, pd.notna(time)]): return None
                         task_id, emp_id = task_map.get(task_name), emp_map.get(emp_name)
-                        if task_id and emp_id:
-                            transaction_db.add(ProductProductionTask(product_id=product.id, standard_task_id=task_id, employee_id=emp_id, time_minutes=Decimal(str(time))))
+                        if not (task_id and emp_id): return None
+                        return {"standard_task_id": task_id, "employee_id": emp_id, "time_minutes": Decimal(str(time))}
+                    diff = diff_editor_frames(df_workflow, edited_workflow_df, "ID", workflow_values)
+                    apply_row_diff(transaction_db, ProductProductionTask, diff, scope={"product_id": product.id})
                     transaction_db.commit()
                     st.success("Workflow updated successfully!")
                 except Exception as e:
@@ -326,7 +221,7 @@ def render_product_editor(db: Session, user: User, product: Product, is_mobile:
 def render_cost_analysis(db: Session, user: User, product: Product, is_mobile: bool):
     st.header(f"🔍 Cost & Profit Analysis for: {product.product_name}")
     
-    cost_data = calculate_full_costs(product.id, db, user.id)
+    cost_data = calculate_product_costs(db, user.id, [product.id]).get(product.id)
     
     if cost_data is None: 
         st.error("An error occurred during cost calculation.")
@@ -2,7 +2,7 @@
 import streamlit as st
 import pandas as pd
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import func
+from sqlalchemy import func, case, and_
 from sqlalchemy.exc import IntegrityError
 from decimal import Decimal
 import datetime
@@ -14,8 +14,13 @@ import pathlib
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from models import (
     SessionLocal, User, InventoryItem, Supplier, StockAddition, PurchaseOrder, 
-    PurchaseDocument, Transaction, TransactionType, ExpenseCategory
+    PurchaseDocument, Transaction, TransactionType, ExpenseCategory, InventoryItemCostIndex
 )
+from utils.cost_index import adjust_cost_index_for_po
+from utils.data_versions import INVENTORY_ITEMS, SUPPLIERS
+from utils.reference_cache import get_reference_options
+from utils.editor_sync import apply_row_diff, diff_editor_frames, normalize_key
+from utils.lot_allocation import StockConflictError, resize_lots
 
 def initialize_state():
     if 'purchase_view_state' not in st.session_state:
@@ -28,36 +33,40 @@ def initialize_state():
         st.session_state.show_delete_confirm_po = False
 
 def get_inventory_data(db: Session, user_id: int):
+    """
+    Builds the inventory overview (stock on hand, landed average cost, low-stock flag)
+    in a single grouped statement, whatever the number of items and lots.
+    """
     stock_levels_sq = db.query(
         StockAddition.inventoryitem_id,
         func.sum(StockAddition.quantity_remaining_grams).label('current_stock')
     ).join(PurchaseOrder).where(PurchaseOrder.user_id == user_id).group_by(StockAddition.inventoryitem_id).subquery()
-    
-    results = db.query(InventoryItem, stock_levels_sq.c.current_stock).outerjoin(
+
+    current_stock = func.coalesce(stock_levels_sq.c.current_stock, 0)
+    is_low_stock = case(
+        (and_(InventoryItem.reorder_threshold_grams.isnot(None), current_stock <= InventoryItem.reorder_threshold_grams), 1),
+        else_=0
+    )
+
+    results = db.query(
+        InventoryItem.id, InventoryItem.name, current_stock, is_low_stock,
+        InventoryItemCostIndex.total_landed_cost, InventoryItemCostIndex.total_quantity_grams
+    ).outerjoin(
         stock_levels_sq, InventoryItem.id == stock_levels_sq.c.inventoryitem_id
+    ).outerjoin(
+        InventoryItemCostIndex, InventoryItem.id == InventoryItemCostIndex.inventoryitem_id
     ).filter(InventoryItem.user_id == user_id).order_by(InventoryItem.name).all()
-    
+
     inventory = []
-    for item, stock in results:
-        stock_level = stock or Decimal('0.0')
-        additions = db.query(StockAddition).join(PurchaseOrder).filter(StockAddition.inventoryitem_id == item.id, PurchaseOrder.user_id == user_id).all()
-        total_cost, total_qty = Decimal('0.0'), Decimal('0.0')
-        for add in additions:
-            po_line_item_count = len(add.purchase_order_ref.line_items) if add.purchase_order_ref.line_items else 1
-            shipping_per_item = add.purchase_order_ref.shipping_cost / po_line_item_count
-            total_cost += add.item_cost + shipping_per_item
-            total_qty += add.quantity_added_grams
-        
-        avg_cost_per_unit = (total_cost / total_qty) if total_qty > 0 else Decimal('0.0')
-        is_low_stock = (item.reorder_threshold_grams is not None and stock_level <= item.reorder_threshold_grams)
-        
+    for item_id, name, stock, low_stock, total_cost, total_qty in results:
+        avg_cost_per_unit = (Decimal(str(total_cost)) / Decimal(str(total_qty))) if total_qty else Decimal('0.0')
         inventory.append({
-            "id": item.id, 
-            "Inventory Item": f"⚠️ {item.name}" if is_low_stock else item.name, 
-            "name_for_header": item.name, 
-            "Current Stock (g or units)": stock_level, 
-            "Avg. Cost / Unit": avg_cost_per_unit, 
-            "_is_low_stock": is_low_stock
+            "id": item_id,
+            "Inventory Item": f"⚠️ {name}" if low_stock else name,
+            "name_for_header": name,
+            "Current Stock (g or units)": Decimal(str(stock)),
+            "Avg. Cost / Unit": avg_cost_per_unit,
+            "_is_low_stock": bool(low_stock)
         })
     return inventory
 
@@ -136,6 +145,7 @@ def render_purchase_edit_form(db: Session, user: User):
                         for doc in po_to_delete.documents:
                             try: os.remove(doc.file_path)
                             except FileNotFoundError: pass
+                        adjust_cost_index_for_po(t_db, po_id, -1)
                         t_db.delete(po_to_delete); t_db.commit()
                     st.warning(f"Purchase Order #{po_id} has been deleted.")
                     st.session_state.show_delete_confirm_po = False; st.session_state.purchase_view_state = 'list'; st.rerun()
@@ -169,11 +179,11 @@ def render_purchase_edit_form(db: Session, user: User):
                     st.success(f"Deleted attachment: {doc.original_filename}"); st.rerun()
         st.markdown("---")
 
-    inventory_items = db.query(InventoryItem).filter(InventoryItem.user_id == user.id).order_by(InventoryItem.name).all()
-    item_map = {item.name: item.id for item in inventory_items}
+    inventory_items = get_reference_options(db, user.id, INVENTORY_ITEMS)
+    item_map = {name: item_id for item_id, name in inventory_items}
     item_options = list(item_map.keys())
-    suppliers = db.query(Supplier).filter(Supplier.user_id == user.id).order_by(Supplier.name).all()
-    sup_options = {sup.id: sup.name for sup in suppliers}; sup_options[None] = "N/A"
+    suppliers = get_reference_options(db, user.id, SUPPLIERS)
+    sup_options = dict(suppliers); sup_options[None] = "N/A"
     
     with st.form("edit_purchase_form"):
         c1, c2 = st.columns(2)
@@ -184,8 +194,9 @@ def render_purchase_edit_form(db: Session, user: User):
         shipping_cost = st.number_input("Total Shipping Cost (€)", min_value=0.0, value=float(po.shipping_cost), format="%.2f")
         notes = st.text_area("Order Notes", value=po.notes or "")
         st.markdown("---"); st.markdown("#### Line Items")
-        line_items_data = [{"Item": item.inventoryitem_ref.name, "Quantity (g or units)": float(item.quantity_added_grams), "Item Cost (€)": float(item.item_cost), "Supplier Lot #": item.supplier_lot_number or ""} for item in po.line_items]
-        edited_line_items = st.data_editor(pd.DataFrame(line_items_data), num_rows="dynamic", use_container_width=True, hide_index=True, column_config={"Item": st.column_config.SelectboxColumn("Item*", options=item_options, required=True), "Quantity (g or units)": st.column_config.NumberColumn("Quantity (g or units)*", min_value=0.01, required=True, format="%.2f"), "Item Cost (€)": st.column_config.NumberColumn("Item Cost (€)*", min_value=0.0, required=True, format="%.2f"), "Supplier Lot #": st.column_config.TextColumn("Supplier Lot #")})
+        line_items_data = [{"ID": item.id, "Item": item.inventoryitem_ref.name, "Quantity (g or units)": float(item.quantity_added_grams), "Item Cost (€)": float(item.item_cost), "Supplier Lot #": item.supplier_lot_number or ""} for item in po.line_items]
+        df_line_items = pd.DataFrame(line_items_data, columns=["ID", "Item", "Quantity (g or units)", "Item Cost (€)", "Supplier Lot #"])
+        edited_line_items = st.data_editor(df_line_items, num_rows="dynamic", use_container_width=True, hide_index=True, column_config={"ID": None, "Item": st.column_config.SelectboxColumn("Item*", options=item_options, required=True), "Quantity (g or units)": st.column_config.NumberColumn("Quantity (g or units)*", min_value=0.01, required=True, format="%.2f"), "Item Cost (€)": st.column_config.NumberColumn("Item Cost (€)*", min_value=0.0, required=True, format="%.2f"), "Supplier Lot #": st.column_config.TextColumn("Supplier Lot #")})
         uploaded_files = st.file_uploader("Upload New Documents", accept_multiple_files=True, key=f"po_uploader_{po.id}")
         st.markdown("---")
         submitted = st.form_submit_button("💾 Save Changes", type="primary")
@@ -193,21 +204,32 @@ def render_purchase_edit_form(db: Session, user: User):
             with SessionLocal() as transaction_db:
                 try:
                     po_to_update = transaction_db.query(PurchaseOrder).filter(PurchaseOrder.id == po_id).one()
+                    adjust_cost_index_for_po(transaction_db, po_id, -1)
                     po_to_update.order_date, po_to_update.supplier_id = order_date, selected_sup_id
                     po_to_update.shipping_cost, po_to_update.notes = Decimal(str(shipping_cost)), notes
-                    transaction_db.query(StockAddition).filter(StockAddition.purchase_order_id == po_id).delete()
-                    for _, row in edited_line_items.iterrows():
-                        if item_id := item_map.get(row["Item"]):
-                            new_stock = StockAddition(purchase_order_id=po_id, inventoryitem_id=item_id, quantity_added_grams=Decimal(str(row["Quantity (g or units)"])), item_cost=Decimal(str(row["Item Cost (€)"])), supplier_lot_number=row["Supplier Lot #"], quantity_remaining_grams=Decimal(str(row["Quantity (g or units)"])))
-                            transaction_db.add(new_stock)
+                    # Lines are updated in place, so stock already drawn from a lot stays drawn: a changed
+                    # quantity moves the remaining amount by the same difference, in SQL (see resize_lots).
+                    def line_values(row):
+                        item_id = item_map.get(row["Item"])
+                        if not item_id: return None
+                        return {"inventoryitem_id": item_id, "quantity_added_grams": Decimal(str(row["Quantity (g or units)"])), "item_cost": Decimal(str(row["Item Cost (€)"])),
+                                "supplier_lot_number": normalize_key(row["Supplier Lot #"])}
+                    diff = diff_editor_frames(df_line_items, edited_line_items, "ID", line_values)
+                    resize_lots(transaction_db, [(lot_id, values["quantity_added_grams"]) for lot_id, values in diff.updates.items()])
+                    for _, values in diff.inserts:
+                        values["quantity_remaining_grams"] = values["quantity_added_grams"]
+                    apply_row_diff(transaction_db, StockAddition, diff, scope={"purchase_order_id": po_id})
                     if uploaded_files:
                         saved_files = save_uploaded_files(user.id, po_id, uploaded_files)
                         for file_info in saved_files:
                             transaction_db.add(PurchaseDocument(purchase_order_id=po_id, file_path=file_info["path"], original_filename=file_info["name"]))
                     transaction_db.flush()
+                    adjust_cost_index_for_po(transaction_db, po_id, 1)
                     sync_po_transaction(transaction_db, po_to_update, edited_line_items, user)
                     transaction_db.commit()
                     st.success("Purchase Order updated successfully!"); st.session_state.purchase_view_state = 'list'; st.rerun()
+                except StockConflictError:
+                    transaction_db.rollback(); st.error("A line's quantity cannot be lower than what batches have already used from that lot.")
                 except Exception as e:
                     transaction_db.rollback(); st.error(f"An error occurred: {e}")
 
@@ -295,13 +317,13 @@ def render(db: Session, user: User, is_mobile: bool):
 
         with tab2:
             st.subheader("Record a New Multi-Item Purchase")
-            inventory_items = db.query(InventoryItem).filter(InventoryItem.user_id == user.id).order_by(InventoryItem.name).all()
-            suppliers = db.query(Supplier).filter(Supplier.user_id == user.id).order_by(Supplier.name).all()
+            inventory_items = get_reference_options(db, user.id, INVENTORY_ITEMS)
+            suppliers = get_reference_options(db, user.id, SUPPLIERS)
             if not inventory_items:
                 st.error("You must add an inventory item on the 'Manage Inventory' page before you can record a purchase."); 
             else:
                 with st.form("purchase_order_form", clear_on_submit=True):
-                    sup_options = {sup.id: sup.name for sup in suppliers}; sup_options[None] = "N/A"
+                    sup_options = dict(suppliers); sup_options[None] = "N/A"
                     c1, c2 = st.columns(2)
                     order_date = c1.date_input("Order Date*", value=datetime.date.today())
                     selected_sup_id = c2.selectbox("Supplier", options=list(sup_options.keys()), format_func=lambda x: sup_options[x])
@@ -310,7 +332,7 @@ def render(db: Session, user: User, is_mobile: bool):
                     uploaded_files = st.file_uploader("Attach Documents (Invoice, Photos, etc.)", accept_multiple_files=True)
                     st.markdown("**Step 2: Add items included in this purchase**")
                     line_items_df = pd.DataFrame([{"Item": None, "Quantity (g or units)": 0.0, "Item Cost (€)": 0.0, "Supplier Lot #": ""}])
-                    edited_line_items = st.data_editor(line_items_df, num_rows="dynamic", use_container_width=True, hide_index=True, column_config={"Item": st.column_config.SelectboxColumn("Item*", options=[item.name for item in inventory_items], required=True), "Quantity (g or units)": st.column_config.NumberColumn("Quantity (g or units)*", min_value=0.01, required=True, format="%.2f"), "Item Cost (€)": st.column_config.NumberColumn("Item Cost (€)*", min_value=0.0, required=True, format="%.2f"), "Supplier Lot #": st.column_config.TextColumn("Supplier Lot #")})
+                    edited_line_items = st.data_editor(line_items_df, num_rows="dynamic", use_container_width=True, hide_index=True, column_config={"Item": st.column_config.SelectboxColumn("Item*", options=[name for _, name in inventory_items], required=True), "Quantity (g or units)": st.column_config.NumberColumn("Quantity (g or units)*", min_value=0.01, required=True, format="%.2f"), "Item Cost (€)": st.column_config.NumberColumn("Item Cost (€)*", min_value=0.0, required=True, format="%.2f"), "Supplier Lot #": st.column_config.TextColumn("Supplier Lot #")})
                     
                     if st.form_submit_button("💾 Save Full Purchase Order", type="primary"):
                         with SessionLocal() as transaction_db:
@@ -325,13 +347,14 @@ def render(db: Session, user: User, is_mobile: bool):
                                         saved_files = save_uploaded_files(user.id, new_po.id, uploaded_files)
                                         for file_info in saved_files: 
                                             transaction_db.add(PurchaseDocument(purchase_order_id=new_po.id, file_path=file_info["path"], original_filename=file_info["name"]))
-                                    item_map = {item.name: item.id for item in inventory_items}
+                                    item_map = {name: item_id for item_id, name in inventory_items}
                                     for _, row in line_items_to_save.iterrows():
                                         if item_id := item_map.get(row["Item"]):
                                             new_stock = StockAddition(purchase_order_id=new_po.id, inventoryitem_id=item_id, quantity_added_grams=Decimal(str(row["Quantity (g or units)"])), item_cost=Decimal(str(row["Item Cost (€)"])), supplier_lot_number=row["Supplier Lot #"], quantity_remaining_grams=Decimal(str(row["Quantity (g or units)"])))
                                             transaction_db.add(new_stock)
                                     
                                     transaction_db.flush()
+                                    adjust_cost_index_for_po(transaction_db, new_po.id, 1)
                                     sync_po_transaction(transaction_db, new_po, line_items_to_save, user)
                                     
                                     transaction_db.commit()
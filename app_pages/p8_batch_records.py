@@ -16,6 +16,10 @@ from models import (
     BatchIngredientUsage, StockAddition, ProductMaterial, Employee, InventoryItem,
     ProductProductionTask, StandardProductionTask, BatchProductionTask, PurchaseOrder
 )
+from utils.lot_allocation import auto_allocate_batch, allocate_from_lot, run_with_conflict_retry, StockConflictError
+from utils.batch_codes import create_run_batches
+from utils.data_versions import EMPLOYEES
+from utils.reference_cache import get_reference_options
 
 # --- Helper Functions ---
 def init_state():
@@ -25,18 +29,11 @@ def init_state():
     if 'show_delete_confirm_batch' not in st.session_state: st.session_state.show_delete_confirm_batch = False
 
 def get_all_batch_records(db: Session, user_id: int):
-    return db.query(BatchRecord).join(ProductionRun).filter(ProductionRun.user_id == user_id).options(joinedload(BatchRecord.production_run_ref).joinedload(ProductionRun.product_ref), joinedload(BatchRecord.person_responsible_ref)).order_by(BatchRecord.manufacturing_date.desc(), BatchRecord.batch_code.desc()).all()
+    return db.query(BatchRecord).join(ProductionRun).filter(BatchRecord.user_id == user_id, ProductionRun.user_id == user_id).options(joinedload(BatchRecord.production_run_ref).joinedload(ProductionRun.product_ref), joinedload(BatchRecord.person_responsible_ref)).order_by(BatchRecord.manufacturing_date.desc(), BatchRecord.batch_code.desc()).all()
 
 def get_full_batch_details(db: Session, batch_id: int):
     return db.query(BatchRecord).options(joinedload(BatchRecord.production_run_ref).joinedload(ProductionRun.product_ref).selectinload(Product.materials).selectinload(ProductMaterial.inventoryitem_ref), joinedload(BatchRecord.production_run_ref).joinedload(ProductionRun.product_ref).selectinload(Product.production_tasks).selectinload(ProductProductionTask.standard_task_ref), joinedload(BatchRecord.production_run_ref).joinedload(ProductionRun.product_ref).selectinload(Product.production_tasks).selectinload(ProductProductionTask.employee_ref), selectinload(BatchRecord.inventoryitem_usages).joinedload(BatchIngredientUsage.stock_addition_ref).joinedload(StockAddition.purchase_order_ref), selectinload(BatchRecord.inventoryitem_usages).joinedload(BatchIngredientUsage.stock_addition_ref).joinedload(StockAddition.inventoryitem_ref), selectinload(BatchRecord.production_tasks).joinedload(BatchProductionTask.employee_ref), selectinload(BatchRecord.production_tasks).joinedload(BatchProductionTask.standard_task_ref), joinedload(BatchRecord.person_responsible_ref)).filter(BatchRecord.id == batch_id).first()
 
-def generate_next_batch_code(db: Session, user_id: int, product_code: str | None) -> str:
-    prefix_code = product_code if product_code and product_code.strip() else "PROD"
-    today = datetime.date.today(); date_str = today.strftime('%y%m%d'); search_prefix = f"{prefix_code}-{date_str}-"
-    count_today = db.query(func.count(BatchRecord.id)).join(ProductionRun).filter(ProductionRun.user_id == user_id, BatchRecord.batch_code.like(f"{search_prefix}%")).scalar()
-    next_seq = (count_today or 0) + 1
-    return f"{search_prefix}{next_seq:02d}"
-
 def render_new_run_form(db: Session, user: User):
     st.subheader("🚀 Start New Production Run")
     products = db.query(Product).filter(Product.user_id == user.id).order_by(Product.product_name).all()
@@ -45,18 +42,19 @@ def render_new_run_form(db: Session, user: User):
         product_options = {p.id: p.product_name for p in products}
         selected_product_id = st.selectbox("Select Product", options=list(product_options.keys()), format_func=lambda x: product_options[x])
         planned_count = st.number_input("Number of Batches to Plan in this Run", min_value=1, value=1, step=1)
+        create_all = st.checkbox("Create all planned batches now", value=False, help="Otherwise only the first batch is created.")
         notes = st.text_area("Notes for this Run")
-        if st.form_submit_button("Create Run and First Batch"):
+        if st.form_submit_button("Create Run"):
             with SessionLocal() as transaction_db:
                 try:
                     new_run = ProductionRun(user_id=user.id, product_id=selected_product_id, planned_batch_count=planned_count, notes=notes)
                     transaction_db.add(new_run); transaction_db.flush()
                     selected_product = transaction_db.query(Product).filter(Product.id == selected_product_id).first()
-                    new_batch_code = generate_next_batch_code(transaction_db, user.id, selected_product.product_code)
-                    new_batch = BatchRecord(production_run_id=new_run.id, user_id=user.id, batch_code=new_batch_code, manufacturing_date=datetime.date.today())
-                    transaction_db.add(new_batch); transaction_db.commit()
-                    st.success(f"Production run started for '{product_options[selected_product_id]}' and batch '{new_batch_code}' has been created.")
-                    st.session_state.show_new_run_form = False; st.session_state.editing_batch_id = new_batch.id
+                    created = create_run_batches(transaction_db, new_run, selected_product.product_code, int(planned_count) if create_all else 1)
+                    transaction_db.commit()
+                    codes = ", ".join(code for _, code in created)
+                    st.success(f"Production run started for '{product_options[selected_product_id]}' and {len(created)} batch(es) created: {codes}.")
+                    st.session_state.show_new_run_form = False; st.session_state.editing_batch_id = created[0][0]
                 except Exception as e:
                     transaction_db.rollback(); st.error(f"An error occurred: {e}")
             st.rerun()
@@ -102,8 +100,7 @@ def render_batch_editor(db: Session, user: User):
         render_workflow_section(db, user, batch)
 
 def render_main_details_form(db: Session, user: User, batch: BatchRecord):
-    employees = db.query(Employee).filter(Employee.user_id == user.id).order_by(Employee.name).all()
-    employee_options = {emp.id: emp.name for emp in employees}; employee_options[None] = "N/A"
+    employee_options = dict(get_reference_options(db, user.id, EMPLOYEES)); employee_options[None] = "N/A"
     
     with st.form("batch_edit_form"):
         st.markdown(f"**Product:** {batch.production_run_ref.product_ref.product_name}")
@@ -152,6 +149,26 @@ def render_traceability_section(db: Session, user: User, batch: BatchRecord):
     
     summary_data = [{"Item": v["name"], "Required": f"{v['required']:.2f}", "Used": f"{v['used']:.2f}", "Status": "✅" if v['used'] >= v['required'] else "⏳"} for k, v in usage_summary.items()]
     st.dataframe(summary_data, hide_index=True, use_container_width=True)
+
+    # The outcome of the last auto-allocation, kept across the rerun that redraws the allocations.
+    messages_key = f"auto_allocate_messages_{batch.id}"
+    for kind, message in st.session_state.pop(messages_key, []):
+        getattr(st, kind)(message)
+
+    if any(v['used'] < v['required'] for v in usage_summary.values()):
+        if st.button("⚡ Auto-allocate batch (oldest lots first)", type="primary", key="auto_allocate_batch"):
+            messages = []
+            try:
+                result = run_with_conflict_retry(auto_allocate_batch, batch.id, user.id)
+                messages.append(("success", f"Allocated {len(result['allocations'])} lot usage(s) to this batch."))
+                for item_name, missing in result['shortfalls'].items():
+                    messages.append(("warning", f"Not enough stock for {item_name}: still missing {missing:.2f}."))
+            except StockConflictError:
+                messages.append(("error", "Stock changed while allocating (another allocation was in progress). Please try again."))
+            except Exception as e:
+                messages.append(("error", f"An error occurred during auto-allocation: {e}"))
+            st.session_state[messages_key] = messages
+            st.rerun()
     st.markdown("---")
 
     for material in bom:
@@ -181,14 +198,11 @@ def render_traceability_section(db: Session, user: User, batch: BatchRecord):
                     if st.form_submit_button("Allocate"):
                         with SessionLocal() as transaction_db:
                             try:
-                                stock_to_update = transaction_db.query(StockAddition).filter(StockAddition.id == selected_stock_id).one()
-                                if Decimal(str(qty_to_use)) > stock_to_update.quantity_remaining_grams:
-                                    st.error("Cannot use more than the remaining quantity in the selected lot."); transaction_db.rollback()
-                                else:
-                                    new_usage = BatchIngredientUsage(batch_record_id=batch.id, stock_addition_id=selected_stock_id, inventoryitem_id=material.inventoryitem_id, quantity_used_grams=Decimal(str(qty_to_use)))
-                                    transaction_db.add(new_usage)
-                                    stock_to_update.quantity_remaining_grams -= Decimal(str(qty_to_use)); transaction_db.commit()
-                                    st.success("Allocation saved!"); st.rerun()
+                                allocate_from_lot(transaction_db, batch.id, selected_stock_id, material.inventoryitem_id, Decimal(str(qty_to_use)))
+                                transaction_db.commit()
+                                st.success("Allocation saved!"); st.rerun()
+                            except StockConflictError:
+                                transaction_db.rollback(); st.error("Cannot use more than the remaining quantity in the selected lot.")
                             except Exception as e:
                                 transaction_db.rollback(); st.error(f"An error occurred: {e}")
 
@@ -196,19 +210,19 @@ def render_workflow_section(db: Session, user: User, batch: BatchRecord):
     st.write("Record the actual employee who performed each task for this specific batch. The default is from the product template.")
     standard_workflow = batch.production_run_ref.product_ref.production_tasks
     if not standard_workflow: st.warning("This product has no workflow defined on the 'Manage Products' page."); return
-    all_employees = db.query(Employee).filter(Employee.user_id == user.id).order_by(Employee.name).all()
+    all_employees = get_reference_options(db, user.id, EMPLOYEES)
     if not all_employees: st.error("No employees found. Please add employees on the 'Manage Employees' page."); return
     batch_task_map = {bt.standard_task_id: bt.employee_ref.name for bt in batch.production_tasks}
     workflow_data = [{"ID": std_task.standard_task_id, "Task": std_task.standard_task_ref.task_name, "Assigned To": batch_task_map.get(std_task.standard_task_id, std_task.employee_ref.name), "Time (minutes)": std_task.time_minutes} for std_task in standard_workflow]
     df_workflow = pd.DataFrame(workflow_data)
     with st.form("workflow_form"):
         st.markdown("**Edit Batch Workflow**")
-        edited_df = st.data_editor(df_workflow, key="batch_workflow_editor", use_container_width=True, hide_index=True, column_config={"ID": None, "Task": st.column_config.TextColumn("Task", disabled=True), "Time (minutes)": st.column_config.NumberColumn("Time (minutes)", disabled=True, format="%.1f"), "Assigned To": st.column_config.SelectboxColumn("Assigned To", options=[emp.name for emp in all_employees], required=True)})
+        edited_df = st.data_editor(df_workflow, key="batch_workflow_editor", use_container_width=True, hide_index=True, column_config={"ID": None, "Task": st.column_config.TextColumn("Task", disabled=True), "Time (minutes)": st.column_config.NumberColumn("Time (minutes)", disabled=True, format="%.1f"), "Assigned To": st.column_config.SelectboxColumn("Assigned To", options=[name for _, name in all_employees], required=True)})
         if st.form_submit_button("Save Workflow Changes", type="primary"):
             with SessionLocal() as transaction_db:
                 try:
                     transaction_db.query(BatchProductionTask).filter(BatchProductionTask.batch_record_id == batch.id).delete()
-                    emp_map = {emp.name: emp.id for emp in all_employees}
+                    emp_map = {name: emp_id for emp_id, name in all_employees}
                     for _, row in edited_df.iterrows():
                         std_task_id, assigned_emp_name = row["ID"], row["Assigned To"]
                         if emp_id := emp_map.get(assigned_emp_name):
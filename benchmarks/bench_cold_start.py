@@ -0,0 +1,65 @@
+# benchmarks/bench_cold_start.py
+"""
+Measures what main_app.py imports before it can draw its first page, in a fresh interpreter:
+
+  eager   the app's own imports plus every app_pages module and the Excel export (how the router used to start)
+  lazy    the app's own imports plus only the default page ("Manage Products"), as now
+
+It also reports whether pandas and openpyxl were loaded, since openpyxl should only load when an
+Excel export actually runs. streamlit_authenticator and streamlit_js_eval are left out so the
+benchmark runs without them installed; both modes pay for them equally.
+
+Usage: python benchmarks/bench_cold_start.py [--runs 5] [--first-page app_pages.p6_manage_products]
+"""
+import argparse
+import glob
+import os
+import statistics
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+APP_IMPORTS = ["streamlit", "yaml", "models", "utils.sql_instrumentation", "utils.render_profiling", "utils.page_loader"]
+ALL_PAGES = sorted(f"app_pages.{os.path.basename(path)[:-3]}" for path in glob.glob(os.path.join(PROJECT_ROOT, "app_pages", "p*.py")))
+
+CHILD_SCRIPT = """
+import importlib, sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+for module in {modules!r}:
+    importlib.import_module(module)
+elapsed = time.perf_counter() - start
+print(elapsed, "pandas" in sys.modules, "openpyxl" in sys.modules)
+"""
+
+
+def time_imports(modules):
+    result = subprocess.run([sys.executable, "-c", CHILD_SCRIPT.format(root=PROJECT_ROOT, modules=modules)], capture_output=True, text=True, cwd=PROJECT_ROOT)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    elapsed, pandas_loaded, openpyxl_loaded = result.stdout.split()[-3:]
+    return float(elapsed), pandas_loaded == "True", openpyxl_loaded == "True"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--first-page", default="app_pages.p6_manage_products", help="Module of the page drawn first")
+    args = parser.parse_args()
+
+    # The reports page used to import utils.excel_report (and so openpyxl) at module level via utils.report_jobs.
+    modes = {"eager": APP_IMPORTS + ALL_PAGES + ["utils.excel_report"], "lazy": APP_IMPORTS + [args.first_page]}
+    print(f"--- Cold start imports over {args.runs} runs ({len(ALL_PAGES)} page modules) ---")
+    medians = {}
+    for mode, modules in modes.items():
+        results = [time_imports(modules) for _ in range(args.runs)]
+        timings = [elapsed for elapsed, _, _ in results]
+        medians[mode] = statistics.median(timings)
+        _, pandas_loaded, openpyxl_loaded = results[-1]
+        print(f"  {mode:<6} median {medians[mode] * 1000:8.1f} ms   min {min(timings) * 1000:8.1f} ms   "
+              f"pandas {'loaded' if pandas_loaded else 'not loaded'}, openpyxl {'loaded' if openpyxl_loaded else 'not loaded'}")
+    print(f"✅ Lazy page loading saves {(medians['eager'] - medians['lazy']) * 1000:.0f} ms ({1 - medians['lazy'] / medians['eager']:.0%}) before the first page is drawn.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# benchmarks/bench_costing.py
+"""
+Compares the legacy per-product material costing loop against the bulk costing engine
+(utils/costing.py) on whatever dataset the configured database holds, e.g. after running
+seed_database.py.
+
+Usage: python benchmarks/bench_costing.py [--username USERNAME] [--repeat N]
+"""
+import argparse
+import os
+import sys
+import time
+from decimal import Decimal
+
+from sqlalchemy import event, func
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from models import engine, SessionLocal, User, Product, StockAddition, PurchaseOrder
+from utils.costing import calculate_product_costs
+
+
+class StatementCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args, **kwargs):
+        self.count += 1
+
+
+def legacy_material_costs(db, product, user_id):
+    """The material costing loop as it was in p6_manage_products.calculate_full_costs."""
+    material_cost_per_item = Decimal('0.0')
+    for material in product.materials:
+        additions = db.query(StockAddition).join(PurchaseOrder).filter(
+            StockAddition.inventoryitem_id == material.inventoryitem_id,
+            PurchaseOrder.user_id == user_id
+        ).all()
+        total_cost, total_qty = Decimal('0.0'), Decimal('0.0')
+        for add in additions:
+            total_items_in_po = db.query(func.count(StockAddition.id)).filter(StockAddition.purchase_order_id == add.purchase_order_id).scalar()
+            shipping_per_item = add.purchase_order_ref.shipping_cost / total_items_in_po if total_items_in_po > 0 else Decimal('0.0')
+            total_cost += add.item_cost + shipping_per_item
+            total_qty += add.quantity_added_grams
+        if total_qty > 0:
+            material_cost_per_item += material.quantity_grams * (total_cost / total_qty)
+    return material_cost_per_item
+
+
+def timed(label, fn, repeat):
+    counter = StatementCounter()
+    event.listen(engine, "before_cursor_execute", counter)
+    try:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            result = fn()
+        elapsed = (time.perf_counter() - start) / repeat
+    finally:
+        event.remove(engine, "before_cursor_execute", counter)
+    print(f"  {label:<28} {elapsed * 1000:10.1f} ms/run {counter.count // repeat:8d} statements/run")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--username", help="User whose products are costed (default: first user)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        user_query = db.query(User)
+        user = user_query.filter(User.username == args.username).first() if args.username else user_query.order_by(User.id).first()
+        if not user:
+            print("❌ No user found. Seed the database first."); return
+
+        product_ids = [p.id for p in db.query(Product.id).filter(Product.user_id == user.id).all()]
+        print(f"--- Costing {len(product_ids)} products for user '{user.username}' ---")
+
+        def run_legacy():
+            results = {}
+            for product_id in product_ids:
+                db.expire_all()
+                product = db.query(Product).filter(Product.id == product_id).one()
+                results[product_id] = legacy_material_costs(db, product, user.id)
+            return results
+
+        def run_engine():
+            db.expire_all()
+            return {pid: b['total_material_cost_per_item'] for pid, b in calculate_product_costs(db, user.id).items()}
+
+        legacy = timed("legacy (per product)", run_legacy, args.repeat)
+        bulk = timed("bulk costing engine", run_engine, args.repeat)
+
+        mismatches = [pid for pid in product_ids if abs(legacy[pid] - bulk.get(pid, Decimal('0.0'))) > Decimal('0.0001')]
+        if mismatches:
+            print(f"❌ Material costs differ for product ids: {mismatches}")
+            sys.exit(1)
+        print("✅ Material costs match.")
+
+
+if __name__ == "__main__":
+    main()
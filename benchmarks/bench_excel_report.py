@@ -0,0 +1,131 @@
+# benchmarks/bench_excel_report.py
+"""
+Compares peak memory (RSS) and wall time of the legacy in-memory Excel report builder against
+the streaming write-only exporter (utils/excel_report.py) on synthetic transactions.
+
+Each (builder, size) pair runs in its own subprocess so peak RSS is measured in isolation.
+No data is read from the database.
+
+Usage: python benchmarks/bench_excel_report.py [--sizes 10000 100000 1000000] [--legacy-max N]
+"""
+import argparse
+import datetime
+import io
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from decimal import Decimal
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+CATEGORIES = ["Advertising", "Bank Fees", "Insurance", "Materials", "Packaging", "Phones", "Postage", "Rent", "Software", "Utilities"]
+START_DATE = datetime.date(2020, 1, 1)
+
+
+def synthetic_rows(n: int, years: int = 4):
+    """Yields n (date, description, type, amount, category) rows ordered by date, like the report query."""
+    from models import TransactionType
+    rnd = random.Random(42)
+    types = [TransactionType.EXPENSE] * 6 + [TransactionType.SALE] * 3 + [TransactionType.DRAWING]
+    days = years * 365
+    for i in range(n):
+        t_type = rnd.choice(types)
+        yield (START_DATE + datetime.timedelta(days=i * days // n), f"Transaction {i}", t_type,
+               Decimal(rnd.randint(100, 99999)) / 100, rnd.choice(CATEGORIES) if t_type == TransactionType.EXPENSE else None)
+
+
+def legacy_report(size, start_date, end_date):
+    """The report builder as it was in p13_revenue_reports.generate_excel_report (full workbook and DataFrame in memory)."""
+    import pandas as pd
+    from openpyxl import Workbook
+    from openpyxl.utils import get_column_letter
+    from models import TransactionType
+
+    wb = Workbook()
+    wb.remove(wb.active)
+    df = pd.DataFrame([{'date': d, 'description': desc, 'type': t, 'amount': a, 'category': c or 'Misc'} for d, desc, t, a, c in synthetic_rows(size)])
+    if not df.empty:
+        df['month_name'] = pd.to_datetime(df['date']).dt.strftime('%B')
+    category_to_column = {cat: i + 4 for i, cat in enumerate(CATEGORIES)}
+    months = pd.date_range(start_date, end_date, freq='MS').strftime('%B').unique()
+    for month_name in months:
+        ws = wb.create_sheet(title=month_name)
+        headers = ["Date", "Who", "Ref", "Amount"] + CATEGORIES + ["Total"]
+        ws.append(headers)
+        month_df = df[(df['month_name'] == month_name) & (df['type'] == TransactionType.EXPENSE)]
+        row_num = 2
+        for _, row in month_df.iterrows():
+            excel_row = [None] * len(headers)
+            excel_row[0], excel_row[1], excel_row[3] = row['date'], row['description'], row['amount']
+            col_idx = category_to_column.get(row['category'])
+            if col_idx:
+                excel_row[col_idx + 1] = row['amount']
+            excel_row[-1] = f"=SUM(E{row_num}:{get_column_letter(len(headers)-1)}{row_num})"
+            ws.append(excel_row)
+            row_num += 1
+    ws_bank = wb.create_sheet(title="Bank Transactions", index=1)
+    ws_bank.append(["Date", "Who", "Ref", "Out", "In", "Balance"])
+    balance = Decimal('0.0')
+    for _, row in df.iterrows():
+        is_income = row['type'] in [TransactionType.SALE, TransactionType.CAPITAL_INJECTION]
+        balance = balance + row['amount'] if is_income else balance - row['amount']
+        ws_bank.append([row['date'], row['description'], "", None if is_income else float(row['amount']), float(row['amount']) if is_income else None, float(balance)])
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer
+
+
+def streaming_report(size, start_date, end_date):
+    from models import TransactionType
+    from utils.excel_report import write_financial_report, SPOOL_MAX_SIZE
+    # Stands in for the grouped COUNT query generate_excel_report runs before streaming.
+    counts = {}
+    for d, _, t, _, _ in synthetic_rows(size):
+        if t == TransactionType.EXPENSE:
+            counts[(d.year, d.month)] = counts.get((d.year, d.month), 0) + 1
+    buffer = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    write_financial_report(buffer, synthetic_rows(size), start_date, end_date, CATEGORIES, counts)
+    return buffer
+
+
+def worker(builder: str, size: int):
+    end_date = START_DATE + datetime.timedelta(days=4 * 365 - 1)
+    build = legacy_report if builder == "legacy" else streaming_report
+    start = time.perf_counter()
+    output = build(size, START_DATE, end_date)
+    elapsed = time.perf_counter() - start
+    output.seek(0, os.SEEK_END)
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak_kb //= 1024
+    print(f"{elapsed:.3f} {peak_kb} {output.tell()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--legacy-max", type=int, default=1_000_000, help="Skip the legacy builder above this many transactions")
+    parser.add_argument("--worker", nargs=2, metavar=("BUILDER", "SIZE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.worker[0], int(args.worker[1])); return
+
+    print(f"--- Excel report: {'transactions':>12} {'wall time':>12} {'peak RSS':>12} {'file size':>12} ---")
+    for size in args.sizes:
+        for builder in ("legacy", "streaming"):
+            if builder == "legacy" and size > args.legacy_max:
+                print(f"  {builder:<10} {size:>14,}      (skipped)"); continue
+            result = subprocess.run([sys.executable, __file__, "--worker", builder, str(size)], capture_output=True, text=True)
+            if result.returncode != 0:
+                print(f"  {builder:<10} {size:>14,}      ❌ failed: {result.stderr.strip().splitlines()[-1] if result.stderr else result.returncode}"); continue
+            elapsed, peak_kb, file_size = result.stdout.split()
+            print(f"  {builder:<10} {size:>14,} {float(elapsed):>10.2f} s {int(peak_kb) / 1024:>9.1f} MB {int(file_size) / 1024 / 1024:>9.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
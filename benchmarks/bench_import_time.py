@@ -0,0 +1,75 @@
+# benchmarks/bench_import_time.py
+"""
+Measures how long importing the ORM (and optionally other modules) takes in a fresh interpreter,
+and checks that the import opens no network connection and creates no engine.
+
+Each run is a new subprocess with socket connections disabled and the database environment
+variables removed, so any import-time connection attempt shows up as a failure rather than a stall.
+
+Usage: python benchmarks/bench_import_time.py [--modules models app_pages.p13_revenue_reports] [--runs N]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DB_ENV_VARS = ("DATABASE_URL", "DB_SERVER", "DB_NAME", "DB_DRIVER", "ENTRA_CLIENT_ID", "ENTRA_CLIENT_SECRET")
+
+# Runs inside the child: block sockets, import the module, report the time and whether an engine exists.
+CHILD_SCRIPT = """
+import socket, sys, time
+def refuse(*args, **kwargs):
+    raise RuntimeError("network access during import")
+socket.socket.connect = refuse
+socket.create_connection = refuse
+sys.path.insert(0, {root!r})
+import dotenv
+dotenv.load_dotenv = lambda *args, **kwargs: False
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+import models
+print(elapsed, models._engine is not None)
+"""
+
+
+def time_import(module: str):
+    env = {k: v for k, v in os.environ.items() if k not in DB_ENV_VARS}
+    result = subprocess.run([sys.executable, "-c", CHILD_SCRIPT.format(root=PROJECT_ROOT, module=module)], capture_output=True, text=True, env=env, cwd=PROJECT_ROOT)
+    if result.returncode != 0:
+        return None, result.stderr.strip().splitlines()[-1] if result.stderr else str(result.returncode)
+    elapsed, engine_created = result.stdout.split()[-2:]
+    return float(elapsed), engine_created == "True"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", nargs="+", default=["models", "app_pages.p13_revenue_reports"])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"--- Cold import time over {args.runs} runs (no network, no database settings) ---")
+    failed = False
+    for module in args.modules:
+        timings, engine_created, error = [], False, None
+        for _ in range(args.runs):
+            elapsed, outcome = time_import(module)
+            if elapsed is None:
+                error = outcome; break
+            timings.append(elapsed)
+            engine_created = engine_created or outcome
+        if error:
+            failed = True
+            print(f"  ❌ {module:<36} failed: {error}")
+        elif engine_created:
+            failed = True
+            print(f"  ❌ {module:<36} created a database engine at import time")
+        else:
+            print(f"  ✅ {module:<36} median {statistics.median(timings) * 1000:8.1f} ms   min {min(timings) * 1000:8.1f} ms")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
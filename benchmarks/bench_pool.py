@@ -0,0 +1,67 @@
+# benchmarks/bench_pool.py
+"""
+Simulates concurrent Streamlit sessions against the configured database for several pool sizes
+and prints the checkout wait and occupancy figures from utils/pool_metrics.py, to help choose
+DB_POOL_SIZE / DB_MAX_OVERFLOW.
+
+Each simulated session opens a SessionLocal per "page render", runs a small user-scoped query,
+holds the connection for --hold-ms (standing in for the rest of the render) and repeats.
+
+Usage: python benchmarks/bench_pool.py [--sessions 20] [--renders 10] [--pool-sizes 2 5 10] [--max-overflow 0] [--hold-ms 50] [--url URL]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+from sqlalchemy import func
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import models
+from models import SessionLocal, Transaction, get_database_url
+from utils.pool_metrics import TimedQueuePool, get_pool_stats
+
+
+def simulate_session(renders: int, hold_seconds: float, errors: list):
+    for _ in range(renders):
+        try:
+            with SessionLocal() as db:
+                db.query(func.count(Transaction.id)).filter(Transaction.user_id == 1).scalar()
+                time.sleep(hold_seconds)
+        except Exception as e:
+            errors.append(e)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20, help="Concurrent simulated sessions")
+    parser.add_argument("--renders", type=int, default=10, help="Page renders per session")
+    parser.add_argument("--pool-sizes", type=int, nargs="+", default=[2, 5, 10])
+    parser.add_argument("--max-overflow", type=int, default=0)
+    parser.add_argument("--hold-ms", type=float, default=50.0, help="How long each render keeps its connection")
+    parser.add_argument("--url", help="Database URL (defaults to the app's configured database)")
+    args = parser.parse_args()
+
+    db_url = args.url or get_database_url()
+    print(f"--- Pool sizing: {args.sessions} sessions x {args.renders} renders, {args.hold_ms:.0f} ms per render ---")
+    print(f"  {'pool':>4} {'overflow':>8} {'wall':>8} {'peak':>5} {'connects':>8} {'avg wait':>10} {'p95 wait':>10} {'max wait':>10} {'slow':>5} {'timeouts':>8}")
+    for pool_size in args.pool_sizes:
+        engine = models.configure_engine(db_url, poolclass=TimedQueuePool, pool_size=pool_size, max_overflow=args.max_overflow, pool_timeout=60)
+        errors = []
+        threads = [threading.Thread(target=simulate_session, args=(args.renders, args.hold_ms / 1000, errors)) for _ in range(args.sessions)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - start
+        stats = get_pool_stats(engine)
+        print(f"  {pool_size:>4} {args.max_overflow:>8} {wall:>7.2f}s {stats['peak_checked_out']:>5} {stats['connects']:>8} "
+              f"{stats['wait_avg_ms']:>8.1f}ms {stats['wait_p95_ms']:>8.1f}ms {stats['wait_max_ms']:>8.1f}ms {stats['slow_checkouts']:>5} {stats['timeouts']:>8}")
+        if errors:
+            print(f"  ❌ {len(errors)} renders failed, first error: {errors[0]}")
+
+
+if __name__ == "__main__":
+    main()
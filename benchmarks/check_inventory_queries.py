@@ -0,0 +1,70 @@
+# benchmarks/check_inventory_queries.py
+"""
+Query-count regression check for the Stock Management inventory overview: runs
+get_inventory_data against two generated SQLite datasets of different sizes and counts its
+statements with utils/sql_instrumentation.track_render (a before/after_cursor_execute listener).
+
+Fails if the count is above EXPECTED_STATEMENTS or differs between the datasets, i.e. if the
+overview has gone back to querying per item or per lot.
+
+Usage: python benchmarks/check_inventory_queries.py [--scales 0.05 0.5] [--keep-dir DIR]
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from models import SessionLocal, InventoryItem, StockAddition
+from utils.sql_instrumentation import track_render
+from app_pages.p7_stock_management import get_inventory_data
+from run_benchmarks import build_dataset
+
+# The whole overview is one grouped SELECT.
+EXPECTED_STATEMENTS = 1
+
+
+def count_statements(ctx: dict) -> dict:
+    with SessionLocal() as db:
+        items = db.query(InventoryItem).filter(InventoryItem.user_id == ctx["user_id"]).count()
+        lots = db.query(StockAddition).join(InventoryItem).filter(InventoryItem.user_id == ctx["user_id"]).count()
+    # A fresh session, so nothing is served from the identity map
+    with SessionLocal() as db, track_render("get_inventory_data", ctx["user_id"]) as stats:
+        rows = get_inventory_data(db, ctx["user_id"])
+    return {"items": items, "lots": lots, "rows": len(rows), "statements": stats.statements,
+            "repeated": [f"{shape.count}x {shape.origin}" for shape in stats.repeated_shapes(threshold=1)]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", type=float, nargs=2, default=[0.05, 0.5], help="The two dataset sizes, as multiples of generate_dataset.py's default counts")
+    parser.add_argument("--keep-dir", help="Keep the generated databases in this folder instead of a temporary one")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        directory = args.keep_dir or tmp_dir
+        os.makedirs(directory, exist_ok=True)
+        for scale in sorted(args.scales):
+            ctx = build_dataset(directory, scale)
+            results[scale] = count_statements(ctx)
+            ctx["engine"].dispose()
+
+    print("--- get_inventory_data statement count ---")
+    for scale, r in results.items():
+        print(f"  scale {scale:g}: {r['items']:,} items, {r['lots']:,} lots -> {r['rows']:,} rows in {r['statements']} statement(s)")
+        for repeat in r["repeated"]:
+            print(f"    repeated: {repeat}")
+
+    counts = {r["statements"] for r in results.values()}
+    if len(counts) > 1:
+        print(f"❌ Statement count grows with data size: {', '.join(str(r['statements']) for r in results.values())}")
+        sys.exit(1)
+    if max(counts) > EXPECTED_STATEMENTS:
+        print(f"❌ {max(counts)} statements, expected {EXPECTED_STATEMENTS}.")
+        sys.exit(1)
+    print(f"✅ {EXPECTED_STATEMENTS} statement(s) regardless of data size.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# benchmarks/explain_plans.py
+"""
+Prints the execution plan of each page's main query against the configured database and
+summarises whether it is answered by index seeks or by scans.
+
+Run it before and after `alembic upgrade head` and compare, e.g.:
+
+    python benchmarks/explain_plans.py --save plans_before.json
+    alembic upgrade head
+    python benchmarks/explain_plans.py --compare plans_before.json
+
+SQL Server plans come from SET SHOWPLAN_TEXT (the query is not executed); SQLite plans from
+EXPLAIN QUERY PLAN.
+
+Usage: python benchmarks/explain_plans.py [--username USERNAME] [--save FILE] [--compare FILE] [--quiet]
+"""
+import argparse
+import datetime
+import json
+import os
+import sys
+
+from sqlalchemy import select, text
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from models import (
+    engine, SessionLocal, User, InventoryItem, Product, PurchaseOrder, StockAddition, BatchRecord,
+    BatchIngredientUsage, Invoice, InvoiceLineItem, Transaction, ProductionRun
+)
+
+
+def page_queries(user_id: int, item_id: int, sample_date):
+    """The main query of each page, in the shape the page issues it."""
+    return {
+        "p1 Inventory items": select(InventoryItem).where(InventoryItem.user_id == user_id).order_by(InventoryItem.name),
+        "p6 Products": select(Product).where(Product.user_id == user_id).order_by(Product.product_name),
+        "p7 Purchase orders": select(PurchaseOrder).where(PurchaseOrder.user_id == user_id).order_by(PurchaseOrder.order_date.desc()),
+        "p7 PO line items": select(StockAddition).where(StockAddition.purchase_order_id == 1),
+        "p8 Available lots for an item": select(StockAddition).join(PurchaseOrder).where(PurchaseOrder.user_id == user_id, StockAddition.inventoryitem_id == item_id, StockAddition.quantity_remaining_grams > 0).order_by(PurchaseOrder.order_date),
+        "p8 Batch records": select(BatchRecord).join(ProductionRun).where(BatchRecord.user_id == user_id, ProductionRun.user_id == user_id).order_by(BatchRecord.manufacturing_date.desc(), BatchRecord.batch_code.desc()),
+        "p8 Lot usages for a batch": select(BatchIngredientUsage).where(BatchIngredientUsage.batch_record_id == 1),
+        "p10 Invoices": select(Invoice).where(Invoice.user_id == user_id).order_by(Invoice.invoice_date.desc()),
+        "p10 Invoice lines": select(InvoiceLineItem).where(InvoiceLineItem.invoice_id == 1),
+        "p12 Transaction ledger": select(Transaction).where(Transaction.user_id == user_id).order_by(Transaction.date.desc()),
+        "p13 Transactions in range": select(Transaction).where(Transaction.user_id == user_id, Transaction.date.between(sample_date.replace(month=1, day=1), sample_date)).order_by(Transaction.date),
+        "p14 Batches using a lot": select(BatchIngredientUsage).where(BatchIngredientUsage.stock_addition_id == 1),
+    }
+
+
+def explain(connection, stmt) -> list:
+    dialect = connection.dialect
+    sql = str(stmt.compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+    if dialect.name == "mssql":
+        connection.exec_driver_sql("SET SHOWPLAN_TEXT ON")
+        try:
+            result = connection.exec_driver_sql(sql)
+            lines = []
+            while True:
+                lines.extend(row[0] for row in result.cursor.fetchall())
+                if not result.cursor.nextset():
+                    break
+        finally:
+            connection.exec_driver_sql("SET SHOWPLAN_TEXT OFF")
+        return [line.rstrip() for line in lines if line.strip()]
+    if dialect.name == "sqlite":
+        return [row[-1] for row in connection.execute(text(f"EXPLAIN QUERY PLAN {sql}")).fetchall()]
+    return [row[0] for row in connection.execute(text(f"EXPLAIN {sql}")).fetchall()]
+
+
+def classify(plan: list) -> dict:
+    """Counts seek, scan and sort operators in a plan (SQL Server SHOWPLAN_TEXT or SQLite EXPLAIN QUERY PLAN)."""
+    counts = {"seeks": 0, "scans": 0, "sorts": 0}
+    for line in plan:
+        op = line.upper().lstrip(" |-")
+        if "INDEX SEEK" in op or op.startswith("SEARCH"):
+            counts["seeks"] += 1
+        elif "TABLE SCAN" in op or "INDEX SCAN" in op or op.startswith("SCAN") or "SEQ SCAN" in op:
+            counts["scans"] += 1
+        if op.startswith("SORT") or "TEMP B-TREE" in op:
+            counts["sorts"] += 1
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--username", help="User whose queries are explained (default: first user)")
+    parser.add_argument("--save", help="Write the plans to this JSON file")
+    parser.add_argument("--compare", help="Compare against plans previously written with --save")
+    parser.add_argument("--quiet", action="store_true", help="Only print the summary lines")
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        user_query = db.query(User)
+        user = user_query.filter(User.username == args.username).first() if args.username else user_query.order_by(User.id).first()
+        if not user:
+            print("❌ No user found. Seed the database first."); return
+        item_id = db.query(InventoryItem.id).filter(InventoryItem.user_id == user.id).order_by(InventoryItem.id).limit(1).scalar() or 0
+        sample_date = db.query(Transaction.date).filter(Transaction.user_id == user.id).order_by(Transaction.date.desc()).limit(1).scalar()
+    sample_date = sample_date or datetime.date.today()
+
+    previous = {}
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+
+    plans = {}
+    print(f"--- Execution plans on {engine.dialect.name} for user '{user.username}' ---")
+    with engine.connect() as connection:
+        for label, stmt in page_queries(user.id, item_id, sample_date).items():
+            plan = explain(connection, stmt)
+            plans[label] = plan
+            summary = classify(plan)
+            line = f"{label:<32} seeks: {summary['seeks']:2d}  scans: {summary['scans']:2d}  sorts: {summary['sorts']:2d}"
+            if label in previous:
+                before = classify(previous[label])
+                line += f"   (before: seeks {before['seeks']}, scans {before['scans']}, sorts {before['sorts']})"
+                if summary["scans"] < before["scans"] or summary["sorts"] < before["sorts"]:
+                    line += "  ✅ fewer scans/sorts"
+            print(line)
+            if not args.quiet:
+                for plan_line in plan:
+                    print(f"      {plan_line}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(plans, f, indent=2)
+        print(f"✅ Plans written to {args.save}")
+
+
+if __name__ == "__main__":
+    main()
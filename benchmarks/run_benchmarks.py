@@ -0,0 +1,170 @@
+# benchmarks/run_benchmarks.py
+"""
+Runs the page data functions headless (no Streamlit session) against generated SQLite datasets
+of increasing size and records wall time, SQL statement count and peak Python memory for each.
+
+Datasets come from generate_dataset.py (one user per dataset, --scales multiplies its default
+row counts), so results are comparable between runs. The suite fails when any function issues
+more statements on a larger dataset than on the smallest one, i.e. when it has started to
+query per row (N+1) instead of per page.
+
+Usage: python benchmarks/run_benchmarks.py [--scales 0.05 0.2 1] [--repeat 3] [--only NAME ...] [--json FILE] [--keep-dir DIR]
+"""
+import argparse
+import datetime
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from sqlalchemy import event, func
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import models
+from models import Base, SessionLocal, Product, ProductMaterial, BatchIngredientUsage
+from generate_dataset import DEFAULT_COUNTS, BulkLoader, generate_user
+from utils.excel_report import generate_excel_report
+from utils.ledger import get_ledger_page, count_ledger_rows
+from app_pages.p6_manage_products import calculate_full_costs
+from app_pages.p7_stock_management import get_inventory_data
+from app_pages.p8_batch_records import get_all_batch_records, get_full_batch_details
+from app_pages.p10_sales_invoices import get_invoice_list
+
+DATASET_SEED = 7
+DATASET_END_DATE = datetime.date(2025, 12, 31)
+
+
+def read_excel_report(db, ctx):
+    with generate_excel_report(db, ctx["user_id"], ctx["start_date"], ctx["end_date"]) as report_file:
+        report_file.seek(0, os.SEEK_END)
+
+
+def read_ledger_pages(db, ctx):
+    _, cursor = get_ledger_page(db, ctx["user_id"])
+    get_ledger_page(db, ctx["user_id"], cursor=cursor)
+    count_ledger_rows(db, ctx["user_id"])
+
+
+# name -> function(db, ctx); each runs on a fresh session so nothing is served from the identity map
+CASES = {
+    "calculate_full_costs": lambda db, ctx: calculate_full_costs(ctx["product_id"], db, ctx["user_id"]),
+    "get_inventory_data": lambda db, ctx: get_inventory_data(db, ctx["user_id"]),
+    "get_all_batch_records": lambda db, ctx: get_all_batch_records(db, ctx["user_id"]),
+    "get_full_batch_details": lambda db, ctx: get_full_batch_details(db, ctx["batch_id"]),
+    "generate_excel_report": read_excel_report,
+    "ledger (2 pages + count)": read_ledger_pages,
+    "get_invoice_list": lambda db, ctx: get_invoice_list(db, ctx["user_id"]),
+}
+
+
+class StatementCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args, **kwargs):
+        self.count += 1
+
+
+def build_dataset(directory: str, scale: float) -> dict:
+    """Creates a SQLite database holding one generated user at `scale` and returns the benchmark context."""
+    path = os.path.join(directory, f"bench_{scale:g}.db")
+    if os.path.exists(path):
+        os.remove(path)
+    engine = models.configure_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    counts = {name: max(1, int(default * scale)) for name, default in DEFAULT_COUNTS.items()}
+    start_date = DATASET_END_DATE.replace(year=DATASET_END_DATE.year - 3) + datetime.timedelta(days=1)
+    with SessionLocal() as db:
+        loader = BulkLoader(db, 5000)
+        generate_user(loader, DATASET_SEED, 1, counts, start_date, DATASET_END_DATE, "not-a-real-hash")
+        db.commit()
+        user_id = db.query(func.min(Product.user_id)).scalar()
+        product_id = db.query(ProductMaterial.product_id).group_by(ProductMaterial.product_id).order_by(func.count().desc(), ProductMaterial.product_id).limit(1).scalar()
+        batch_id = db.query(BatchIngredientUsage.batch_record_id).order_by(BatchIngredientUsage.batch_record_id.desc()).limit(1).scalar()
+    return {
+        "engine": engine, "rows": sum(loader.counts.values()), "user_id": user_id, "product_id": product_id, "batch_id": batch_id,
+        "start_date": DATASET_END_DATE.replace(month=1, day=1), "end_date": DATASET_END_DATE,
+    }
+
+
+def measure(fn, ctx: dict, repeat: int) -> dict:
+    counter = StatementCounter()
+    event.listen(ctx["engine"], "before_cursor_execute", counter)
+    try:
+        timings, statements = [], None
+        for _ in range(repeat):
+            with SessionLocal() as db:
+                counter.count = 0
+                start = time.perf_counter()
+                fn(db, ctx)
+                timings.append(time.perf_counter() - start)
+                statements = counter.count
+    finally:
+        event.remove(ctx["engine"], "before_cursor_execute", counter)
+
+    # A separate run under tracemalloc, which slows the code down too much to time it.
+    tracemalloc.start()
+    try:
+        with SessionLocal() as db:
+            fn(db, ctx)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"ms": min(timings) * 1000, "statements": statements, "peak_mb": peak / 1024 / 1024}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", type=float, nargs="+", default=[0.05, 0.2, 1.0], help="Dataset sizes, as multiples of generate_dataset.py's default counts")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per function (the best is reported)")
+    parser.add_argument("--only", nargs="+", choices=sorted(CASES), metavar="NAME", help="Only run these functions")
+    parser.add_argument("--json", help="Also write the results to this file")
+    parser.add_argument("--keep-dir", help="Keep the generated databases in this folder instead of a temporary one")
+    args = parser.parse_args()
+
+    cases = {name: fn for name, fn in CASES.items() if not args.only or name in args.only}
+    scales = sorted(args.scales)
+    results = {name: {} for name in cases}
+    dataset_rows = {}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        directory = args.keep_dir or tmp_dir
+        os.makedirs(directory, exist_ok=True)
+        for scale in scales:
+            print(f"Generating dataset at scale {scale:g}...", end=" ", flush=True)
+            start = time.perf_counter()
+            ctx = build_dataset(directory, scale)
+            dataset_rows[scale] = ctx["rows"]
+            print(f"{ctx['rows']:,} rows in {time.perf_counter() - start:.1f}s")
+            for name, fn in cases.items():
+                results[name][scale] = measure(fn, ctx, args.repeat)
+            ctx["engine"].dispose()
+
+    print(f"\n--- Page data functions (best of {args.repeat}; statements; peak Python memory) ---")
+    print(f"  {'function':<26}" + "".join(f"{dataset_rows[s]:>22,} rows" for s in scales))
+    failed = []
+    for name, by_scale in results.items():
+        cells = "".join(f"  {r['ms']:8.1f}ms {r['statements']:3d}st {r['peak_mb']:6.1f}MB" for r in by_scale.values())
+        print(f"  {name:<26}{cells}")
+        baseline = by_scale[scales[0]]["statements"]
+        grown = {s: r["statements"] for s, r in by_scale.items() if r["statements"] > baseline}
+        if grown:
+            failed.append((name, baseline, grown))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"dataset_rows": {str(s): n for s, n in dataset_rows.items()},
+                       "results": {name: {str(s): r for s, r in by_scale.items()} for name, by_scale in results.items()}}, f, indent=2)
+
+    print()
+    for name, baseline, grown in failed:
+        print(f"❌ {name}: statement count grows with data size ({baseline} at the smallest dataset, " + ", ".join(f"{n} at {dataset_rows[s]:,} rows" for s, n in grown.items()) + ")")
+    if failed:
+        sys.exit(1)
+    print("✅ Statement counts are independent of data size.")
+
+
+if __name__ == "__main__":
+    main()
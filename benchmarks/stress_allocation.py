@@ -0,0 +1,126 @@
+# benchmarks/stress_allocation.py
+"""
+Hammers a single stock lot with concurrent allocations from several threads and checks that
+the conditional decrement in utils/lot_allocation.py never oversubscribes it: the lot must end
+non-negative and its remaining quantity must equal the original quantity minus everything
+recorded in batch_inventoryitem_usages.
+
+The fixture (a throwaway user with one item, one lot and one batch) is created in the configured
+database and deleted again afterwards.
+
+Usage: python benchmarks/stress_allocation.py [--threads N] [--attempts N] [--lot-grams G] [--take-grams G]
+"""
+import argparse
+import datetime
+import os
+import sys
+import threading
+import time
+import uuid
+from decimal import Decimal
+
+from sqlalchemy import func
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from models import (
+    SessionLocal, User, InventoryItem, Supplier, PurchaseOrder, StockAddition,
+    Product, ProductionRun, BatchRecord, BatchIngredientUsage
+)
+from utils.lot_allocation import allocate_from_lot, run_with_conflict_retry, StockConflictError
+
+
+def create_fixture(lot_grams: Decimal) -> dict:
+    with SessionLocal() as db:
+        tag = uuid.uuid4().hex[:8]
+        user = User(username=f"stress-{tag}", email=f"stress-{tag}@example.invalid", name="Allocation Stress Test", hashed_password="!", country_code="IE")
+        db.add(user); db.flush()
+        item = InventoryItem(user_id=user.id, name="Stress Test Item")
+        supplier = Supplier(user_id=user.id, name="Stress Test Supplier")
+        product = Product(user_id=user.id, product_name="Stress Test Product", product_code=f"STRESS-{tag}")
+        db.add_all([item, supplier, product]); db.flush()
+        po = PurchaseOrder(user_id=user.id, supplier_id=supplier.id, order_date=datetime.date.today(), shipping_cost=Decimal('0.0'))
+        run = ProductionRun(user_id=user.id, product_id=product.id, planned_batch_count=1)
+        db.add_all([po, run]); db.flush()
+        lot = StockAddition(purchase_order_id=po.id, inventoryitem_id=item.id, quantity_added_grams=lot_grams, quantity_remaining_grams=lot_grams, item_cost=Decimal('1.00'))
+        batch = BatchRecord(production_run_id=run.id, user_id=user.id, batch_code=f"STRESS-{tag}")
+        db.add_all([lot, batch]); db.commit()
+        return {"user_id": user.id, "item_id": item.id, "lot_id": lot.id, "batch_id": batch.id}
+
+
+def delete_fixture(fixture: dict):
+    with SessionLocal() as db:
+        user = db.get(User, fixture["user_id"])
+        if user:
+            db.delete(user); db.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--attempts", type=int, default=25, help="Allocations attempted per thread")
+    parser.add_argument("--lot-grams", type=Decimal, default=Decimal('1000'))
+    parser.add_argument("--take-grams", type=Decimal, default=Decimal('7'))
+    args = parser.parse_args()
+
+    fixture = create_fixture(args.lot_grams)
+    stats = {"allocated": 0, "rejected": 0, "errors": []}
+    lock = threading.Lock()
+    start_gate = threading.Event()
+
+    def worker():
+        start_gate.wait()
+        for _ in range(args.attempts):
+            try:
+                run_with_conflict_retry(allocate_from_lot, fixture["batch_id"], fixture["lot_id"], fixture["item_id"], args.take_grams, retries=1)
+                with lock:
+                    stats["allocated"] += 1
+            except StockConflictError:
+                with lock:
+                    stats["rejected"] += 1
+            except Exception as e:
+                with lock:
+                    stats["errors"].append(repr(e))
+
+    threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+    try:
+        for t in threads:
+            t.start()
+        started = time.perf_counter()
+        start_gate.set()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+
+        with SessionLocal() as db:
+            remaining = db.query(StockAddition.quantity_remaining_grams).filter(StockAddition.id == fixture["lot_id"]).scalar()
+            used = db.query(func.coalesce(func.sum(BatchIngredientUsage.quantity_used_grams), 0)).filter(BatchIngredientUsage.stock_addition_id == fixture["lot_id"]).scalar()
+    finally:
+        delete_fixture(fixture)
+
+    remaining, used = Decimal(str(remaining)), Decimal(str(used))
+    total = args.threads * args.attempts
+    print(f"--- {total} allocations of {args.take_grams} from a lot of {args.lot_grams} across {args.threads} threads ---")
+    print(f"  allocated: {stats['allocated']}  rejected: {stats['rejected']}  errors: {len(stats['errors'])}  ({total / elapsed:.1f} attempts/s)")
+    print(f"  remaining: {remaining}  used: {used}")
+
+    expected_allocations = min(total, int(args.lot_grams // args.take_grams))
+    failures = []
+    if remaining < 0:
+        failures.append("lot went negative")
+    if remaining + used != args.lot_grams:
+        failures.append("remaining + used does not equal the original lot quantity")
+    if used != stats["allocated"] * args.take_grams:
+        failures.append("recorded usages do not match the successful allocations")
+    if not stats["errors"] and stats["allocated"] != expected_allocations:
+        failures.append(f"expected {expected_allocations} successful allocations")
+    for error in stats["errors"][:5]:
+        print(f"  error: {error}")
+
+    if failures:
+        print(f"❌ {'; '.join(failures)}")
+        sys.exit(1)
+    print("✅ No oversubscription.")
+
+
+if __name__ == "__main__":
+    main()
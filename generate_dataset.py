@@ -0,0 +1,332 @@
+# generate_dataset.py
+"""
+Generates a large, reproducible synthetic dataset for load testing and benchmarks.
+
+Unlike seed_database.py it never prompts and never drops anything. It adds new users
+(loadtest<SEED>_<N>, password "loadtest"), each with inventory, suppliers, a purchase history with
+stock lots, production runs with batches allocated from those lots, customers, invoices and a
+multi-year ledger. Rows are written with chunked Core INSERT executemany rather than ORM add(),
+and the same --seed, scale options and --end-date always produce the same rows.
+
+Usage:
+    python generate_dataset.py                                    # 1 user at the default scale (~100k rows)
+    python generate_dataset.py --users 3 --scale 10               # 3 users, 10x the default row counts
+    python generate_dataset.py --items 5000 --invoices 50000      # override single counts (per user)
+    DATABASE_URL=sqlite:///loadtest.db python generate_dataset.py --create-schema
+"""
+import argparse
+import datetime
+import itertools
+import random
+import time
+from collections import defaultdict
+from decimal import Decimal
+from typing import Iterable, List
+
+import bcrypt
+from sqlalchemy import insert
+
+from models import (
+    Base, SessionLocal, get_engine, User, InventoryItemType, Supplier, InventoryItem, inventoryitem_supplier_association,
+    PurchaseOrder, StockAddition, Employee, StandardProductionTask, StandardShippingTask, GlobalCosts, Product,
+    ProductMaterial, ProductionRun, BatchRecord, BatchIngredientUsage, Customer, Invoice, InvoiceLineItem, InvoiceStatus,
+    ExpenseCategory, Transaction, TransactionType, UserLayoutEnumDef
+)
+from utils.cost_index import rebuild_cost_index
+from utils.financial_rollup import rebuild_financial_rollup
+
+# Per-user row counts at --scale 1
+DEFAULT_COUNTS = {
+    "items": 1000, "suppliers": 25, "products": 50, "customers": 200,
+    "purchase_orders": 5000, "production_runs": 1000, "invoices": 5000, "transactions": 20000,
+}
+DEFAULT_CHUNK_SIZE = 5000
+LOADTEST_PASSWORD = "loadtest"
+VAT_RATE = Decimal('0.23')
+CENT = Decimal('0.01')
+# Product codes (String(10), and the prefix of the globally unique batch codes) are "L" + seed, user
+# number and product index in fixed-width base 36, so every seed and user gets its own codes.
+CODE_DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+SEED_CODE_WIDTH, USER_CODE_WIDTH, PRODUCT_CODE_WIDTH = 3, 2, 3
+
+ITEM_TYPES = ["Oil/Fat/Butter", "Additive", "Lye", "Liquid", "Exfoliant", "Colorant", "Fragrance", "Packaging"]
+ITEM_NAMES = ["Coconut Oil", "Shea Butter", "Olive Oil", "Cocoa Butter", "Castor Oil", "Sodium Hydroxide", "Kaolin Clay",
+              "Activated Charcoal", "Lavender Oil", "Tea Tree Oil", "Oat Flour", "Himalayan Salt", "Mica", "Soap Box", "Label"]
+EXPENSE_CATEGORIES = ['Materials', 'Stationary', 'Phones', 'Advertising', 'Light & Heat', 'Rent & Rates', 'Misc', 'Capital']
+EMPLOYEES = [("Maker", "20.00", "Soap Maker"), ("Packer", "16.50", "Shipping Clerk"), ("Manager", "0.00", "Manager")]
+PRODUCTION_TASKS = ["Weigh Oils", "Mix Lye Solution", "Blend & Pour", "Cut Bars", "Cure Check"]
+SHIPPING_TASKS = ["Wrap", "Label", "Pack Order"]
+MANUAL_ENTRIES = [
+    (TransactionType.EXPENSE, 70, ["Phone bill", "Facebook ads", "Electricity", "Workshop rent", "Stationery", "Market stall fee"]),
+    (TransactionType.SALE, 18, ["Market day takings", "Online shop payout", "Craft fair sales"]),
+    (TransactionType.DRAWING, 10, ["Owner drawing"]),
+    (TransactionType.CAPITAL_INJECTION, 2, ["Owner capital injection"]),
+]
+
+
+def money(rnd: random.Random, low: int, high: int) -> Decimal:
+    """A random amount between low and high (in euro), to the cent."""
+    return Decimal(rnd.randint(low * 100, high * 100)) / 100
+
+
+def base36(value: int, width: int) -> str:
+    if not 0 <= value < len(CODE_DIGITS) ** width:
+        raise ValueError(f"{value} does not fit in {width} base-36 digits")
+    digits = ""
+    for _ in range(width):
+        value, digit = divmod(value, len(CODE_DIGITS))
+        digits = CODE_DIGITS[digit] + digits
+    return digits
+
+
+def random_dates(rnd: random.Random, count: int, start_date: datetime.date, end_date: datetime.date) -> List[datetime.date]:
+    days = (end_date - start_date).days
+    return sorted(start_date + datetime.timedelta(days=rnd.randint(0, days)) for _ in range(count))
+
+
+class BulkLoader:
+    """Writes rows with chunked Core INSERT executemany on one session and counts them per table."""
+
+    def __init__(self, db, chunk_size: int):
+        self.db = db
+        self.chunk_size = chunk_size
+        self.counts = defaultdict(int)
+
+    def insert(self, target, rows: Iterable[dict]):
+        table = getattr(target, "__table__", target)
+        rows = iter(rows)
+        while True:
+            chunk = list(itertools.islice(rows, self.chunk_size))
+            if not chunk:
+                break
+            self.db.execute(insert(table), chunk)
+            self.counts[table.name] += len(chunk)
+
+    def insert_returning_ids(self, target, rows: List[dict]) -> List[int]:
+        """Inserts the rows and returns their new primary keys in the same order."""
+        table = getattr(target, "__table__", target)
+        statement = insert(table).returning(table.c.id, sort_by_parameter_order=True)
+        ids = []
+        for start in range(0, len(rows), self.chunk_size):
+            chunk = rows[start:start + self.chunk_size]
+            ids += self.db.execute(statement, chunk).scalars().all()
+            self.counts[table.name] += len(chunk)
+        return ids
+
+
+def generate_user(loader: BulkLoader, seed: int, number: int, counts: dict, start_date: datetime.date, end_date: datetime.date, password_hash: str):
+    rnd = random.Random(f"{seed}:{number}")
+    username = f"loadtest{seed}_{number}"
+    user_id, = loader.insert_returning_ids(User, [{
+        "username": username, "email": f"{username}@example.com", "name": f"Load Test {number}", "hashed_password": password_hash,
+        "country_code": "IE", "layout_preference": UserLayoutEnumDef.WIDE, "backup_retention_days": 7, "role": "user",
+    }])
+
+    # --- Reference data ---
+    type_ids = loader.insert_returning_ids(InventoryItemType, [{"user_id": user_id, "name": name} for name in ITEM_TYPES])
+    supplier_names = [f"Supplier {i:03d}" for i in range(counts["suppliers"])]
+    supplier_ids = loader.insert_returning_ids(Supplier, [
+        {"user_id": user_id, "name": name, "contact_email": f"sales{i}@supplier{i}.example.com"} for i, name in enumerate(supplier_names)
+    ])
+    item_ids = loader.insert_returning_ids(InventoryItem, [
+        {"user_id": user_id, "name": f"{rnd.choice(ITEM_NAMES)} #{i:05d}", "inventoryitem_type_id": rnd.choice(type_ids),
+         "reorder_threshold_grams": Decimal(rnd.choice([0, 100, 500, 1000]))}
+        for i in range(counts["items"])
+    ])
+    loader.insert(inventoryitem_supplier_association, (
+        {"inventoryitem_id": item_id, "supplier_id": supplier_id}
+        for item_id in item_ids for supplier_id in rnd.sample(supplier_ids, min(2, len(supplier_ids)))
+    ))
+    category_ids = dict(zip(EXPENSE_CATEGORIES, loader.insert_returning_ids(ExpenseCategory, [{"user_id": user_id, "name": name} for name in EXPENSE_CATEGORIES])))
+    employee_ids = loader.insert_returning_ids(Employee, [
+        {"user_id": user_id, "name": f"{name} {number}", "hourly_rate": Decimal(rate), "role": role} for name, rate, role in EMPLOYEES
+    ])
+    loader.insert(StandardProductionTask, ({"user_id": user_id, "task_name": name} for name in PRODUCTION_TASKS))
+    loader.insert(StandardShippingTask, ({"user_id": user_id, "task_name": name} for name in SHIPPING_TASKS))
+    loader.insert(GlobalCosts, [{"user_id": user_id, "monthly_rent": Decimal('1200.00'), "monthly_utilities": Decimal('350.00'), "total_monthly_items_for_rent_utilities": 1000}])
+
+    # Product codes prefix the (globally unique) batch codes, so they carry the seed and user number.
+    code_prefix = f"L{base36(seed, SEED_CODE_WIDTH)}{base36(number, USER_CODE_WIDTH)}"
+    products = [{"user_id": user_id, "product_name": f"Product {p:04d}", "product_code": f"{code_prefix}{base36(p, PRODUCT_CODE_WIDTH)}",
+                 "retail_price_per_item": money(rnd, 5, 15), "wholesale_price_per_item": money(rnd, 3, 7)} for p in range(counts["products"])]
+    product_ids = loader.insert_returning_ids(Product, products)
+    materials = {product_id: [(item_id, Decimal(rnd.randint(5, 120))) for item_id in rnd.sample(item_ids, min(rnd.randint(3, 5), len(item_ids)))] for product_id in product_ids}
+    loader.insert(ProductMaterial, (
+        {"product_id": product_id, "inventoryitem_id": item_id, "quantity_grams": grams} for product_id, lines in materials.items() for item_id, grams in lines
+    ))
+    customer_ids = loader.insert_returning_ids(Customer, [
+        {"user_id": user_id, "name": f"Customer {i:05d}", "contact_email": f"customer{i}@example.com"} for i in range(counts["customers"])
+    ])
+
+    # --- Purchase orders and stock lots (in date order, so lots are consumed first in, first out) ---
+    po_rows, lots = [], []
+    for po_index, order_date in enumerate(random_dates(rnd, counts["purchase_orders"], start_date, end_date)):
+        supplier_index = rnd.randrange(len(supplier_ids))
+        total_vat = Decimal('0.0')
+        for item_id in rnd.sample(item_ids, min(rnd.randint(1, 5), len(item_ids))):
+            item_cost = money(rnd, 5, 300)
+            vat_amount = (item_cost * VAT_RATE).quantize(CENT)
+            total_vat += vat_amount
+            quantity = Decimal(rnd.randint(500, 20000))
+            lots.append({"po_index": po_index, "date": order_date, "inventoryitem_id": item_id, "quantity_added_grams": quantity, "quantity_remaining_grams": quantity,
+                         "item_cost": item_cost, "vat_amount": vat_amount, "supplier_lot_number": f"LT{seed}-{number:03d}-{len(lots):07d}"})
+        po_rows.append({"user_id": user_id, "supplier_id": supplier_ids[supplier_index], "order_date": order_date,
+                        "shipping_cost": money(rnd, 0, 25), "total_vat": total_vat, "_supplier": supplier_names[supplier_index]})
+
+    # --- Production runs and batches, allocated from the lots bought on or before the batch date ---
+    lots_by_item = defaultdict(list)
+    for lot_index, lot in enumerate(lots):
+        lots_by_item[lot["inventoryitem_id"]].append(lot_index)
+    first_open_lot = defaultdict(int)
+    code_sequences = defaultdict(int)
+    run_rows, batch_rows, usages = [], [], []
+    for run_index, run_date in enumerate(random_dates(rnd, counts["production_runs"], start_date, end_date)):
+        product_index = rnd.randrange(len(product_ids))
+        planned = rnd.randint(1, 5)
+        run_rows.append({"user_id": user_id, "product_id": product_ids[product_index], "run_date": datetime.datetime.combine(run_date, datetime.time(9)), "planned_batch_count": planned})
+        for _ in range(planned):
+            prefix = f"{products[product_index]['product_code']}-{run_date:%y%m%d}"
+            code_sequences[prefix] += 1
+            bars = rnd.randint(10, 24)
+            batch_index = len(batch_rows)
+            batch_rows.append({"run_index": run_index, "user_id": user_id, "batch_code": f"{prefix}-{code_sequences[prefix]:02d}", "person_responsible_id": employee_ids[0],
+                               "manufacturing_date": run_date, "cured_date": run_date + datetime.timedelta(days=28), "bars_in_batch": bars})
+            for item_id, grams in materials[product_ids[product_index]]:
+                needed = grams * bars
+                candidates = lots_by_item[item_id]
+                while first_open_lot[item_id] < len(candidates) and lots[candidates[first_open_lot[item_id]]]["quantity_remaining_grams"] < 1:
+                    first_open_lot[item_id] += 1
+                for lot_index in candidates[first_open_lot[item_id]:]:
+                    lot = lots[lot_index]
+                    if lot["date"] > run_date:
+                        break
+                    if lot["quantity_remaining_grams"] >= needed:
+                        lot["quantity_remaining_grams"] -= needed
+                        usages.append((batch_index, lot_index, item_id, needed))
+                        break
+
+    po_ids = loader.insert_returning_ids(PurchaseOrder, [{k: v for k, v in row.items() if not k.startswith("_")} for row in po_rows])
+    lot_ids = loader.insert_returning_ids(StockAddition, [
+        {"purchase_order_id": po_ids[lot["po_index"]], **{k: v for k, v in lot.items() if k not in ("po_index", "date")}} for lot in lots
+    ])
+    run_ids = loader.insert_returning_ids(ProductionRun, run_rows)
+    batch_ids = loader.insert_returning_ids(BatchRecord, [
+        {"production_run_id": run_ids[row["run_index"]], **{k: v for k, v in row.items() if k != "run_index"}} for row in batch_rows
+    ])
+    loader.insert(BatchIngredientUsage, (
+        {"batch_record_id": batch_ids[batch_index], "stock_addition_id": lot_ids[lot_index], "inventoryitem_id": item_id, "quantity_used_grams": quantity}
+        for batch_index, lot_index, item_id, quantity in usages
+    ))
+
+    # --- Invoices ---
+    invoice_rows, invoice_lines = [], []
+    paid_after = end_date - datetime.timedelta(days=60)
+    for invoice_index, invoice_date in enumerate(random_dates(rnd, counts["invoices"], start_date, end_date)):
+        subtotal = vat = Decimal('0.0')
+        for product_index in rnd.sample(range(len(product_ids)), min(rnd.randint(1, 5), len(product_ids))):
+            quantity = Decimal(rnd.randint(1, 50))
+            unit_price = products[product_index]["wholesale_price_per_item"]
+            line_total = quantity * unit_price
+            subtotal += line_total
+            vat += (line_total * VAT_RATE).quantize(CENT)
+            invoice_lines.append({"invoice_index": invoice_index, "product_id": product_ids[product_index], "description": products[product_index]["product_name"],
+                                  "quantity": quantity, "unit_price": unit_price, "vat_rate_percent": Decimal('23.00'), "line_total": line_total})
+        if invoice_date < paid_after:
+            status = rnd.choices([InvoiceStatus.PAID, InvoiceStatus.SENT, InvoiceStatus.VOID], weights=[88, 7, 5])[0]
+        else:
+            status = rnd.choice([InvoiceStatus.DRAFT, InvoiceStatus.SENT, InvoiceStatus.PAID])
+        invoice_rows.append({"user_id": user_id, "invoice_number": f"INV-{invoice_date.year}-{invoice_index + 1:06d}", "invoice_date": invoice_date,
+                             "due_date": invoice_date + datetime.timedelta(days=30), "customer_id": rnd.choice(customer_ids),
+                             "subtotal": subtotal, "vat_amount": vat, "total_amount": subtotal + vat, "status": status})
+    invoice_ids = loader.insert_returning_ids(Invoice, invoice_rows)
+    loader.insert(InvoiceLineItem, (
+        {"invoice_id": invoice_ids[line["invoice_index"]], **{k: v for k, v in line.items() if k != "invoice_index"}} for line in invoice_lines
+    ))
+
+    # --- Ledger: one expense per purchase order, one sale per paid invoice, plus manual entries ---
+    po_costs = defaultdict(Decimal)
+    for lot in lots:
+        po_costs[lot["po_index"]] += lot["item_cost"]
+    entry_types = [entry[0] for entry in MANUAL_ENTRIES]
+    entry_weights = [entry[1] for entry in MANUAL_ENTRIES]
+    entry_texts = {entry[0]: entry[2] for entry in MANUAL_ENTRIES}
+    other_categories = [category_ids[name] for name in EXPENSE_CATEGORIES if name not in ("Materials", "Capital")]
+
+    def ledger_rows():
+        for po_index, (po_id, row) in enumerate(zip(po_ids, po_rows)):
+            yield {"user_id": user_id, "date": row["order_date"], "description": f"Purchase from {row['_supplier']} (PO #{po_id})", "amount": po_costs[po_index] + row["shipping_cost"],
+                   "transaction_type": TransactionType.EXPENSE, "category_id": category_ids["Materials"], "supplier_id": row["supplier_id"], "purchase_order_id": po_id}
+        for invoice_id, row in zip(invoice_ids, invoice_rows):
+            if row["status"] == InvoiceStatus.PAID:
+                yield {"user_id": user_id, "date": min(row["due_date"], end_date), "description": f"Payment for invoice {row['invoice_number']}", "amount": row["total_amount"],
+                       "transaction_type": TransactionType.SALE, "customer_id": row["customer_id"], "invoice_id": invoice_id}
+        for t_date in random_dates(rnd, counts["transactions"], start_date, end_date):
+            t_type = rnd.choices(entry_types, weights=entry_weights)[0]
+            yield {"user_id": user_id, "date": t_date, "description": rnd.choice(entry_texts[t_type]), "amount": money(rnd, 5, 2000 if t_type == TransactionType.CAPITAL_INJECTION else 400),
+                   "transaction_type": t_type, "category_id": rnd.choice(other_categories) if t_type == TransactionType.EXPENSE else None}
+
+    # Every row must carry the same keys for executemany batching.
+    ledger_keys = ("category_id", "supplier_id", "customer_id", "invoice_id", "purchase_order_id")
+    loader.insert(Transaction, ({**dict.fromkeys(ledger_keys), **row} for row in ledger_rows()))
+
+    # Core inserts bypass the ORM hooks, so rebuild the derived tables from what was written.
+    rebuild_cost_index(loader.db, user_id)
+    rebuild_financial_rollup(loader.db, user_id)
+    return username
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1, help="Number of users to generate.")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplier for every per-user count.")
+    for name, default in DEFAULT_COUNTS.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=int, help=f"Per-user {name.replace('_', ' ')} (default {default} x scale).")
+    parser.add_argument("--years", type=int, default=3, help="Length of the purchase, production and ledger history.")
+    parser.add_argument("--end-date", type=datetime.date.fromisoformat, default=datetime.date.today(), help="Last day of the history (YYYY-MM-DD; default today).")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Rows per INSERT executemany batch.")
+    parser.add_argument("--create-schema", action="store_true", help="Create any missing tables first (e.g. for a new SQLite database).")
+    args = parser.parse_args()
+
+    counts = {name: getattr(args, name) if getattr(args, name) is not None else max(1, int(default * args.scale)) for name, default in DEFAULT_COUNTS.items()}
+    for value, width, what in ((args.seed, SEED_CODE_WIDTH, "--seed"), (args.users, USER_CODE_WIDTH, "--users"), (counts["products"] - 1, PRODUCT_CODE_WIDTH, "--products")):
+        if not 0 <= value < len(CODE_DIGITS) ** width:
+            parser.error(f"{what} must be below {len(CODE_DIGITS) ** width} (it is encoded in the {width}-character base-36 part of the product codes).")
+    start_date = args.end_date.replace(year=args.end_date.year - args.years) + datetime.timedelta(days=1)
+
+    print("--- Synthetic Dataset Generator ---")
+    print(f"Seed {args.seed}, {args.users} user(s), {start_date} to {args.end_date}: " + ", ".join(f"{n} {name.replace('_', ' ')}" for name, n in counts.items()))
+    if args.create_schema:
+        Base.metadata.create_all(bind=get_engine())
+
+    password_hash = bcrypt.hashpw(LOADTEST_PASSWORD.encode(), bcrypt.gensalt()).decode()
+    started = time.perf_counter()
+    totals = defaultdict(int)
+    with SessionLocal() as db:
+        existing = db.query(User.username).filter(User.username.like(f"loadtest{args.seed}\\_%", escape="\\")).first()
+        if existing:
+            print(f"❌ Users for seed {args.seed} already exist (e.g. '{existing[0]}'). Use another --seed or another database.")
+            raise SystemExit(1)
+        for number in range(1, args.users + 1):
+            user_started = time.perf_counter()
+            loader = BulkLoader(db, args.chunk_size)
+            try:
+                username = generate_user(loader, args.seed, number, counts, start_date, args.end_date, password_hash)
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            rows = sum(loader.counts.values())
+            for table, n in loader.counts.items():
+                totals[table] += n
+            print(f"✅ User '{username}': {rows:,} rows in {time.perf_counter() - user_started:.1f}s")
+
+    elapsed = time.perf_counter() - started
+    total_rows = sum(totals.values())
+    for table, n in sorted(totals.items(), key=lambda item: -item[1]):
+        print(f"    {table:<36} {n:>10,}")
+    print(f"✅ {total_rows:,} rows in {elapsed:.1f}s ({total_rows / elapsed:,.0f} rows/s). Log in as any loadtest user with password '{LOADTEST_PASSWORD}'.")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,39 +8,21 @@ import datetime
 from streamlit_js_eval import streamlit_js_eval
 
 # --- Model and Utility Imports ---
-from models import get_db, User, SessionLocal, UserLayoutEnumDef
-
-# --- Page Imports ---
-from app_pages import (
-    p1_manage_inventoryitems,
-    p1b_manage_inventoryitem_types,
-    p2_manage_suppliers,
-    p3_manage_employees,
-    p4_manage_tasks,
-    p5_global_costs,
-    p6_manage_products,
-    p7_stock_management,
-    p8_batch_records,
-    p9_manage_customers,
-    p10_sales_invoices,
-    p11_financial_settings,
-    p12_transaction_ledger,
-    p13_revenue_reports,
-    p15_user_settings 
-)
+from models import get_db, get_engine, User, UserLayoutEnumDef
+from utils.user_session import get_current_user
+from utils.sql_instrumentation import SQL_DEBUG_PANEL, render_sql_debug_panel
+from utils.render_profiling import profile_render, profiling_requested, render_timings_panel
+from utils.page_loader import load_render_function, preload_pages
+from utils.pool_metrics import log_pool_stats, render_pool_stats_panel
 
 
 # --- Page Configuration at the Top ---
 def get_user_layout():
     layout = "wide"
     if st.session_state.get("authentication_status"):
-        try:
-            db = SessionLocal()
-            user = db.query(User).filter(User.username == st.session_state.get("username")).first()
-            if user and user.layout_preference:
-                layout = user.layout_preference.value
-        finally:
-            db.close()
+        user = get_current_user(st.session_state.get("username"))
+        if user and user.layout_preference:
+            layout = user.layout_preference.value
     return layout
 
 st.set_page_config(
@@ -86,7 +68,7 @@ def main():
         db_session = next(get_db())
         try:
             username = st.session_state["username"]
-            current_user = db_session.query(User).filter(User.username == username).first()
+            current_user = get_current_user(username)
             if not current_user:
                 st.error(f"User '{username}' found in authenticator but not in the database. Please contact support.")
                 st.stop()
@@ -117,7 +99,8 @@ def main():
                     "Operations & Analysis": [
                         "Manage Products", 
                         "Stock Management", 
-                        "Batch Records"
+                        "Batch Records",
+                        "Recall Report"
                     ],
                     "Financials": financials_pages,
                     "Application & User": ["User Settings"]
@@ -146,30 +129,46 @@ def main():
             active_page = st.session_state.active_page
             st.title(f"🧮 {active_page}")
 
+            # Page modules are imported on first navigation (see utils/page_loader.py), not at startup.
             page_router = {
-                "Manage Inventory Item Types": p1b_manage_inventoryitem_types.render,
-                "Manage Inventory Items": p1_manage_inventoryitems.render,
-                "Manage Suppliers": p2_manage_suppliers.render,
-                "Manage Employees": p3_manage_employees.render,
-                "Manage Tasks": p4_manage_tasks.render,
-                "Global Costs": p5_global_costs.render,
-                "Manage Products": p6_manage_products.render,
-                "Stock Management": p7_stock_management.render,
-                "Batch Records": p8_batch_records.render,
-                "Manage Customers": p9_manage_customers.render,
-                "Sales Invoices": p10_sales_invoices.render,
-                "Financial Settings": p11_financial_settings.render,
-                "Transaction Ledger": p12_transaction_ledger.render,
-                "Revenue Reports": p13_revenue_reports.render,
-                "User Settings": p15_user_settings.render,
+                "Manage Inventory Item Types": "app_pages.p1b_manage_inventoryitem_types",
+                "Manage Inventory Items": "app_pages.p1_manage_inventoryitems",
+                "Manage Suppliers": "app_pages.p2_manage_suppliers",
+                "Manage Employees": "app_pages.p3_manage_employees",
+                "Manage Tasks": "app_pages.p4_manage_tasks",
+                "Global Costs": "app_pages.p5_global_costs",
+                "Manage Products": "app_pages.p6_manage_products",
+                "Stock Management": "app_pages.p7_stock_management",
+                "Batch Records": "app_pages.p8_batch_records",
+                "Recall Report": "app_pages.p14_recall_report",
+                "Manage Customers": "app_pages.p9_manage_customers",
+                "Sales Invoices": "app_pages.p10_sales_invoices",
+                "Financial Settings": "app_pages.p11_financial_settings",
+                "Transaction Ledger": "app_pages.p12_transaction_ledger",
+                "Revenue Reports": "app_pages.p13_revenue_reports",
+                "User Settings": "app_pages.p15_user_settings",
             }
 
-            render_function = page_router.get(active_page, lambda **kwargs: st.warning("Page not found."))
-            
-            if active_page == "User Settings":
-                 render_function(db=db_session, user=current_user, authenticator=authenticator, config=config_auth, config_path=CONFIG_FILE_PATH, is_mobile=IS_MOBILE)
+            if active_page in page_router:
+                render_function = load_render_function(page_router[active_page])
             else:
-                render_function(db=db_session, user=current_user, is_mobile=IS_MOBILE)
+                render_function = lambda **kwargs: st.warning("Page not found.")
+            
+            with profile_render(active_page, current_user) as sql_stats:
+                if active_page == "User Settings":
+                     render_function(db=db_session, user=current_user, authenticator=authenticator, config=config_auth, config_path=CONFIG_FILE_PATH, is_mobile=IS_MOBILE)
+                else:
+                    render_function(db=db_session, user=current_user, is_mobile=IS_MOBILE)
+
+            with st.sidebar:
+                if SQL_DEBUG_PANEL:
+                    render_sql_debug_panel(sql_stats)
+                if profiling_requested(current_user):
+                    render_timings_panel()
+                    render_pool_stats_panel(get_engine())
+            log_pool_stats(get_engine())
+
+            preload_pages(page_router.values())
 
         finally:
             if db_session:
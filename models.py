@@ -6,48 +6,123 @@ import datetime
 from decimal import Decimal
 from sqlalchemy import (
     create_engine, func, Column, Integer, String, ForeignKey, DateTime, Text, Numeric, Boolean,
-    Enum as SQLAlchemyEnum, UniqueConstraint, Date, Table
+    Enum as SQLAlchemyEnum, UniqueConstraint, Index, Date, Table, event
 )
-from sqlalchemy.orm import sessionmaker, declarative_base, relationship
+from sqlalchemy.orm import Session, sessionmaker, declarative_base, relationship
 from sqlalchemy.sql import func
 from dotenv import load_dotenv
 import urllib
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import StaticPool
 from sqlalchemy.exc import OperationalError
+import sqlite3
+import threading
 import time
 
-load_dotenv()
-
-# --- Connection logic (including retry logic) ---
-db_server = os.environ.get("DB_SERVER")
-db_name = os.environ.get("DB_NAME")
-db_driver = os.environ.get("DB_DRIVER")
-entra_client_id = os.environ.get("ENTRA_CLIENT_ID")
-entra_client_secret = os.environ.get("ENTRA_CLIENT_SECRET")
-
-if not all([db_server, db_name, db_driver, entra_client_id, entra_client_secret]):
-    raise ValueError("One or more database connection environment variables are not set in your .env file.")
-
-odbc_conn_str = (
-    f"DRIVER={db_driver};"
-    f"SERVER={db_server};"
-    f"DATABASE={db_name};"
-    f"UID={entra_client_id};"
-    f"PWD={entra_client_secret};"
-    f"Authentication=ActiveDirectoryServicePrincipal;"
-    "Encrypt=yes;"
-    "TrustServerCertificate=no;"
-    "Connection Timeout=30;"
-)
-quoted_conn_str = urllib.parse.quote_plus(odbc_conn_str)
-DATABASE_URL = f"mssql+pyodbc:///?odbc_connect={quoted_conn_str}"
+from utils.pool_metrics import TimedQueuePool
 
+load_dotenv()
 
-def create_engine_with_retry(db_url: str):
+# --- Connection logic (lazy, including retry logic) ---
+# Nothing here touches the network at import time: the engine is created on first use
+# (get_engine(), SessionLocal(), or `models.engine`), so importing the ORM classes is cheap.
+
+def get_database_url() -> str:
+    """
+    DATABASE_URL if set (as Alembic uses), otherwise the Azure SQL URL built from the DB_* / ENTRA_* variables.
+    A SQLite URL (e.g. sqlite:///makers_ledger.db, or sqlite:// for a throwaway in-memory database)
+    runs the whole app offline; see engine_options().
+    """
+    database_url = os.environ.get("DATABASE_URL")
+    if database_url:
+        return database_url
+
+    db_server = os.environ.get("DB_SERVER")
+    db_name = os.environ.get("DB_NAME")
+    db_driver = os.environ.get("DB_DRIVER")
+    entra_client_id = os.environ.get("ENTRA_CLIENT_ID")
+    entra_client_secret = os.environ.get("ENTRA_CLIENT_SECRET")
+
+    if not all([db_server, db_name, db_driver, entra_client_id, entra_client_secret]):
+        raise ValueError("One or more database connection environment variables are not set in your .env file.")
+
+    odbc_conn_str = (
+        f"DRIVER={db_driver};"
+        f"SERVER={db_server};"
+        f"DATABASE={db_name};"
+        f"UID={entra_client_id};"
+        f"PWD={entra_client_secret};"
+        f"Authentication=ActiveDirectoryServicePrincipal;"
+        "Encrypt=yes;"
+        "TrustServerCertificate=no;"
+        "Connection Timeout=30;"
+    )
+    quoted_conn_str = urllib.parse.quote_plus(odbc_conn_str)
+    return f"mssql+pyodbc:///?odbc_connect={quoted_conn_str}"
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.environ.get(name)
+    return int(value) if value and value.strip() else default
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    value = os.environ.get(name)
+    return value.strip().lower() in ("1", "true", "yes", "on") if value and value.strip() else default
+
+
+def engine_options(db_url: str) -> dict:
+    """
+    Pool settings for the shared engine, overridable through the environment:
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT (seconds to wait for a free connection),
+    DB_POOL_RECYCLE (seconds; kept under Azure SQL's 30 minute idle disconnect) and DB_POOL_PRE_PING.
+
+    New Azure SQL connections are expensive (TLS plus an Entra token exchange), so connections are
+    kept and reused; the pool times every checkout (see utils/pool_metrics.get_pool_stats).
+
+    SQLite connections may be used from any Streamlit thread and wait for each other's write locks;
+    an in-memory database is held on one shared connection so every session sees the same data.
+    """
+    url = make_url(db_url)
+    if url.get_backend_name() == "sqlite":
+        options = {"connect_args": {"check_same_thread": False, "timeout": 30}}
+        if is_sqlite_memory_url(db_url):
+            options["poolclass"] = StaticPool
+        return options
+    options = {
+        "poolclass": TimedQueuePool,
+        "pool_size": _env_int("DB_POOL_SIZE", 5),
+        "max_overflow": _env_int("DB_MAX_OVERFLOW", 10),
+        "pool_timeout": _env_int("DB_POOL_TIMEOUT", 30),
+        "pool_recycle": _env_int("DB_POOL_RECYCLE", 1500),
+        "pool_pre_ping": _env_flag("DB_POOL_PRE_PING", True),
+    }
+    if url.get_driver_name() == "pyodbc":
+        # Sends executemany() batches (bulk inserts/updates) as one parameter array instead of row by row.
+        options["fast_executemany"] = True
+    return options
+
+
+def is_sqlite_memory_url(db_url: str) -> bool:
+    url = make_url(db_url)
+    return url.get_backend_name() == "sqlite" and (url.database in (None, "", ":memory:") or url.query.get("mode") == "memory")
+
+
+@event.listens_for(Engine, "connect")
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    # SQLite ignores FOREIGN KEY constraints (and ON DELETE CASCADE) unless asked per connection.
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+
+def create_engine_with_retry(db_url: str, **engine_kwargs):
     MAX_RETRIES = 5
     RETRY_DELAY_SECONDS = 10
     for attempt in range(MAX_RETRIES):
         try:
-            engine = create_engine(db_url)
+            engine = create_engine(db_url, **engine_kwargs)
             with engine.connect() as connection:
                 return engine
         except OperationalError:
@@ -57,8 +132,52 @@ def create_engine_with_retry(db_url: str):
                 raise
     raise Exception("Could not create a database engine after multiple retries.")
 
-engine = create_engine_with_retry(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """Returns the shared engine, creating it (and waiting for the database to answer) on first call."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                db_url = get_database_url()
+                _engine = create_engine_with_retry(db_url, **engine_options(db_url))
+    return _engine
+
+
+def configure_engine(db_url: str = None, **engine_kwargs):
+    """
+    Replaces the shared engine, e.g. to point scripts or tests at another database. With no URL the
+    configured one from get_database_url() is used. Keyword arguments override engine_options().
+    Sessions opened afterwards use the new engine.
+    """
+    global _engine
+    db_url = db_url or get_database_url()
+    with _engine_lock:
+        previous, _engine = _engine, create_engine(db_url, **{**engine_options(db_url), **engine_kwargs})
+    if previous is not None:
+        previous.dispose()
+    return _engine
+
+
+def __getattr__(name):
+    # Keeps `from models import engine` / `models.engine` working without creating it at import.
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class EngineBoundSession(Session):
+    """Binds each new session to the shared engine at construction, creating the engine if needed."""
+
+    def __init__(self, bind=None, **kwargs):
+        super().__init__(bind=bind if bind is not None else get_engine(), **kwargs)
+
+
+SessionLocal = sessionmaker(class_=EngineBoundSession, autocommit=False, autoflush=False)
 Base = declarative_base()
 
 # --- Association Table ---
@@ -167,6 +286,7 @@ class PurchaseOrder(Base):
     documents = relationship("PurchaseDocument", back_populates="purchase_order_ref", cascade="all, delete-orphan")
     # --- ADDED: Relationship to the auto-generated transaction for this PO ---
     transaction_ref = relationship("Transaction", back_populates="purchase_order_ref", uselist=False, cascade="all, delete-orphan")
+    __table_args__ = (Index('ix_purchase_orders_user_id_order_date', 'user_id', 'order_date'),)
 
 class PurchaseDocument(Base):
     __tablename__ = "purchase_documents"
@@ -176,6 +296,7 @@ class PurchaseDocument(Base):
     original_filename = Column(String(255), nullable=False)
     uploaded_at = Column(DateTime, server_default=func.now())
     purchase_order_ref = relationship("PurchaseOrder", back_populates="documents")
+    __table_args__ = (Index('ix_purchase_documents_purchase_order_id', 'purchase_order_id'),)
 
 class StockAddition(Base):
     __tablename__ = "stock_additions"
@@ -184,12 +305,26 @@ class StockAddition(Base):
     inventoryitem_id = Column(Integer, ForeignKey("inventoryitems.id"), nullable=False)
     quantity_added_grams = Column(Numeric(10, 3), nullable=False)
     item_cost = Column(Numeric(10, 2), nullable=False)
-    supplier_lot_number = Column(String(255), nullable=True)
+    supplier_lot_number = Column(String(255), nullable=True, index=True)
     quantity_remaining_grams = Column(Numeric(10, 3), nullable=False, default=Decimal('0.0'))
     vat_amount = Column(Numeric(10, 2), nullable=False, default=Decimal('0.0'))
     inventoryitem_ref = relationship("InventoryItem", back_populates="stock_additions")
     purchase_order_ref = relationship("PurchaseOrder", back_populates="line_items")
     batch_usages = relationship("BatchIngredientUsage", back_populates="stock_addition_ref")
+    __table_args__ = (
+        Index('ix_stock_additions_purchase_order_id', 'purchase_order_id'),
+        Index('ix_stock_additions_inventoryitem_id_remaining', 'inventoryitem_id', 'quantity_remaining_grams'),
+    )
+
+# --- Derived running totals of landed cost per inventory item (see utils/cost_index.py) ---
+class InventoryItemCostIndex(Base):
+    __tablename__ = "inventoryitem_cost_index"
+    inventoryitem_id = Column(Integer, ForeignKey("inventoryitems.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    total_landed_cost = Column(Numeric(18, 6), nullable=False, default=Decimal('0.0'))
+    total_quantity_grams = Column(Numeric(18, 3), nullable=False, default=Decimal('0.0'))
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    inventoryitem_ref = relationship("InventoryItem")
 
 class Employee(Base):
     __tablename__ = "employees"
@@ -298,6 +433,7 @@ class ProductProductionTask(Base, ProductTaskPerformanceBase):
     product_ref = relationship("Product", back_populates="production_tasks")
     standard_task_ref = relationship("StandardProductionTask")
     employee_ref = relationship("Employee", back_populates="production_task_assignments")
+    __table_args__ = (Index('ix_product_production_tasks_product_id', 'product_id'),)
 
 class ProductShippingTask(Base, ProductTaskPerformanceBase):
     __tablename__ = "product_shipping_tasks"
@@ -306,6 +442,7 @@ class ProductShippingTask(Base, ProductTaskPerformanceBase):
     product_ref = relationship("Product", back_populates="shipping_tasks")
     standard_task_ref = relationship("StandardShippingTask")
     employee_ref = relationship("Employee", back_populates="shipping_task_assignments")
+    __table_args__ = (Index('ix_product_shipping_tasks_product_id', 'product_id'),)
 
 class ProductionRun(Base):
     __tablename__ = 'production_runs'
@@ -318,6 +455,7 @@ class ProductionRun(Base):
     user_ref = relationship("User", back_populates="production_runs")
     product_ref = relationship("Product", foreign_keys=[product_id], back_populates="production_runs")
     batch_records = relationship("BatchRecord", back_populates="production_run_ref", cascade="all, delete-orphan")
+    __table_args__ = (Index('ix_production_runs_user_id_run_date', 'user_id', 'run_date'),)
 
 class BatchRecord(Base):
     __tablename__ = "batch_records"
@@ -338,6 +476,15 @@ class BatchRecord(Base):
     inventoryitem_usages = relationship("BatchIngredientUsage", back_populates="batch_record_ref", cascade="all, delete-orphan")
     safety_checks = relationship("BatchSafetyCheck", back_populates="batch_record_ref", cascade="all, delete-orphan")
     production_tasks = relationship("BatchProductionTask", back_populates="batch_record_ref", cascade="all, delete-orphan")
+    __table_args__ = (Index('ix_batch_records_user_id_manufacturing_date', 'user_id', 'manufacturing_date'),)
+
+# --- Per-user, per-prefix, per-day batch code sequence (see utils/batch_codes.py) ---
+class BatchCodeCounter(Base):
+    __tablename__ = "batch_code_counters"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    prefix = Column(String(255), primary_key=True)
+    date_str = Column(String(6), primary_key=True)
+    last_seq = Column(Integer, nullable=False, default=0)
 
 class BatchIngredientUsage(Base):
     __tablename__ = "batch_inventoryitem_usages"
@@ -349,6 +496,11 @@ class BatchIngredientUsage(Base):
     batch_record_ref = relationship("BatchRecord", back_populates="inventoryitem_usages")
     stock_addition_ref = relationship("StockAddition", back_populates="batch_usages")
     inventoryitem_ref = relationship("InventoryItem", back_populates="batch_usages")
+    # Covering indexes for traceability lookups in both directions (see utils/traceability.py)
+    __table_args__ = (
+        Index('ix_batch_usages_stock_addition', 'stock_addition_id', mssql_include=['batch_record_id', 'inventoryitem_id', 'quantity_used_grams']),
+        Index('ix_batch_usages_batch_record', 'batch_record_id', mssql_include=['stock_addition_id', 'inventoryitem_id', 'quantity_used_grams']),
+    )
 
 class BatchSafetyCheck(Base):
     __tablename__ = "batch_safety_checks"
@@ -400,7 +552,10 @@ class Invoice(Base):
     customer_ref = relationship("Customer", foreign_keys=[customer_id], back_populates="invoices")
     supplier_ref = relationship("Supplier", foreign_keys=[supplier_id], back_populates="invoices")
     line_items = relationship("InvoiceLineItem", back_populates="invoice_ref", cascade="all, delete-orphan")
-    __table_args__ = (UniqueConstraint('user_id', 'invoice_number', name='uq_user_invoice_number'),)
+    __table_args__ = (
+        UniqueConstraint('user_id', 'invoice_number', name='uq_user_invoice_number'),
+        Index('ix_invoices_user_id_invoice_date', 'user_id', 'invoice_date'),
+    )
 
 class InvoiceLineItem(Base):
     __tablename__ = "invoice_line_items"
@@ -414,6 +569,10 @@ class InvoiceLineItem(Base):
     line_total = Column(Numeric(10, 2), nullable=False)
     invoice_ref = relationship("Invoice", back_populates="line_items")
     product_ref = relationship("Product", back_populates="invoice_line_items")
+    __table_args__ = (
+        Index('ix_invoice_line_items_invoice_id', 'invoice_id'),
+        Index('ix_invoice_line_items_product_id', 'product_id'),
+    )
 
 class ExpenseCategory(Base):
     __tablename__ = "expense_categories"
@@ -448,6 +607,11 @@ class Transaction(Base):
     # --- ADDED: Relationship to get back to the Purchase Order ---
     purchase_order_ref = relationship("PurchaseOrder", back_populates="transaction_ref")
     documents = relationship("TransactionDocument", back_populates="transaction_ref", cascade="all, delete-orphan")
+    __table_args__ = (
+        Index('ix_transactions_user_id_date', 'user_id', 'date'),
+        Index('ix_transactions_purchase_order_id', 'purchase_order_id'),
+        Index('ix_transactions_invoice_id', 'invoice_id'),
+    )
 
 class TransactionDocument(Base):
     __tablename__ = "transaction_documents"
@@ -457,10 +621,35 @@ class TransactionDocument(Base):
     original_filename = Column(String(255), nullable=False)
     uploaded_at = Column(DateTime, server_default=func.now())
     transaction_ref = relationship("Transaction", back_populates="documents")
+    __table_args__ = (Index('ix_transaction_documents_transaction_id', 'transaction_id'),)
+
+# --- Monthly totals per transaction type and category, maintained by utils/financial_rollup.py ---
+class MonthlyFinancialRollup(Base):
+    __tablename__ = "monthly_financial_rollups"
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    year_month = Column(String(7), nullable=False)
+    transaction_type = Column(SQLAlchemyEnum(TransactionType, name="transaction_type_enum"), nullable=False)
+    category_id = Column(Integer, ForeignKey("expense_categories.id"), nullable=True)
+    total_amount = Column(Numeric(14, 2), nullable=False, default=Decimal('0.0'))
+    transaction_count = Column(Integer, nullable=False, default=0)
+    __table_args__ = (UniqueConstraint('user_id', 'year_month', 'transaction_type', 'category_id', name='uq_monthly_financial_rollup'),)
+
+# --- Per-user version counters for derived data (report artifacts, caches), bumped by utils/data_versions.py ---
+class DataVersion(Base):
+    __tablename__ = "data_versions"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    scope = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
 
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# Registers the Transaction mapper events that keep monthly_financial_rollups in step,
+# and the flush hook that bumps data_versions when tracked models change.
+import utils.financial_rollup  # noqa: E402,F401
+import utils.data_versions  # noqa: E402,F401
@@ -0,0 +1,47 @@
+# rebuild_cost_index.py
+"""
+Regenerates the landed-cost index (inventoryitem_cost_index) from the full purchase history.
+
+Usage:
+    python rebuild_cost_index.py            # rebuild the index for every user
+    python rebuild_cost_index.py --check    # only report drift, change nothing
+    python rebuild_cost_index.py --user ID  # limit to a single user
+"""
+import argparse
+
+from models import SessionLocal, User
+from utils.cost_index import rebuild_cost_index, find_cost_index_drift
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--check", action="store_true", help="Report drift between the index and the purchase history without rebuilding.")
+    parser.add_argument("--user", type=int, help="Only process the user with this ID.")
+    args = parser.parse_args()
+
+    print("--- Landed-Cost Index " + ("Drift Check" if args.check else "Rebuild") + " ---")
+    drift_found = False
+    with SessionLocal() as db:
+        user_query = db.query(User).order_by(User.id)
+        if args.user is not None:
+            user_query = user_query.filter(User.id == args.user)
+        for user in user_query.all():
+            drift = find_cost_index_drift(db, user.id)
+            if drift:
+                drift_found = True
+                print(f"⚠️  User '{user.username}': {len(drift)} item(s) out of sync.")
+                for entry in drift:
+                    print(f"    - Item #{entry['inventoryitem_id']}: cost {entry['indexed_cost']} (expected {entry['expected_cost']}), qty {entry['indexed_qty']} (expected {entry['expected_qty']})")
+            else:
+                print(f"✅ User '{user.username}': index is in sync.")
+            if not args.check:
+                rebuild_cost_index(db, user.id)
+        if not args.check:
+            db.commit()
+            print("✅ Index rebuilt.")
+    if args.check and drift_found:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+# rebuild_financial_rollup.py
+"""
+Regenerates the monthly financial rollup (monthly_financial_rollups) from the transactions table.
+
+Usage:
+    python rebuild_financial_rollup.py            # rebuild the rollup for every user
+    python rebuild_financial_rollup.py --check    # only report drift, change nothing
+    python rebuild_financial_rollup.py --user ID  # limit to a single user
+"""
+import argparse
+
+from models import SessionLocal, User
+from utils.financial_rollup import rebuild_financial_rollup, find_rollup_drift
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--check", action="store_true", help="Report drift between the rollup and the transactions without rebuilding.")
+    parser.add_argument("--user", type=int, help="Only process the user with this ID.")
+    args = parser.parse_args()
+
+    print("--- Monthly Financial Rollup " + ("Drift Check" if args.check else "Rebuild") + " ---")
+    drift_found = False
+    with SessionLocal() as db:
+        user_query = db.query(User).order_by(User.id)
+        if args.user is not None:
+            user_query = user_query.filter(User.id == args.user)
+        for user in user_query.all():
+            drift = find_rollup_drift(db, user.id)
+            if drift:
+                drift_found = True
+                print(f"⚠️  User '{user.username}': {len(drift)} rollup row(s) out of sync.")
+                for entry in drift:
+                    print(f"    - {entry['year_month']} {entry['transaction_type']} (category {entry['category_id']}): total {entry['stored_total']} (expected {entry['expected_total']}), count {entry['stored_count']} (expected {entry['expected_count']})")
+            else:
+                print(f"✅ User '{user.username}': rollup is in sync.")
+            if not args.check:
+                rebuild_financial_rollup(db, user.id)
+        if not args.check:
+            db.commit()
+            print("✅ Rollup rebuilt.")
+    if args.check and drift_found:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
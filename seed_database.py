@@ -15,6 +15,7 @@ from models import (
     ExpenseCategory, Transaction, TransactionType, TransactionDocument,
     UserLayoutEnumDef
 )
+from utils.cost_index import rebuild_cost_index
 import yaml
 from yaml.loader import SafeLoader
 import os
@@ -23,31 +24,35 @@ print("--- Starting Comprehensive Database Seeding Script ---")
 
 # --- Schema Reset ---
 if input("This will delete ALL data from your database. Are you sure? (y/n): ").lower() == 'y':
-    print("Dropping all tables using a robust method for Azure SQL...")
+    print(f"Dropping all tables ({engine.dialect.name})...")
     
     with engine.connect() as connection:
         with connection.begin():
-            print("  - Step 1: Discovering all foreign key constraints...")
-            fk_query = text("""
-                SELECT 
-                    'ALTER TABLE ' + QUOTENAME(OBJECT_SCHEMA_NAME(parent_object_id)) + '.' + QUOTENAME(OBJECT_NAME(parent_object_id)) + 
-                    ' DROP CONSTRAINT ' + QUOTENAME(name)
-                FROM sys.foreign_keys
-            """)
-            result = connection.execute(fk_query)
-            drop_commands = [row[0] for row in result.fetchall()]
+            if connection.dialect.name == "mssql":
+                print("  - Step 1: Discovering all foreign key constraints...")
+                fk_query = text("""
+                    SELECT 
+                        'ALTER TABLE ' + QUOTENAME(OBJECT_SCHEMA_NAME(parent_object_id)) + '.' + QUOTENAME(OBJECT_NAME(parent_object_id)) + 
+                        ' DROP CONSTRAINT ' + QUOTENAME(name)
+                    FROM sys.foreign_keys
+                """)
+                result = connection.execute(fk_query)
+                drop_commands = [row[0] for row in result.fetchall()]
 
-            if drop_commands:
-                print(f"  - Step 2: Dropping {len(drop_commands)} foreign key constraints...")
-                for i, command in enumerate(drop_commands):
-                    try:
-                        connection.execute(text(command))
-                        if (i + 1) % 10 == 0:
-                            print(f"    ... dropped {i + 1}/{len(drop_commands)}")
-                    except Exception as e:
-                        print(f"    - Warning: Could not drop constraint with command: {command}. Error: {e}")
+                if drop_commands:
+                    print(f"  - Step 2: Dropping {len(drop_commands)} foreign key constraints...")
+                    for i, command in enumerate(drop_commands):
+                        try:
+                            connection.execute(text(command))
+                            if (i + 1) % 10 == 0:
+                                print(f"    ... dropped {i + 1}/{len(drop_commands)}")
+                        except Exception as e:
+                            print(f"    - Warning: Could not drop constraint with command: {command}. Error: {e}")
+                else:
+                    print("  - Step 2: No foreign key constraints found to drop.")
             else:
-                print("  - Step 2: No foreign key constraints found to drop.")
+                # SQLite and other backends: drop_all orders the tables by their foreign keys.
+                print("  - Steps 1-2: Foreign key constraints are dropped with their tables.")
 
             print("  - Step 3: Dropping all tables...")
             Base.metadata.drop_all(bind=connection)
@@ -218,8 +223,9 @@ try:
     s6 = StockAddition(purchase_order_id=po4.id, inventoryitem_id=seeded_inventoryitems['Activated Charcoal'].id, quantity_added_grams=500, quantity_remaining_grams=500, item_cost=30, vat_amount=6.9, supplier_lot_number='BO-AC-01')
     s7 = StockAddition(purchase_order_id=po5.id, inventoryitem_id=seeded_inventoryitems['Cardboard Soap Box'].id, quantity_added_grams=200, quantity_remaining_grams=200, item_cost=50, vat_amount=11.5, supplier_lot_number='PP-BOX-01')
     s8 = StockAddition(purchase_order_id=po5.id, inventoryitem_id=seeded_inventoryitems['Logo Sticker (Round)'].id, quantity_added_grams=500, quantity_remaining_grams=500, item_cost=20, vat_amount=4.6, supplier_lot_number='PP-STICK-01')
-    db.add_all([s1, s2, s3, s4, s5, s6, s7, s8]); db.commit()
-    print(f"  > 5 POs with {db.query(StockAddition).count()} stock lots seeded.")
+    db.add_all([s1, s2, s3, s4, s5, s6, s7, s8]); db.flush()
+    rebuild_cost_index(db, main_user.id); db.commit()
+    print(f"  > 5 POs with {db.query(StockAddition).count()} stock lots seeded (landed-cost index built).")
 
     # --- 9. Products with Recipes & Workflows ---
     print("\nSeeding Products and Bill of Materials...")
@@ -0,0 +1,60 @@
+# utils/batch_codes.py
+import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import func, insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import BatchCodeCounter, BatchRecord, ProductionRun
+
+DEFAULT_BATCH_PREFIX = "PROD"
+
+
+def batch_code_prefix(product_code: Optional[str]) -> str:
+    return product_code if product_code and product_code.strip() else DEFAULT_BATCH_PREFIX
+
+
+def reserve_batch_codes(db: Session, user_id: int, product_code: Optional[str], count: int, day: Optional[datetime.date] = None) -> List[str]:
+    """
+    Reserves `count` consecutive batch codes (PREFIX-YYMMDD-NN) for a user in one statement.
+
+    The per-user, per-prefix, per-day counter is bumped with UPDATE ... RETURNING, which locks
+    only that counter row until the caller commits, so concurrent runs get disjoint ranges instead
+    of racing on a LIKE count. A missing counter is created on first use, seeded from the codes
+    already issued that day.
+    """
+    prefix = batch_code_prefix(product_code)
+    date_str = (day or datetime.date.today()).strftime('%y%m%d')
+    search_prefix = f"{prefix}-{date_str}-"
+    table = BatchCodeCounter.__table__
+    bump = update(table).where(
+        table.c.user_id == user_id, table.c.prefix == prefix, table.c.date_str == date_str
+    ).values(last_seq=table.c.last_seq + count).returning(table.c.last_seq)
+
+    last_seq = db.execute(bump).scalar()
+    if last_seq is None:
+        issued = db.query(func.count(BatchRecord.id)).join(ProductionRun).filter(ProductionRun.user_id == user_id, BatchRecord.batch_code.like(f"{search_prefix}%")).scalar() or 0
+        try:
+            with db.begin_nested():
+                db.execute(insert(table).values(user_id=user_id, prefix=prefix, date_str=date_str, last_seq=issued + count))
+            last_seq = issued + count
+        except IntegrityError:
+            # Another session created the counter first; take the next range from it.
+            last_seq = db.execute(bump).scalar()
+
+    return [f"{search_prefix}{seq:02d}" for seq in range(last_seq - count + 1, last_seq + 1)]
+
+
+def create_run_batches(db: Session, run: ProductionRun, product_code: Optional[str], count: int, manufacturing_date: Optional[datetime.date] = None) -> List[Tuple[int, str]]:
+    """
+    Creates `count` BatchRecords for a flushed production run with one bulk INSERT and
+    returns [(batch_id, batch_code), ...] in code order. The caller commits.
+    """
+    manufacturing_date = manufacturing_date or datetime.date.today()
+    codes = reserve_batch_codes(db, run.user_id, product_code, count, manufacturing_date)
+    batch_ids = db.scalars(
+        insert(BatchRecord).returning(BatchRecord.id, sort_by_parameter_order=True),
+        [{"production_run_id": run.id, "user_id": run.user_id, "batch_code": code, "manufacturing_date": manufacturing_date} for code in codes]
+    ).all()
+    return list(zip(batch_ids, codes))
@@ -0,0 +1,141 @@
+# utils/cost_index.py
+from collections import defaultdict
+from decimal import Decimal
+from typing import Dict, List, Tuple
+
+from sqlalchemy import func, insert, update, bindparam
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import InventoryItemCostIndex, StockAddition, PurchaseOrder
+
+SHIPPING_SHARE_PRECISION = Decimal('0.000001')
+DRIFT_TOLERANCE = Decimal('0.01')
+
+
+def _line_contributions(db: Session, *criteria) -> Dict[int, Tuple[int, Decimal, Decimal]]:
+    """
+    Computes {inventoryitem_id: (user_id, landed_cost, quantity)} for the PO lines matching `criteria`.
+
+    Each line's shipping share is rounded the same way every time, so subtracting a PO's
+    contribution always cancels exactly what was added for it.
+    """
+    rows = db.query(
+        StockAddition.inventoryitem_id,
+        PurchaseOrder.user_id,
+        StockAddition.item_cost,
+        StockAddition.quantity_added_grams,
+        PurchaseOrder.shipping_cost,
+        func.count(StockAddition.id).over(partition_by=StockAddition.purchase_order_id)
+    ).join(PurchaseOrder).filter(*criteria).all()
+
+    totals = defaultdict(lambda: [None, Decimal('0.0'), Decimal('0.0')])
+    for item_id, user_id, item_cost, quantity, shipping_cost, line_count in rows:
+        shipping_share = (Decimal(str(shipping_cost or 0)) / line_count).quantize(SHIPPING_SHARE_PRECISION)
+        entry = totals[item_id]
+        entry[0] = user_id
+        entry[1] += Decimal(str(item_cost)) + shipping_share
+        entry[2] += Decimal(str(quantity))
+    return {item_id: tuple(entry) for item_id, entry in totals.items()}
+
+
+def _apply_deltas(db: Session, deltas: Dict[int, Tuple[int, Decimal, Decimal]], sign: int):
+    if not deltas:
+        return
+    existing_ids = {row[0] for row in db.query(InventoryItemCostIndex.inventoryitem_id).filter(InventoryItemCostIndex.inventoryitem_id.in_(list(deltas))).all()}
+
+    table = InventoryItemCostIndex.__table__
+    updates = [{"item_id": item_id, "cost_delta": sign * cost, "qty_delta": sign * qty} for item_id, (_, cost, qty) in deltas.items() if item_id in existing_ids]
+    inserts = [{"inventoryitem_id": item_id, "user_id": user_id, "total_landed_cost": sign * cost, "total_quantity_grams": sign * qty} for item_id, (user_id, cost, qty) in deltas.items() if item_id not in existing_ids]
+
+    increment = update(table).where(table.c.inventoryitem_id == bindparam("item_id")).values(
+        total_landed_cost=table.c.total_landed_cost + bindparam("cost_delta"),
+        total_quantity_grams=table.c.total_quantity_grams + bindparam("qty_delta"),
+        updated_at=func.now()
+    )
+    if updates:
+        db.execute(increment, updates)
+    if inserts:
+        try:
+            with db.begin_nested():
+                db.execute(insert(table), inserts)
+        except IntegrityError:
+            # Another session indexed one of these items first; insert row by row and add to theirs.
+            for row in inserts:
+                try:
+                    with db.begin_nested():
+                        db.execute(insert(table), row)
+                except IntegrityError:
+                    db.execute(increment, {"item_id": row["inventoryitem_id"], "cost_delta": row["total_landed_cost"], "qty_delta": row["total_quantity_grams"]})
+
+
+def adjust_cost_index_for_po(db: Session, po_id: int, sign: int):
+    """
+    Adds (sign=+1) or removes (sign=-1) a purchase order's current line items from the cost index.
+
+    Call with -1 before a PO or its lines are edited/deleted, and with +1 after the new lines
+    have been flushed, inside the same transaction as sync_po_transaction.
+    """
+    db.flush()
+    _apply_deltas(db, _line_contributions(db, StockAddition.purchase_order_id == po_id), sign)
+
+
+def compute_landed_cost_totals(db: Session, user_id: int) -> Dict[int, Tuple[Decimal, Decimal]]:
+    """
+    Returns {inventoryitem_id: (total_landed_cost, total_quantity)} for every inventory item
+    the user has purchased, computed in a single aggregated query.
+
+    The landed cost of a stock addition is its item cost plus an equal share of the
+    purchase order's shipping cost. The per-PO line count is taken with a window function,
+    so no extra COUNT query is issued per addition.
+    """
+    po_lines = db.query(
+        StockAddition.inventoryitem_id.label('inventoryitem_id'),
+        StockAddition.item_cost.label('item_cost'),
+        StockAddition.quantity_added_grams.label('quantity_added_grams'),
+        PurchaseOrder.shipping_cost.label('shipping_cost'),
+        func.count(StockAddition.id).over(partition_by=StockAddition.purchase_order_id).label('po_line_count')
+    ).join(PurchaseOrder).filter(PurchaseOrder.user_id == user_id).subquery()
+
+    rows = db.query(
+        po_lines.c.inventoryitem_id,
+        func.sum(po_lines.c.item_cost + po_lines.c.shipping_cost / po_lines.c.po_line_count),
+        func.sum(po_lines.c.quantity_added_grams)
+    ).group_by(po_lines.c.inventoryitem_id).all()
+
+    return {
+        item_id: (Decimal(str(total_cost or 0)), Decimal(str(total_qty or 0)))
+        for item_id, total_cost, total_qty in rows
+    }
+
+
+def get_indexed_cost_totals(db: Session, user_id: int) -> Dict[int, Tuple[Decimal, Decimal]]:
+    """Returns {inventoryitem_id: (total_landed_cost, total_quantity)} straight from the cost index."""
+    rows = db.query(
+        InventoryItemCostIndex.inventoryitem_id,
+        InventoryItemCostIndex.total_landed_cost,
+        InventoryItemCostIndex.total_quantity_grams
+    ).filter(InventoryItemCostIndex.user_id == user_id).all()
+    return {item_id: (Decimal(str(cost)), Decimal(str(qty))) for item_id, cost, qty in rows}
+
+
+def rebuild_cost_index(db: Session, user_id: int):
+    """Regenerates a user's cost index from the full purchase history. The caller commits."""
+    db.query(InventoryItemCostIndex).filter(InventoryItemCostIndex.user_id == user_id).delete(synchronize_session=False)
+    _apply_deltas(db, _line_contributions(db, PurchaseOrder.user_id == user_id), 1)
+
+
+def find_cost_index_drift(db: Session, user_id: int) -> List[dict]:
+    """
+    Compares the cost index against totals recomputed from the purchase history
+    and returns one entry per inventory item that differs.
+    """
+    indexed = get_indexed_cost_totals(db, user_id)
+    expected = compute_landed_cost_totals(db, user_id)
+    drift = []
+    for item_id in sorted(set(indexed) | set(expected)):
+        idx_cost, idx_qty = indexed.get(item_id, (Decimal('0.0'), Decimal('0.0')))
+        exp_cost, exp_qty = expected.get(item_id, (Decimal('0.0'), Decimal('0.0')))
+        if abs(idx_cost - exp_cost) > DRIFT_TOLERANCE or abs(idx_qty - exp_qty) > DRIFT_TOLERANCE:
+            drift.append({"inventoryitem_id": item_id, "indexed_cost": idx_cost, "expected_cost": exp_cost, "indexed_qty": idx_qty, "expected_qty": exp_qty})
+    return drift
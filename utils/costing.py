@@ -0,0 +1,127 @@
+# utils/costing.py
+from decimal import Decimal
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy.orm import Session, joinedload, selectinload
+
+from models import Product, ProductMaterial, ProductProductionTask, Employee, GlobalCosts
+from utils.cost_index import get_indexed_cost_totals
+
+
+def get_landed_unit_costs(db: Session, user_id: int) -> Dict[int, Decimal]:
+    """Returns {inventoryitem_id: average landed cost per unit} for items with purchased quantity, read from the cost index."""
+    return {
+        item_id: total_cost / total_qty
+        for item_id, (total_cost, total_qty) in get_indexed_cost_totals(db, user_id).items()
+        if total_qty > 0
+    }
+
+
+def calculate_product_costs(db: Session, user_id: int, product_ids: Optional[Iterable[int]] = None) -> Dict[int, dict]:
+    """
+    Costs all of a user's products (or just `product_ids`) in one pass.
+
+    Landed unit costs and global overheads are loaded once and shared by every product,
+    so the number of statements does not grow with the size of the BOMs or the purchase history.
+    Returns {product_id: breakdown}, where breakdown has the same shape as before.
+    """
+    query = db.query(Product).options(
+        selectinload(Product.materials).joinedload(ProductMaterial.inventoryitem_ref),
+        selectinload(Product.production_tasks).joinedload(ProductProductionTask.standard_task_ref),
+        selectinload(Product.production_tasks).joinedload(ProductProductionTask.employee_ref),
+        selectinload(Product.shipping_tasks),
+        joinedload(Product.salary_alloc_employee_ref).joinedload(Employee.global_salary_entry)
+    ).filter(Product.user_id == user_id)
+    if product_ids is not None:
+        query = query.filter(Product.id.in_(list(product_ids)))
+    products = query.all()
+    if not products:
+        return {}
+
+    unit_costs = get_landed_unit_costs(db, user_id)
+    global_costs = db.query(GlobalCosts).filter(GlobalCosts.user_id == user_id).first()
+    return {product.id: build_cost_breakdown(product, unit_costs, global_costs) for product in products}
+
+
+def build_cost_breakdown(product: Product, unit_costs: Dict[int, Decimal], global_costs: Optional[GlobalCosts]) -> dict:
+    """Builds the cost & profit breakdown for a single, fully loaded product from pre-computed unit costs."""
+    breakdown = {}
+
+    material_cost_per_item = Decimal('0.0')
+    missing_inventoryitem_costs = []
+    material_details = []
+    for material in product.materials:
+        avg_cost_per_unit = unit_costs.get(material.inventoryitem_id)
+        if avg_cost_per_unit is None:
+            missing_inventoryitem_costs.append(material.inventoryitem_ref.name)
+            continue
+        cost_for_material = material.quantity_grams * avg_cost_per_unit
+        material_cost_per_item += cost_for_material
+        material_details.append({"Item": material.inventoryitem_ref.name, "Qty": material.quantity_grams, "Cost": cost_for_material})
+
+    breakdown['material_details'] = material_details
+    breakdown['total_material_cost_per_item'] = material_cost_per_item
+    breakdown['missing_inventoryitem_costs'] = missing_inventoryitem_costs
+
+    labor_cost_per_item = Decimal('0.0')
+    labor_details = []
+    for p_task in product.production_tasks:
+        if p_task.standard_task_ref and p_task.employee_ref and p_task.time_minutes:
+            hourly_rate = p_task.employee_ref.hourly_rate or Decimal('0.0')
+            cost = (Decimal(str(p_task.time_minutes)) / 60) * hourly_rate
+            labor_cost_per_item += cost
+            labor_details.append({"Task": p_task.standard_task_ref.task_name, "Employee": p_task.employee_ref.name, "Time (min)": p_task.time_minutes, "Cost": cost})
+    breakdown['labor_details'] = labor_details
+    breakdown['total_labor_cost_per_item'] = labor_cost_per_item
+
+    allocated_salary_cost_per_item = Decimal('0.0')
+    if product.salary_allocation_employee_id and product.salary_alloc_employee_ref and product.salary_alloc_employee_ref.global_salary_entry:
+        monthly_salary = product.salary_alloc_employee_ref.global_salary_entry.monthly_amount or Decimal('0.0')
+        alloc_items = product.salary_allocation_items_per_month or 1
+        if alloc_items > 0:
+            allocated_salary_cost_per_item = monthly_salary / Decimal(alloc_items)
+
+    allocated_rent_utilities_cost_per_item = Decimal('0.0')
+    if global_costs:
+        total_monthly_overheads = (global_costs.monthly_rent or Decimal('0.0')) + (global_costs.monthly_utilities or Decimal('0.0'))
+        alloc_items = product.rent_utilities_allocation_items_per_month or 1
+        if alloc_items > 0:
+            allocated_rent_utilities_cost_per_item = total_monthly_overheads / Decimal(alloc_items)
+
+    breakdown['allocated_salary_cost_per_item'] = allocated_salary_cost_per_item
+    breakdown['allocated_rent_utilities_cost_per_item'] = allocated_rent_utilities_cost_per_item
+    breakdown['total_allocated_overheads_per_item'] = allocated_salary_cost_per_item + allocated_rent_utilities_cost_per_item
+
+    total_production_cost = material_cost_per_item + labor_cost_per_item + breakdown['total_allocated_overheads_per_item']
+    breakdown['total_production_cost_per_item'] = total_production_cost
+
+    retail_price = product.retail_price_per_item or Decimal('0.0')
+    retail_cc_fee = retail_price * (product.retail_cc_fee_percent or Decimal('0.0'))
+    retail_platform_fee = retail_price * (product.retail_platform_fee_percent or Decimal('0.0'))
+    total_retail_channel_costs = retail_cc_fee + retail_platform_fee + (product.retail_shipping_cost_paid_by_you or Decimal('0.0'))
+    total_cost_retail_item = total_production_cost + total_retail_channel_costs
+    profit_retail = retail_price - total_cost_retail_item
+    margin_retail = (profit_retail / retail_price) * 100 if retail_price > 0 else Decimal('0.0')
+    breakdown['retail_metrics'] = {"price": retail_price, "total_channel_costs": total_retail_channel_costs, "total_cost_item": total_cost_retail_item, "profit": profit_retail, "margin_percent": margin_retail}
+
+    wholesale_price = product.wholesale_price_per_item or Decimal('0.0')
+    ws_commission = wholesale_price * (product.wholesale_commission_percent or Decimal('0.0'))
+    ws_processing_fee = wholesale_price * (product.wholesale_processing_fee_percent or Decimal('0.0'))
+    ws_flat_fee = product.wholesale_flat_fee_per_order or Decimal('0.0')
+    total_wholesale_channel_costs = ws_commission + ws_processing_fee + ws_flat_fee
+    total_cost_wholesale_item = total_production_cost + total_wholesale_channel_costs
+    profit_wholesale = wholesale_price - total_cost_wholesale_item
+    margin_wholesale = (profit_wholesale / wholesale_price) * 100 if wholesale_price > 0 else Decimal('0.0')
+    breakdown['wholesale_metrics'] = {"price": wholesale_price, "total_channel_costs": total_wholesale_channel_costs, "total_cost_item": total_cost_wholesale_item, "profit": profit_wholesale, "margin_percent": margin_wholesale}
+
+    dist_ws = product.distribution_wholesale_percentage or Decimal('0.5')
+    dist_rt = Decimal('1.0') - dist_ws
+    breakdown['blended_avg_price'] = (retail_price * dist_rt) + (wholesale_price * dist_ws)
+    breakdown['blended_avg_total_cost'] = (total_cost_retail_item * dist_rt) + (total_cost_wholesale_item * dist_ws)
+    breakdown['blended_avg_profit'] = breakdown['blended_avg_price'] - breakdown['blended_avg_total_cost']
+    breakdown['blended_avg_margin_percent'] = (breakdown['blended_avg_profit'] / breakdown['blended_avg_price']) * 100 if breakdown['blended_avg_price'] > 0 else Decimal('0.0')
+
+    buffer = product.buffer_percentage or Decimal('0.0')
+    breakdown['cost_plus_buffer'] = total_production_cost * (Decimal('1.0') + buffer)
+
+    return breakdown
@@ -0,0 +1,83 @@
+# utils/data_versions.py
+from typing import Dict, Iterable, Set, Tuple
+
+from sqlalchemy import event, insert, inspect, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import DataVersion, Transaction, ExpenseCategory, InventoryItem, Supplier, Employee, Customer, StandardProductionTask
+
+# Scope covering everything the financial reports read: transactions and expense category names.
+LEDGER_DATA = "ledger"
+# Per-entity scopes for the reference lists behind dropdowns (see utils/reference_cache.py).
+INVENTORY_ITEMS = "inventory_items"
+SUPPLIERS = "suppliers"
+EMPLOYEES = "employees"
+CUSTOMERS = "customers"
+PRODUCTION_TASKS = "production_tasks"
+EXPENSE_CATEGORIES = "expense_categories"
+
+# Model -> scopes whose versions move whenever a row of that model is inserted, updated or deleted.
+TRACKED_MODELS: Dict[type, Tuple[str, ...]] = {
+    Transaction: (LEDGER_DATA,),
+    ExpenseCategory: (LEDGER_DATA, EXPENSE_CATEGORIES),
+    InventoryItem: (INVENTORY_ITEMS,),
+    Supplier: (SUPPLIERS,),
+    Employee: (EMPLOYEES,),
+    Customer: (CUSTOMERS,),
+    StandardProductionTask: (PRODUCTION_TASKS,),
+}
+
+
+def get_data_version(db: Session, user_id: int, scope: str) -> int:
+    """Current version of a user's data in `scope` (0 if it has never changed)."""
+    return db.execute(select(DataVersion.version).where(DataVersion.user_id == user_id, DataVersion.scope == scope)).scalar() or 0
+
+
+def bump_data_version(db: Session, user_id: int, scope: str):
+    """
+    Moves a user's version for `scope` forward inside the caller's transaction. Only needed for
+    bulk statements that bypass the ORM; flushed changes to TRACKED_MODELS are bumped automatically.
+    """
+    _bump(db.connection(), [(user_id, scope)])
+
+
+def bump_model_versions(db: Session, user_id: int, model: type):
+    """bump_data_version for every scope tracking `model`, e.g. after a bulk query(...).delete() or .update()."""
+    _bump(db.connection(), [(user_id, scope) for scope in TRACKED_MODELS[model]])
+
+
+def _bump(connection, keys: Iterable[Tuple[int, str]]):
+    table = DataVersion.__table__
+    for user_id, scope in keys:
+        result = connection.execute(update(table).where(table.c.user_id == user_id, table.c.scope == scope).values(version=table.c.version + 1))
+        if result.rowcount == 0:
+            try:
+                with connection.begin_nested():
+                    connection.execute(insert(table).values(user_id=user_id, scope=scope, version=1))
+            except IntegrityError:
+                # Another session created the row first; bump theirs.
+                connection.execute(update(table).where(table.c.user_id == user_id, table.c.scope == scope).values(version=table.c.version + 1))
+
+
+def _changed_keys(session: Session) -> Set[Tuple[int, str]]:
+    keys = set()
+    for obj in list(session.new) + list(session.deleted) + [o for o in session.dirty if session.is_modified(o)]:
+        scopes = TRACKED_MODELS.get(type(obj))
+        if scopes is None:
+            continue
+        state = inspect(obj)
+        history = state.attrs.user_id.history
+        for user_id in list(history.deleted) + [obj.user_id]:
+            if user_id is not None:
+                keys.update((user_id, scope) for scope in scopes)
+    return keys
+
+
+@event.listens_for(Session, "before_flush")
+def _bump_versions_before_flush(session, flush_context, instances):
+    keys = _changed_keys(session)
+    if keys:
+        # One UPDATE per (user, scope) per flush, however many rows changed; sorted so concurrent
+        # flushes take the row locks in the same order.
+        _bump(session.connection(), sorted(keys))
@@ -0,0 +1,165 @@
+# utils/editor_sync.py
+import math
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+import pandas as pd
+from sqlalchemy import String, UniqueConstraint, bindparam, delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from utils.data_versions import TRACKED_MODELS, bump_model_versions
+
+
+class RowDiff:
+    """Changes needed to turn the rows an editor started with into the rows it returned, by key."""
+
+    def __init__(self):
+        self.inserts: List[Tuple[Optional[Hashable], dict]] = []
+        self.updates: Dict[Hashable, dict] = {}
+        self.deletes: List[Hashable] = []
+
+    def __bool__(self):
+        return bool(self.inserts or self.updates or self.deletes)
+
+    def __repr__(self):
+        return f"<RowDiff inserts={len(self.inserts)} updates={len(self.updates)} deletes={len(self.deletes)}>"
+
+
+def normalize_key(value: Any) -> Optional[Hashable]:
+    """Editor cell -> key: blanks and NaN become None, whole floats (IDs after a row was added) become ints, text is stripped."""
+    if value is None or (isinstance(value, float) and math.isnan(value)) or value is pd.NA or value is pd.NaT:
+        return None
+    if isinstance(value, str):
+        return value.strip() or None
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def diff_rows(original: Dict[Hashable, dict], edited: Iterable[Tuple[Optional[Hashable], Optional[dict]]]) -> RowDiff:
+    """
+    original maps key -> column values; edited yields (key, column values) in editor order.
+    A row whose values are None is invalid and left untouched (never deleted); a key seen twice
+    keeps its first row; a key that is None or unknown is an insert.
+    """
+    diff = RowDiff()
+    seen = set()
+    for key, values in edited:
+        if key is not None:
+            if key in seen:
+                continue
+            seen.add(key)
+        if values is None:
+            continue
+        if key is None or key not in original:
+            diff.inserts.append((key, values))
+        elif values != original[key]:
+            diff.updates[key] = values
+    diff.deletes = [key for key in original if key not in seen]
+    return diff
+
+
+def diff_editor_frames(original_df: pd.DataFrame, edited_df: pd.DataFrame, key_column: str, to_values: Callable[[pd.Series], Optional[dict]]) -> RowDiff:
+    """
+    diff_rows for an st.data_editor: both frames are read with to_values(row) -> column values
+    (or None to skip an invalid row) and keyed by key_column.
+    """
+    original = {}
+    for _, row in original_df.iterrows():
+        key = normalize_key(row[key_column])
+        if key is not None:
+            original[key] = to_values(row)
+    edited = ((normalize_key(row[key_column]), to_values(row)) for _, row in edited_df.iterrows())
+    return diff_rows(original, edited)
+
+
+def _grouped_by_columns(rows: Iterable[dict]) -> Dict[Tuple[str, ...], List[dict]]:
+    # executemany needs every parameter set to name the same columns.
+    groups: Dict[Tuple[str, ...], List[dict]] = {}
+    for row in rows:
+        groups.setdefault(tuple(sorted(row)), []).append(row)
+    return groups
+
+
+def _unique_text_columns(table, scope: dict) -> list:
+    # Text columns that are unique within the scope, e.g. name in UNIQUE (user_id, name).
+    columns = []
+    for constraint in table.constraints:
+        if isinstance(constraint, UniqueConstraint):
+            unscoped = [column for column in constraint.columns if column.name not in scope]
+            if len(unscoped) == 1 and isinstance(unscoped[0].type, String) and not unscoped[0].primary_key:
+                columns.append(unscoped[0])
+    return columns
+
+
+def _stage_unique_renames(db: Session, table, key_column, updates: Dict[Hashable, dict], scope: dict, scope_criteria: list) -> None:
+    """
+    An in-place UPDATE checks uniqueness row by row, so swapping two names (or renaming a row to
+    a name another edited row is giving up) fails half-way. Rows being updated that currently
+    hold a name another updated row wants are first moved to a placeholder name.
+    """
+    for column in _unique_text_columns(table, scope):
+        wanted = {values[column.name]: key for key, values in updates.items() if values.get(column.name) is not None}
+        if not wanted:
+            continue
+        holders = db.execute(select(key_column, column).where(column.in_(list(wanted)), *scope_criteria)).all()
+        blocking = [holder for holder, value in holders if holder in updates and wanted.get(value) != holder]
+        if blocking:
+            statement = update(table).where(key_column == bindparam("_key"), *scope_criteria).values({column.name: bindparam("_placeholder")})
+            db.execute(statement, [{"_key": key, "_placeholder": f"~renaming-{key}"} for key in blocking])
+
+
+def deleted_rows_in_use(error: IntegrityError) -> bool:
+    """True if apply_row_diff failed on its DELETE (a removed row is still referenced) rather than on a duplicate."""
+    return (error.statement or "").lstrip().upper().startswith("DELETE")
+
+
+def apply_row_diff(db: Session, model, diff: RowDiff, key_attr: str = "id", scope: Optional[dict] = None, return_keys: bool = False) -> List[int]:
+    """
+    Applies a RowDiff to model's table with one DELETE ... IN, one executemany UPDATE and one
+    executemany INSERT (per distinct column set), all restricted to `scope` (e.g. {"user_id": 3},
+    which is also written into inserted rows). Inserts carry their key unless it is the
+    autoincrement primary key. Updated rows that swap or pass on a unique name go through a
+    placeholder name first (_stage_unique_renames). With return_keys, returns the new rows' primary keys in
+    diff.inserts order (ordered RETURNING, which SQLite can only do one row per statement).
+
+    These are Core statements, so the session's flush hooks do not see them; if model is in
+    TRACKED_MODELS and scope has a user_id, that user's data versions are bumped here.
+    """
+    table = model.__table__
+    key_column = table.c[key_attr]
+    scope = scope or {}
+    scope_criteria = [table.c[name] == value for name, value in scope.items()]
+
+    if diff.deletes:
+        db.execute(delete(table).where(key_column.in_(diff.deletes), *scope_criteria))
+
+    if diff.updates:
+        _stage_unique_renames(db, table, key_column, diff.updates, scope, scope_criteria)
+    for columns, rows in _grouped_by_columns({"_key": key, **values} for key, values in diff.updates.items()).items():
+        statement = update(table).where(key_column == bindparam("_key"), *scope_criteria).values(
+            {name: bindparam(f"_set_{name}") for name in columns if name != "_key"}
+        )
+        db.execute(statement, [{"_key": row["_key"], **{f"_set_{name}": value for name, value in row.items() if name != "_key"}} for row in rows])
+
+    new_keys = []
+    if diff.inserts:
+        include_key = not key_column.primary_key
+        rows = [{**scope, **values, **({key_attr: key} if include_key else {})} for key, values in diff.inserts]
+        if not return_keys:
+            for columns, group in _grouped_by_columns(rows).items():
+                db.execute(insert(table), group)
+        else:
+            primary_key = table.primary_key.columns[0]
+            new_keys = [None] * len(rows)
+            for columns, group in _grouped_by_columns(dict(row, _position=position) for position, row in enumerate(rows)).items():
+                positions = [row.pop("_position") for row in group]
+                ids = db.execute(insert(table).returning(primary_key, sort_by_parameter_order=True), group).scalars().all()
+                for position, new_id in zip(positions, ids):
+                    new_keys[position] = new_id
+
+    if diff and model in TRACKED_MODELS and scope.get("user_id") is not None:
+        bump_model_versions(db, scope["user_id"], model)
+    return new_keys
@@ -0,0 +1,130 @@
+# utils/excel_report.py
+import datetime
+import tempfile
+from decimal import Decimal
+from typing import BinaryIO, Dict, Iterable, List, Tuple
+
+from openpyxl import Workbook
+from openpyxl.utils import get_column_letter
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from models import Transaction, TransactionType, ExpenseCategory
+
+MONTH_TOTAL_ROW = 33
+STREAM_BATCH_SIZE = 2000
+SPOOL_MAX_SIZE = 16 * 1024 * 1024
+
+# (date, description, transaction_type, amount, category name or None)
+ReportRow = Tuple[datetime.date, str, TransactionType, Decimal, str]
+
+
+def report_months(start_date: datetime.date, end_date: datetime.date) -> List[Tuple[int, int]]:
+    """Every (year, month) the period touches, including partial first and last months."""
+    months, year, month = [], start_date.year, start_date.month
+    while (year, month) <= (end_date.year, end_date.month):
+        months.append((year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+
+def month_sheet_title(year: int, month: int, multi_year: bool) -> str:
+    name = datetime.date(year, month, 1).strftime('%B')
+    return f"{name} {year}" if multi_year else name
+
+
+def write_financial_report(fileobj: BinaryIO, rows: Iterable[ReportRow], start_date: datetime.date, end_date: datetime.date,
+                           expense_categories: List[str], expense_counts: Dict[Tuple[int, int], int]):
+    """
+    Streams the financial report workbook into `fileobj` with write-only worksheets.
+
+    `rows` must be ordered by date and is consumed once: each row goes straight to the Bank
+    Transactions sheet and, for expenses, to its month sheet, so only one row is held in memory.
+    `expense_counts` ({(year, month): number of expense rows}) places each month's total row
+    (row 33, or just below the data if a month has more rows) before the rows arrive.
+    """
+    wb = Workbook(write_only=True)
+    months = report_months(start_date, end_date)
+    multi_year = start_date.year != end_date.year
+    titles = {ym: month_sheet_title(*ym, multi_year) for ym in months}
+    total_rows = {ym: max(MONTH_TOTAL_ROW, expense_counts.get(ym, 0) + 2) for ym in months}
+    category_to_index = {cat: i + 4 for i, cat in enumerate(expense_categories)}
+    headers = ["Date", "Who", "Ref", "Amount"] + expense_categories + ["Total"]
+    last_category_letter = get_column_letter(len(headers) - 1)
+
+    # --- Summary Sheet ---
+    ws_summary = wb.create_sheet(title="Summary")
+    ws_summary.append(["Summary for year"])
+    summary_headers = ["", "Amount"] + expense_categories + ["Total", "Sales"]
+    ws_summary.append(summary_headers)
+    for ym in months:
+        title, total_row = titles[ym], total_rows[ym]
+        # Amount, each category and Total pull from the month sheet's total row (columns D onwards)
+        month_row = [title] + [f"='{title}'!{get_column_letter(i + 4)}{total_row}" for i in range(len(summary_headers) - 2)]
+        year, month = ym
+        month_row.append(f"=SUMIFS('Bank Transactions'!E:E, 'Bank Transactions'!A:A, \">=\"&DATE({year},{month},1), 'Bank Transactions'!A:A, \"<=\"&EOMONTH(DATE({year},{month},1),0))")
+        ws_summary.append(month_row)
+
+    # --- Bank Transactions and Monthly Sheets, filled in a single pass ---
+    ws_bank = wb.create_sheet(title="Bank Transactions")
+    ws_bank.append(["Date", "Who", "Ref", "Out", "In", "Balance"])
+    month_sheets, next_row = {}, {}
+    for ym in months:
+        ws = wb.create_sheet(title=titles[ym])
+        ws.append(headers)
+        month_sheets[ym], next_row[ym] = ws, 2
+
+    def close_month(ym):
+        ws, row_num = month_sheets[ym], next_row[ym]
+        for _ in range(row_num, total_rows[ym]):
+            ws.append([])
+        ws.append(["Total", None, None] + [f"=SUM({get_column_letter(i + 1)}2:{get_column_letter(i + 1)}{total_rows[ym] - 1})" for i in range(3, len(headers))])
+
+    balance = Decimal('0.0')
+    open_months = list(months)
+    for t_date, description, t_type, amount, category in rows:
+        is_income = t_type in (TransactionType.SALE, TransactionType.CAPITAL_INJECTION)
+        balance = balance + amount if is_income else balance - amount
+        ws_bank.append([t_date, description, "", None if is_income else float(amount), float(amount) if is_income else None, float(balance)])
+
+        ym = (t_date.year, t_date.month)
+        while open_months and open_months[0] < ym:
+            close_month(open_months.pop(0))
+        if t_type == TransactionType.EXPENSE and ym in month_sheets:
+            row_num = next_row[ym]
+            excel_row = [None] * len(headers)
+            excel_row[0], excel_row[1], excel_row[3] = t_date, description, amount
+            col_idx = category_to_index.get(category or 'Misc')
+            if col_idx is not None:
+                excel_row[col_idx] = amount
+            excel_row[-1] = f"=SUM(E{row_num}:{last_category_letter}{row_num})"
+            month_sheets[ym].append(excel_row)
+            next_row[ym] = row_num + 1
+    for ym in open_months:
+        close_month(ym)
+
+    wb.save(fileobj)
+
+
+def generate_excel_report(db: Session, user_id: int, start_date: datetime.date, end_date: datetime.date) -> BinaryIO:
+    """
+    Builds the financial report for a period and returns it as a spooled temporary file positioned
+    at the start (kept in memory up to SPOOL_MAX_SIZE, then on disk). Transactions are streamed from
+    the database in batches of STREAM_BATCH_SIZE as plain rows, never as ORM objects.
+    """
+    expense_categories = [name for (name,) in db.query(ExpenseCategory.name).filter(ExpenseCategory.user_id == user_id).order_by(ExpenseCategory.name).all()]
+
+    period = [Transaction.user_id == user_id, Transaction.date.between(start_date, end_date)]
+    expense_counts = {}
+    for t_date, count in db.query(Transaction.date, func.count(Transaction.id)).filter(*period, Transaction.transaction_type == TransactionType.EXPENSE).group_by(Transaction.date).all():
+        ym = (t_date.year, t_date.month)
+        expense_counts[ym] = expense_counts.get(ym, 0) + count
+
+    rows = db.query(Transaction.date, Transaction.description, Transaction.transaction_type, Transaction.amount, ExpenseCategory.name).outerjoin(
+        ExpenseCategory, Transaction.category_id == ExpenseCategory.id
+    ).filter(*period).order_by(Transaction.date.asc(), Transaction.id.asc()).yield_per(STREAM_BATCH_SIZE)
+
+    buffer = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    write_financial_report(buffer, ((d, desc, t, Decimal(str(a)), c) for d, desc, t, a, c in rows), start_date, end_date, expense_categories, expense_counts)
+    buffer.seek(0)
+    return buffer
@@ -0,0 +1,209 @@
+# utils/financial_rollup.py
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import String, event, func, insert, update, delete, inspect, literal, select, union_all
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import Transaction, TransactionType, ExpenseCategory, MonthlyFinancialRollup
+
+ROLLUP_KEY_ATTRIBUTES = ("user_id", "date", "transaction_type", "category_id", "amount")
+DRIFT_TOLERANCE = Decimal('0.01')
+
+RollupKey = Tuple[int, str, TransactionType, Optional[int]]
+
+
+def year_month(date: datetime.date) -> str:
+    return f"{date.year:04d}-{date.month:02d}"
+
+
+def _apply_delta(connection, key: RollupKey, amount: Decimal, count: int):
+    user_id, ym, t_type, category_id = key
+    table = MonthlyFinancialRollup.__table__
+    match = [table.c.user_id == user_id, table.c.year_month == ym, table.c.transaction_type == t_type,
+             table.c.category_id.is_(None) if category_id is None else table.c.category_id == category_id]
+    increment = update(table).where(*match).values(
+        total_amount=table.c.total_amount + amount,
+        transaction_count=table.c.transaction_count + count
+    )
+    result = connection.execute(increment)
+    if result.rowcount == 0:
+        try:
+            with connection.begin_nested():
+                connection.execute(insert(table).values(user_id=user_id, year_month=ym, transaction_type=t_type, category_id=category_id, total_amount=amount, transaction_count=count))
+        except IntegrityError:
+            # Another session created the row first; add to theirs.
+            connection.execute(increment)
+    elif count < 0:
+        # Drop emptied rows so they do not pin an expense category that is later deleted.
+        connection.execute(delete(table).where(*match, table.c.transaction_count <= 0))
+
+
+def _key_and_amount(values: dict) -> Tuple[RollupKey, Decimal]:
+    return (values["user_id"], year_month(values["date"]), values["transaction_type"], values["category_id"]), Decimal(str(values["amount"]))
+
+
+def _current_values(target: Transaction) -> dict:
+    return {attr: getattr(target, attr) for attr in ROLLUP_KEY_ATTRIBUTES}
+
+
+def _previous_values(target: Transaction) -> dict:
+    state = inspect(target)
+    values = {}
+    for attr in ROLLUP_KEY_ATTRIBUTES:
+        history = state.attrs[attr].history
+        values[attr] = history.deleted[0] if history.deleted else getattr(target, attr)
+    return values
+
+
+# --- Mapper events: every ORM insert/update/delete of a Transaction adjusts the rollup in the same transaction ---
+
+@event.listens_for(Transaction, "after_insert")
+def _rollup_after_insert(mapper, connection, target):
+    key, amount = _key_and_amount(_current_values(target))
+    _apply_delta(connection, key, amount, 1)
+
+
+@event.listens_for(Transaction, "after_update")
+def _rollup_after_update(mapper, connection, target):
+    old_key, old_amount = _key_and_amount(_previous_values(target))
+    new_key, new_amount = _key_and_amount(_current_values(target))
+    if old_key == new_key:
+        if old_amount != new_amount:
+            _apply_delta(connection, new_key, new_amount - old_amount, 0)
+        return
+    _apply_delta(connection, old_key, -old_amount, -1)
+    _apply_delta(connection, new_key, new_amount, 1)
+
+
+@event.listens_for(Transaction, "before_delete")
+def _rollup_before_delete(mapper, connection, target):
+    key, amount = _key_and_amount(_previous_values(target))
+    _apply_delta(connection, key, -amount, -1)
+
+
+# The old value of a changed attribute is needed to take it back out of the rollup, even when
+# the attribute was not loaded before it was set (e.g. after a commit expired the instance).
+for _attr in ROLLUP_KEY_ATTRIBUTES:
+    event.listen(getattr(Transaction, _attr), "set", lambda target, value, oldvalue, initiator: None, active_history=True)
+
+
+# --- Reading ---
+
+def full_month_span(start_date: datetime.date, end_date: datetime.date) -> Optional[Tuple[datetime.date, datetime.date]]:
+    """Returns (first day, last day) of the whole calendar months inside [start_date, end_date], or None."""
+    first = start_date if start_date.day == 1 else (start_date.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+    next_month = (end_date.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+    last = end_date if end_date == next_month - datetime.timedelta(days=1) else end_date.replace(day=1) - datetime.timedelta(days=1)
+    return (first, last) if first <= last else None
+
+
+def month_segments(start_date: datetime.date, end_date: datetime.date) -> List[Tuple[datetime.date, datetime.date]]:
+    """Splits [start_date, end_date] into pieces that each fall inside one calendar month."""
+    segments = []
+    while start_date <= end_date:
+        month_end = (start_date.replace(day=28) + datetime.timedelta(days=4)).replace(day=1) - datetime.timedelta(days=1)
+        segments.append((start_date, min(month_end, end_date)))
+        start_date = month_end + datetime.timedelta(days=1)
+    return segments
+
+
+def period_totals_statement(user_id: int, start_date: datetime.date, end_date: datetime.date):
+    """
+    One SELECT of (year_month, transaction_type, category_id, category, total, count) rows for the period.
+
+    Whole months come straight from the rollup (already one row per month/type/category); each
+    partial month at either end of the range is a GROUP BY over its transactions. The branches are
+    combined with UNION ALL and joined to the category names, so the page makes a single round trip
+    and only aggregate rows cross the wire.
+    """
+    span = full_month_span(start_date, end_date)
+    branches = []
+    if span:
+        branches.append(select(
+            MonthlyFinancialRollup.year_month, MonthlyFinancialRollup.transaction_type, MonthlyFinancialRollup.category_id,
+            MonthlyFinancialRollup.total_amount.label("total"), MonthlyFinancialRollup.transaction_count.label("count")
+        ).where(MonthlyFinancialRollup.user_id == user_id, MonthlyFinancialRollup.year_month.between(year_month(span[0]), year_month(span[1]))))
+        edges = [(start_date, span[0] - datetime.timedelta(days=1)), (span[1] + datetime.timedelta(days=1), end_date)]
+    else:
+        edges = [(start_date, end_date)]
+
+    for lo, hi in edges:
+        for seg_start, seg_end in month_segments(lo, hi):
+            branches.append(select(
+                literal(year_month(seg_start), String(7)).label("year_month"), Transaction.transaction_type, Transaction.category_id,
+                func.sum(Transaction.amount).label("total"), func.count(Transaction.id).label("count")
+            ).where(Transaction.user_id == user_id, Transaction.date.between(seg_start, seg_end)).group_by(Transaction.transaction_type, Transaction.category_id))
+
+    combined = (union_all(*branches) if len(branches) > 1 else branches[0]).subquery()
+    return select(
+        combined.c.year_month, combined.c.transaction_type, combined.c.category_id, ExpenseCategory.name, combined.c.total, combined.c.count
+    ).outerjoin(ExpenseCategory, combined.c.category_id == ExpenseCategory.id).order_by(combined.c.year_month)
+
+
+def get_period_month_totals(db: Session, user_id: int, start_date: datetime.date, end_date: datetime.date) -> List[dict]:
+    """Returns [{"year_month", "transaction_type", "category_id", "category", "total", "count"}, ...] for the period."""
+    return [
+        {"year_month": ym, "transaction_type": t_type, "category_id": category_id, "category": category or "Uncategorized", "total": Decimal(str(total or 0)), "count": int(count or 0)}
+        for ym, t_type, category_id, category, total, count in db.execute(period_totals_statement(user_id, start_date, end_date))
+        if count
+    ]
+
+
+def get_period_totals(db: Session, user_id: int, start_date: datetime.date, end_date: datetime.date) -> List[dict]:
+    """Returns [{"transaction_type", "category_id", "category", "total", "count"}, ...] for the period (months summed)."""
+    totals = {}
+    for row in get_period_month_totals(db, user_id, start_date, end_date):
+        entry = totals.setdefault((row["transaction_type"], row["category_id"]), {**row, "total": Decimal('0.0'), "count": 0})
+        entry["total"] += row["total"]
+        entry["count"] += row["count"]
+    for entry in totals.values():
+        del entry["year_month"]
+    return list(totals.values())
+
+
+# --- Maintenance ---
+
+def compute_rollup_from_transactions(db: Session, user_id: int) -> Dict[RollupKey, Tuple[Decimal, int]]:
+    """Aggregates a user's transactions into rollup rows straight from the transactions table."""
+    rows = db.query(Transaction.date, Transaction.transaction_type, Transaction.category_id, Transaction.amount).filter(Transaction.user_id == user_id).yield_per(1000)
+    totals = defaultdict(lambda: [Decimal('0.0'), 0])
+    for t_date, t_type, category_id, amount in rows:
+        entry = totals[(user_id, year_month(t_date), t_type, category_id)]
+        entry[0] += Decimal(str(amount))
+        entry[1] += 1
+    return {key: (total, count) for key, (total, count) in totals.items()}
+
+
+def rebuild_financial_rollup(db: Session, user_id: int):
+    """Regenerates a user's monthly rollup from the transactions table. The caller commits."""
+    db.query(MonthlyFinancialRollup).filter(MonthlyFinancialRollup.user_id == user_id).delete(synchronize_session=False)
+    rows = [
+        {"user_id": u_id, "year_month": ym, "transaction_type": t_type, "category_id": category_id, "total_amount": total, "transaction_count": count}
+        for (u_id, ym, t_type, category_id), (total, count) in compute_rollup_from_transactions(db, user_id).items()
+    ]
+    if rows:
+        db.execute(insert(MonthlyFinancialRollup), rows)
+
+
+def find_rollup_drift(db: Session, user_id: int) -> List[dict]:
+    """Compares the stored rollup against one recomputed from the transactions and returns the rows that differ."""
+    stored = {
+        (user_id, ym, t_type, category_id): (Decimal(str(total)), count)
+        for ym, t_type, category_id, total, count in db.query(
+            MonthlyFinancialRollup.year_month, MonthlyFinancialRollup.transaction_type, MonthlyFinancialRollup.category_id,
+            MonthlyFinancialRollup.total_amount, MonthlyFinancialRollup.transaction_count
+        ).filter(MonthlyFinancialRollup.user_id == user_id).all()
+        if count or total
+    }
+    expected = compute_rollup_from_transactions(db, user_id)
+    drift = []
+    for key in sorted(set(stored) | set(expected), key=lambda k: (k[1], k[2].value, k[3] or 0)):
+        s_total, s_count = stored.get(key, (Decimal('0.0'), 0))
+        e_total, e_count = expected.get(key, (Decimal('0.0'), 0))
+        if abs(s_total - e_total) > DRIFT_TOLERANCE or s_count != e_count:
+            drift.append({"year_month": key[1], "transaction_type": key[2].value, "category_id": key[3], "stored_total": s_total, "expected_total": e_total, "stored_count": s_count, "expected_count": e_count})
+    return drift
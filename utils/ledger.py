@@ -0,0 +1,62 @@
+# utils/ledger.py
+import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_, or_, func
+from sqlalchemy.orm import Session
+
+from models import Transaction, TransactionType, ExpenseCategory
+
+LEDGER_PAGE_SIZE = 50
+
+LedgerCursor = Tuple[datetime.date, int]
+
+
+def ledger_filter_criteria(user_id: int, start_date: Optional[datetime.date] = None, end_date: Optional[datetime.date] = None,
+                           transaction_type: Optional[TransactionType] = None, category_id: Optional[int] = None, search: Optional[str] = None) -> list:
+    criteria = [Transaction.user_id == user_id]
+    if start_date:
+        criteria.append(Transaction.date >= start_date)
+    if end_date:
+        criteria.append(Transaction.date <= end_date)
+    if transaction_type:
+        criteria.append(Transaction.transaction_type == transaction_type)
+    if category_id:
+        criteria.append(Transaction.category_id == category_id)
+    if search and search.strip():
+        criteria.append(Transaction.description.icontains(search.strip(), autoescape=True))
+    return criteria
+
+
+def get_ledger_page(db: Session, user_id: int, cursor: Optional[LedgerCursor] = None, page_size: int = LEDGER_PAGE_SIZE, **filters) -> Tuple[List[dict], Optional[LedgerCursor]]:
+    """
+    Returns one page of the ledger (newest first) and the cursor for the next page, or None on the last page.
+
+    Pages are keyed on (date, id) rather than OFFSET, so fetching any page reads only page_size + 1
+    rows from the (user_id, date) index regardless of how many transactions the user has.
+    """
+    query = db.query(
+        Transaction.id, Transaction.date, Transaction.description, Transaction.transaction_type, Transaction.amount,
+        Transaction.purchase_order_id, Transaction.invoice_id, ExpenseCategory.name
+    ).outerjoin(ExpenseCategory, Transaction.category_id == ExpenseCategory.id).filter(*ledger_filter_criteria(user_id, **filters))
+    if cursor:
+        cursor_date, cursor_id = cursor
+        query = query.filter(or_(Transaction.date < cursor_date, and_(Transaction.date == cursor_date, Transaction.id < cursor_id)))
+    rows = query.order_by(Transaction.date.desc(), Transaction.id.desc()).limit(page_size + 1).all()
+
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    page = []
+    for t_id, t_date, description, t_type, amount, po_id, invoice_id, category_name in rows:
+        source = "Manual Entry"
+        if po_id:
+            source = f"PO #{po_id}"
+        elif invoice_id:
+            source = f"Invoice #{invoice_id}"
+        page.append({"id": t_id, "Date": t_date, "Description": description, "Type": t_type.value, "Amount": amount, "Category": category_name or "N/A", "Source": source})
+    next_cursor = (rows[-1][1], rows[-1][0]) if has_more else None
+    return page, next_cursor
+
+
+def count_ledger_rows(db: Session, user_id: int, **filters) -> int:
+    return db.query(func.count(Transaction.id)).filter(*ledger_filter_criteria(user_id, **filters)).scalar() or 0
@@ -0,0 +1,163 @@
+# utils/lot_allocation.py
+import random
+import time
+from collections import defaultdict
+from decimal import Decimal
+from typing import Callable, Dict, List, Tuple
+
+from sqlalchemy import func, insert, update, bindparam
+from sqlalchemy.orm import Session, joinedload
+
+from models import SessionLocal, BatchRecord, BatchIngredientUsage, ProductionRun, Product, ProductMaterial, StockAddition, PurchaseOrder
+
+MAX_ALLOCATION_RETRIES = 5
+
+
+class StockConflictError(Exception):
+    """Raised when a lot no longer holds enough stock for an allocation (e.g. a concurrent allocation won)."""
+
+
+def decrement_lot_stock(db: Session, decrements: List[Tuple[int, Decimal]]):
+    """
+    Atomically takes quantities out of lots with conditional UPDATEs
+    (... SET remaining = remaining - :qty WHERE id = :lot_id AND remaining >= :qty),
+    so two sessions can never oversubscribe a lot. Only the touched rows are locked.
+    Raises StockConflictError if any lot lacks the stock; the caller must roll back.
+    """
+    if not decrements:
+        return
+    table = StockAddition.__table__
+    stmt = update(table).where(
+        table.c.id == bindparam("lot_id"),
+        table.c.quantity_remaining_grams >= bindparam("qty")
+    ).values(quantity_remaining_grams=table.c.quantity_remaining_grams - bindparam("qty"))
+    params = [{"lot_id": lot_id, "qty": qty} for lot_id, qty in decrements]
+
+    if db.get_bind().dialect.supports_sane_multi_rowcount:
+        if db.execute(stmt, params).rowcount != len(params):
+            raise StockConflictError("One or more stock lots no longer have enough remaining stock.")
+    else:
+        for param in params:
+            if db.execute(stmt, param).rowcount != 1:
+                raise StockConflictError(f"Stock lot #{param['lot_id']} no longer has {param['qty']} remaining.")
+
+
+def resize_lots(db: Session, quantities: List[Tuple[int, Decimal]]):
+    """
+    Sets lots' purchased quantities and moves their remaining stock by the same difference, in SQL
+    (... SET remaining = remaining + :qty - added, added = :qty WHERE id = :lot_id AND remaining + :qty - added >= 0),
+    so allocations committed since the caller read the lots are kept. Raises StockConflictError if a
+    lot would be cut below what batches have already used; the caller must roll back.
+    """
+    if not quantities:
+        return
+    table = StockAddition.__table__
+    new_remaining = table.c.quantity_remaining_grams + bindparam("qty") - table.c.quantity_added_grams
+    stmt = update(table).where(
+        table.c.id == bindparam("lot_id"),
+        new_remaining >= 0
+    ).values(quantity_remaining_grams=new_remaining, quantity_added_grams=bindparam("qty"))
+    params = [{"lot_id": lot_id, "qty": qty} for lot_id, qty in quantities]
+
+    if db.get_bind().dialect.supports_sane_multi_rowcount:
+        if db.execute(stmt, params).rowcount != len(params):
+            raise StockConflictError("One or more stock lots have already been used beyond their new quantity.")
+    else:
+        for param in params:
+            if db.execute(stmt, param).rowcount != 1:
+                raise StockConflictError(f"Stock lot #{param['lot_id']} has already been used beyond {param['qty']}.")
+
+
+def allocate_from_lot(db: Session, batch_id: int, stock_addition_id: int, inventoryitem_id: int, quantity: Decimal) -> BatchIngredientUsage:
+    """Allocates `quantity` from one lot to a batch. Raises StockConflictError if the lot lacks the stock; the caller commits."""
+    decrement_lot_stock(db, [(stock_addition_id, quantity)])
+    usage = BatchIngredientUsage(batch_record_id=batch_id, stock_addition_id=stock_addition_id, inventoryitem_id=inventoryitem_id, quantity_used_grams=quantity)
+    db.add(usage)
+    return usage
+
+
+def run_with_conflict_retry(fn: Callable, *args, retries: int = MAX_ALLOCATION_RETRIES, **kwargs):
+    """
+    Runs fn(db, *args, **kwargs) in a fresh session and commits. On StockConflictError the
+    transaction is rolled back and retried (with a short jittered backoff), so fn re-reads the
+    current stock each time. The last conflict is re-raised once the retries are used up.
+    """
+    for attempt in range(retries):
+        with SessionLocal() as db:
+            try:
+                result = fn(db, *args, **kwargs)
+                db.commit()
+                return result
+            except StockConflictError:
+                db.rollback()
+                if attempt == retries - 1:
+                    raise
+            except Exception:
+                db.rollback()
+                raise
+        time.sleep(random.uniform(0, 0.05 * (attempt + 1)))
+
+
+def plan_fifo_allocation(needs: Dict[int, Decimal], lots) -> List[dict]:
+    """
+    Walks lots (rows of id, inventoryitem_id, quantity_remaining_grams, already ordered oldest first)
+    and consumes them until each item's need is met. Returns one allocation per lot touched.
+    """
+    remaining_needs = dict(needs)
+    allocations = []
+    for lot_id, item_id, lot_remaining in lots:
+        still_needed = remaining_needs.get(item_id, Decimal('0.0'))
+        if still_needed <= 0 or not lot_remaining or lot_remaining <= 0:
+            continue
+        qty = min(still_needed, Decimal(str(lot_remaining)))
+        allocations.append({"stock_addition_id": lot_id, "inventoryitem_id": item_id, "quantity": qty})
+        remaining_needs[item_id] = still_needed - qty
+    return allocations
+
+
+def auto_allocate_batch(db: Session, batch_id: int, user_id: int) -> dict:
+    """
+    Allocates every outstanding BOM requirement of a batch from the oldest lots with remaining stock
+    (FIFO by purchase order date). Lots are decremented with conditional atomic UPDATEs and all
+    usages inserted with one bulk statement in the caller's transaction; the caller commits.
+    Raises StockConflictError if a concurrent allocation drained a planned lot, in which case
+    the caller should roll back and retry (see run_with_conflict_retry).
+
+    Returns {"allocations": [...], "shortfalls": {item name: quantity still missing}}.
+    """
+    batch = db.query(BatchRecord).options(
+        joinedload(BatchRecord.production_run_ref).joinedload(ProductionRun.product_ref).selectinload(Product.materials).joinedload(ProductMaterial.inventoryitem_ref)
+    ).filter(BatchRecord.id == batch_id, BatchRecord.user_id == user_id).one()
+    bom = batch.production_run_ref.product_ref.materials
+
+    used = dict(db.query(BatchIngredientUsage.inventoryitem_id, func.sum(BatchIngredientUsage.quantity_used_grams)).filter(
+        BatchIngredientUsage.batch_record_id == batch_id
+    ).group_by(BatchIngredientUsage.inventoryitem_id).all())
+    needs = {}
+    for material in bom:
+        outstanding = material.quantity_grams - Decimal(str(used.get(material.inventoryitem_id) or 0))
+        if outstanding > 0:
+            needs[material.inventoryitem_id] = outstanding
+    if not needs:
+        return {"allocations": [], "shortfalls": {}}
+
+    lots = db.query(StockAddition.id, StockAddition.inventoryitem_id, StockAddition.quantity_remaining_grams).join(PurchaseOrder).filter(
+        PurchaseOrder.user_id == user_id,
+        StockAddition.inventoryitem_id.in_(list(needs)),
+        StockAddition.quantity_remaining_grams > 0
+    ).order_by(StockAddition.inventoryitem_id, PurchaseOrder.order_date, StockAddition.id).all()
+
+    allocations = plan_fifo_allocation(needs, lots)
+    if allocations:
+        decrement_lot_stock(db, [(a["stock_addition_id"], a["quantity"]) for a in allocations])
+        db.execute(insert(BatchIngredientUsage), [
+            {"batch_record_id": batch_id, "stock_addition_id": a["stock_addition_id"], "inventoryitem_id": a["inventoryitem_id"], "quantity_used_grams": a["quantity"]}
+            for a in allocations
+        ])
+
+    allocated = defaultdict(lambda: Decimal('0.0'))
+    for a in allocations:
+        allocated[a["inventoryitem_id"]] += a["quantity"]
+    names = {m.inventoryitem_id: m.inventoryitem_ref.name for m in bom}
+    shortfalls = {names[item_id]: need - allocated[item_id] for item_id, need in needs.items() if need - allocated[item_id] > 0}
+    return {"allocations": allocations, "shortfalls": shortfalls}
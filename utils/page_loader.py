@@ -0,0 +1,46 @@
+# utils/page_loader.py
+import importlib
+import logging
+import os
+import sys
+import threading
+from typing import Callable, Iterable
+
+logger = logging.getLogger(__name__)
+
+# Import the remaining page modules in the background once the first page has been drawn.
+PRELOAD_PAGES = os.environ.get("PRELOAD_PAGES", "1").strip().lower() in ("1", "true", "yes", "on")
+
+_preload_lock = threading.Lock()
+_preload_started = False
+
+
+def load_render_function(module_name: str) -> Callable:
+    """The page's render function, importing its module on first use (later calls hit sys.modules)."""
+    return importlib.import_module(module_name).render
+
+
+def _import_pages(module_names: Iterable[str]):
+    for module_name in module_names:
+        if module_name in sys.modules:
+            continue
+        try:
+            importlib.import_module(module_name)
+        except Exception as e:
+            # The page will raise again, visibly, if someone navigates to it.
+            logger.warning(f"Could not preload {module_name}: {e}")
+
+
+def preload_pages(module_names: Iterable[str]):
+    """
+    Warms the import cache for the other pages on a daemon thread, once per process, so that later
+    navigation does not pay for the imports. Does nothing if PRELOAD_PAGES is off.
+    """
+    global _preload_started
+    if not PRELOAD_PAGES:
+        return
+    with _preload_lock:
+        if _preload_started:
+            return
+        _preload_started = True
+    threading.Thread(target=_import_pages, args=(list(module_names),), name="page-preload", daemon=True).start()
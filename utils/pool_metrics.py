@@ -0,0 +1,169 @@
+# utils/pool_metrics.py
+import collections
+import json
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger(__name__)
+
+# A checkout that waits longer than this counts as slow: a sign the pool is too small for the load.
+SLOW_CHECKOUT_SECONDS = 0.1
+RECENT_WAIT_SAMPLES = 1000
+# The running app logs get_pool_stats() as one JSON line at most this often (0 turns it off).
+POOL_STATS_LOG_SECONDS = int(os.environ.get("POOL_STATS_LOG_SECONDS", "60"))
+
+
+class PoolMetrics:
+    """Checkout wait times and occupancy for one pool, safe to update from many session threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.checkouts = 0
+        self.connects = 0
+        self.timeouts = 0
+        self.slow_checkouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.checkins = 0
+        self.total_held = 0.0
+        self.max_held = 0.0
+        self.last_logged_at = 0.0
+        self.peak_checked_out = 0
+        self.recent_waits = collections.deque(maxlen=RECENT_WAIT_SAMPLES)
+
+    def record_checkout(self, wait: float, checked_out: int):
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self.slow_checkouts += wait > SLOW_CHECKOUT_SECONDS
+            self.peak_checked_out = max(self.peak_checked_out, checked_out)
+            self.recent_waits.append(wait)
+
+    def record_checkin(self, held: float):
+        with self._lock:
+            self.checkins += 1
+            self.total_held += held
+            self.max_held = max(self.max_held, held)
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def record_connect(self):
+        with self._lock:
+            self.connects += 1
+
+
+class TimedQueuePool(QueuePool):
+    """
+    QueuePool that times how long each checkout waits for a connection and tracks occupancy.
+
+    SQLAlchemy has no event that fires before a checkout starts waiting, so the wait is timed
+    around the public Pool.connect() (which Engine.connect() goes through); connects and how long
+    connections are held come from the pool's connect/checkout/checkin events. The metrics survive
+    engine.dispose(), which replaces the pool via recreate().
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+        # recreate() passes the old pool's listeners on through _dispatch; only the first pool registers them.
+        if "_dispatch" not in kwargs:
+            metrics = self.metrics
+            event.listen(self, "connect", lambda dbapi_connection, connection_record: metrics.record_connect())
+            event.listen(self, "checkout", _stamp_checkout)
+            event.listen(self, "checkin", lambda dbapi_connection, connection_record: _record_checkin(metrics, connection_record))
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.metrics.record_timeout()
+            raise
+        self.metrics.record_checkout(time.perf_counter() - start, self.checkedout())
+        return connection
+
+
+def _stamp_checkout(dbapi_connection, connection_record, connection_proxy):
+    connection_record.info["pool_metrics_checked_out_at"] = time.perf_counter()
+
+
+def _record_checkin(metrics: PoolMetrics, connection_record):
+    checked_out_at = connection_record.info.pop("pool_metrics_checked_out_at", None) if connection_record is not None else None
+    if checked_out_at is not None:
+        metrics.record_checkin(time.perf_counter() - checked_out_at)
+
+
+def get_pool_stats(engine) -> Optional[dict]:
+    """
+    Returns the engine's pool occupancy and checkout wait statistics (waits in milliseconds),
+    or None if the engine does not use a TimedQueuePool (e.g. SQLite).
+    """
+    pool = engine.pool
+    if not isinstance(pool, TimedQueuePool):
+        return None
+    metrics = pool.metrics
+    with metrics._lock:
+        waits = sorted(metrics.recent_waits)
+        return {
+            "pool_size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "idle": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            "peak_checked_out": metrics.peak_checked_out,
+            "checkouts": metrics.checkouts,
+            "connects": metrics.connects,
+            "timeouts": metrics.timeouts,
+            "slow_checkouts": metrics.slow_checkouts,
+            "wait_avg_ms": metrics.total_wait / metrics.checkouts * 1000 if metrics.checkouts else 0.0,
+            "wait_p95_ms": waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000 if waits else 0.0,
+            "wait_max_ms": metrics.max_wait * 1000,
+            "hold_avg_ms": metrics.total_held / metrics.checkins * 1000 if metrics.checkins else 0.0,
+            "hold_max_ms": metrics.max_held * 1000,
+            "uptime_seconds": time.time() - metrics.started_at,
+        }
+
+
+def log_pool_stats(engine):
+    """
+    Logs get_pool_stats(engine) as one JSON line, at most once per POOL_STATS_LOG_SECONDS per
+    process (WARNING once checkouts have timed out). Cheap to call after every render.
+    """
+    pool = engine.pool
+    if POOL_STATS_LOG_SECONDS <= 0 or not isinstance(pool, TimedQueuePool):
+        return
+    now = time.time()
+    with pool.metrics._lock:
+        if now - pool.metrics.last_logged_at < POOL_STATS_LOG_SECONDS:
+            return
+        pool.metrics.last_logged_at = now
+    stats = get_pool_stats(engine)
+    record = {"event": "db_pool_stats", **{name: round(value, 1) if isinstance(value, float) else value for name, value in stats.items()}}
+    logger.log(logging.WARNING if stats["timeouts"] else logging.INFO, json.dumps(record))
+
+
+def render_pool_stats_panel(engine):
+    """Sidebar table of the connection pool's occupancy and checkout waits."""
+    import streamlit as st  # models imports this module; keep Streamlit out of that import path
+
+    with st.expander("🔌 Connection pool", expanded=False):
+        stats = get_pool_stats(engine)
+        if stats is None:
+            st.caption("This database does not use a timed connection pool.")
+            return
+        st.dataframe([{"Metric": name, "Value": round(value, 1) if isinstance(value, float) else value} for name, value in stats.items()],
+                     hide_index=True, use_container_width=True)
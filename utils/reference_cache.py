@@ -0,0 +1,78 @@
+# utils/reference_cache.py
+import collections
+import threading
+from typing import Tuple
+
+from sqlalchemy.orm import Session
+
+from models import InventoryItem, Supplier, Employee, Customer, StandardProductionTask, ExpenseCategory
+from utils.data_versions import (
+    INVENTORY_ITEMS, SUPPLIERS, EMPLOYEES, CUSTOMERS, PRODUCTION_TASKS, EXPENSE_CATEGORIES, get_data_version
+)
+
+# Scope -> (model, name column) of each cached per-user list.
+REFERENCE_LISTS = {
+    INVENTORY_ITEMS: (InventoryItem, InventoryItem.name),
+    SUPPLIERS: (Supplier, Supplier.name),
+    EMPLOYEES: (Employee, Employee.name),
+    CUSTOMERS: (Customer, Customer.name),
+    PRODUCTION_TASKS: (StandardProductionTask, StandardProductionTask.task_name),
+    EXPENSE_CATEGORIES: (ExpenseCategory, ExpenseCategory.name),
+}
+REFERENCE_CACHE_SIZE = 1024
+
+ReferenceOptions = Tuple[Tuple[int, str], ...]
+
+
+class ReferenceCache:
+    """Process-wide LRU of (user_id, scope) -> (version, options), shared by every session."""
+
+    def __init__(self, max_entries: int = REFERENCE_CACHE_SIZE):
+        self._lock = threading.Lock()
+        self._max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: int, scope: str, version: int):
+        with self._lock:
+            entry = self._entries.get((user_id, scope))
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((user_id, scope))
+            self.hits += 1
+            return entry[1]
+
+    def put(self, user_id: int, scope: str, version: int, options: ReferenceOptions):
+        with self._lock:
+            current = self._entries.get((user_id, scope))
+            if current is not None and current[0] > version:
+                return
+            self._entries[(user_id, scope)] = (version, options)
+            self._entries.move_to_end((user_id, scope))
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+reference_cache = ReferenceCache()
+
+
+def get_reference_options(db: Session, user_id: int, scope: str) -> ReferenceOptions:
+    """
+    The user's (id, name) pairs for a REFERENCE_LISTS scope, ordered by name. Served from memory
+    while the scope's data version is unchanged; any committed write to the model moves the version
+    (see utils/data_versions.py), so the next call reloads. The version is read before the list,
+    so a cached list is never older than the version it is stored under.
+    """
+    version = get_data_version(db, user_id, scope)
+    options = reference_cache.get(user_id, scope, version)
+    if options is None:
+        model, name_column = REFERENCE_LISTS[scope]
+        options = tuple((row_id, name) for row_id, name in db.query(model.id, name_column).filter(model.user_id == user_id).order_by(name_column, model.id))
+        reference_cache.put(user_id, scope, version, options)
+    return options
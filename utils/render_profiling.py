@@ -0,0 +1,191 @@
+# utils/render_profiling.py
+import cProfile
+import collections
+import datetime
+import io
+import json
+import logging
+import os
+import pstats
+import re
+import shutil
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+import streamlit as st
+
+from utils.sql_instrumentation import track_render
+
+logger = logging.getLogger(__name__)
+
+RENDER_PROFILE_DIR = os.environ.get("RENDER_PROFILE_DIR", os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'render_profiles')))
+# Renders at least this slow are written to RENDER_PROFILE_DIR (with a profile if one was captured).
+SLOW_RENDER_MS = int(os.environ.get("SLOW_RENDER_MS", "2000"))
+# Profile every render, not just the ones an admin asks for with ?profile=1.
+PROFILE_RENDERS = os.environ.get("PROFILE_RENDERS", "").strip().lower() in ("1", "true", "yes", "on")
+# "cprofile" (standard library) or "pyinstrument" (if installed; falls back to cProfile).
+RENDER_PROFILER = os.environ.get("RENDER_PROFILER", "cprofile").strip().lower()
+RENDER_TIMING_SAMPLES = 200
+KEEP_SLOW_RENDERS = 200
+
+
+class RenderTimings:
+    """Rolling window of recent render times per page, shared by every session in this process."""
+
+    def __init__(self, samples: int = RENDER_TIMING_SAMPLES):
+        self._lock = threading.Lock()
+        self._samples = samples
+        self._timings: Dict[str, collections.deque] = {}
+
+    def record(self, page: str, seconds: float):
+        with self._lock:
+            self._timings.setdefault(page, collections.deque(maxlen=self._samples)).append(seconds)
+
+    def percentiles(self, page: str) -> Optional[dict]:
+        """p50/p95/max of the page's recent renders in milliseconds, or None if it has not rendered yet."""
+        with self._lock:
+            timings = sorted(self._timings.get(page, ()))
+        if not timings:
+            return None
+        return {
+            "renders": len(timings),
+            "p50_ms": timings[len(timings) // 2] * 1000,
+            "p95_ms": timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000,
+            "max_ms": timings[-1] * 1000,
+        }
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            pages = list(self._timings)
+        return {page: self.percentiles(page) for page in sorted(pages)}
+
+
+render_timings = RenderTimings()
+
+
+def profiling_requested(user) -> bool:
+    """PROFILE_RENDERS is set, or an admin opened the app with ?profile=1."""
+    if PROFILE_RENDERS:
+        return True
+    return getattr(user, "role", None) == "admin" and st.query_params.get("profile", "").lower() in ("1", "true", "yes")
+
+
+class _CProfileCapture:
+    extension = "prof"
+
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+
+    def start(self):
+        self.profiler.enable()
+
+    def stop(self):
+        self.profiler.disable()
+
+    def write(self, directory: str):
+        self.profiler.dump_stats(os.path.join(directory, "profile.prof"))
+        text = io.StringIO()
+        pstats.Stats(self.profiler, stream=text).sort_stats("cumulative").print_stats(40)
+        with open(os.path.join(directory, "profile.txt"), "w") as f:
+            f.write(text.getvalue())
+
+
+class _PyinstrumentCapture:
+    extension = "html"
+
+    def __init__(self, profiler_class):
+        self.profiler = profiler_class()
+
+    def start(self):
+        self.profiler.start()
+
+    def stop(self):
+        self.profiler.stop()
+
+    def write(self, directory: str):
+        with open(os.path.join(directory, "profile.html"), "w") as f:
+            f.write(self.profiler.output_html())
+        with open(os.path.join(directory, "profile.txt"), "w") as f:
+            f.write(self.profiler.output_text())
+
+
+def _new_capture():
+    if RENDER_PROFILER == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+            return _PyinstrumentCapture(Profiler)
+        except ImportError:
+            logger.warning("RENDER_PROFILER=pyinstrument but pyinstrument is not installed; using cProfile.")
+    return _CProfileCapture()
+
+
+def _write_slow_render(page: str, user_id: int, sql_stats, capture):
+    stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    directory = os.path.join(RENDER_PROFILE_DIR, f"{stamp}_{re.sub(r'[^A-Za-z0-9]+', '_', page).strip('_')}")
+    os.makedirs(directory, exist_ok=True)
+    summary = {
+        "page": page,
+        "user_id": user_id,
+        "rendered_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "render_ms": round(sql_stats.render_seconds * 1000, 1),
+        "page_timings": render_timings.percentiles(page),
+        "sql": sql_stats.as_log_record(),
+        "sql_statements": [{"count": shape.count, "sql_ms": round(shape.seconds * 1000, 1), "origin": shape.origin, "sql": shape.sql}
+                           for shape in sorted(sql_stats.shapes.values(), key=lambda shape: -shape.seconds)],
+        "profile": None,
+    }
+    if capture is not None:
+        capture.write(directory)
+        summary["profile"] = f"profile.{capture.extension}"
+    with open(os.path.join(directory, "summary.json"), "w") as f:
+        json.dump(summary, f, indent=2, default=str)
+    _prune_slow_renders()
+    logger.warning(f"Slow render of '{page}' ({summary['render_ms']:.0f} ms) written to {directory}")
+
+
+def _prune_slow_renders():
+    entries = sorted(os.listdir(RENDER_PROFILE_DIR))
+    for name in entries[:-KEEP_SLOW_RENDERS]:
+        shutil.rmtree(os.path.join(RENDER_PROFILE_DIR, name), ignore_errors=True)
+
+
+@contextmanager
+def profile_render(page: str, user):
+    """
+    Wraps one page render: tracks its SQL (see utils/sql_instrumentation.track_render), records
+    its wall time in render_timings, profiles it when profiling_requested(user), and writes
+    renders slower than SLOW_RENDER_MS to RENDER_PROFILE_DIR. Renders cut short by st.rerun(),
+    st.stop() or an error are not timed.
+    """
+    capture = _new_capture() if profiling_requested(user) else None
+    with track_render(page, user.id) as sql_stats:
+        if capture is not None:
+            try:
+                capture.start()
+            except ValueError:
+                # Only one profiler may be active at a time (Python 3.12+): another session is profiling.
+                capture = None
+        try:
+            yield sql_stats
+        finally:
+            if capture is not None:
+                capture.stop()
+    render_timings.record(page, sql_stats.render_seconds)
+    if sql_stats.render_seconds * 1000 >= SLOW_RENDER_MS:
+        try:
+            _write_slow_render(page, user.id, sql_stats, capture)
+        except OSError as e:
+            logger.error(f"Could not write the slow render of '{page}': {e}")
+
+
+def render_timings_panel():
+    """Sidebar table of recent render times per page."""
+    with st.expander("⏱️ Render timings", expanded=False):
+        rows = [{"Page": page, "Renders": stats["renders"], "p50 ms": round(stats["p50_ms"]), "p95 ms": round(stats["p95_ms"]), "Max ms": round(stats["max_ms"])}
+                for page, stats in render_timings.snapshot().items() if stats]
+        if rows:
+            st.dataframe(rows, hide_index=True, use_container_width=True)
+        else:
+            st.caption("No renders timed yet.")
+        st.caption(f"Renders over {SLOW_RENDER_MS} ms are written to {RENDER_PROFILE_DIR}.")
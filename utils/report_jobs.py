@@ -0,0 +1,155 @@
+# utils/report_jobs.py
+import datetime
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Optional
+
+from models import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+REPORT_CACHE_DIR = os.environ.get("REPORT_CACHE_DIR", os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'report_cache')))
+REPORT_WORKERS = int(os.environ.get("REPORT_WORKERS", "2"))
+REPORT_POLL_SECONDS = 2
+
+JOB_QUEUED, JOB_RUNNING, JOB_DONE, JOB_FAILED = "queued", "running", "done", "failed"
+
+_executor = ThreadPoolExecutor(max_workers=REPORT_WORKERS, thread_name_prefix="report-job")
+_lock = threading.Lock()
+_in_flight = set()
+
+
+@contextmanager
+def _jobs_db():
+    """The local job table, committed and closed on exit. Callers hold _lock."""
+    os.makedirs(REPORT_CACHE_DIR, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(REPORT_CACHE_DIR, "jobs.sqlite3"), timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS report_jobs (
+            job_key TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            start_date TEXT NOT NULL,
+            end_date TEXT NOT NULL,
+            data_version INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            artifact_path TEXT,
+            error TEXT,
+            created_at TEXT NOT NULL,
+            finished_at TEXT
+        )""")
+    try:
+        yield conn
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def report_job_key(user_id: int, start_date: datetime.date, end_date: datetime.date, data_version: int) -> str:
+    return f"financial_{user_id}_{start_date:%Y%m%d}_{end_date:%Y%m%d}_v{data_version}"
+
+
+def _now() -> str:
+    return datetime.datetime.now().isoformat(timespec="seconds")
+
+
+def _usable(job: Optional[dict]) -> bool:
+    """A finished job whose file is gone (e.g. the cache folder was cleared) counts as missing."""
+    return job is not None and (job["status"] != JOB_DONE or os.path.exists(job["artifact_path"]))
+
+
+def get_report_job(job_key: str) -> Optional[dict]:
+    with _lock, _jobs_db() as conn:
+        row = conn.execute("SELECT * FROM report_jobs WHERE job_key = ?", (job_key,)).fetchone()
+    return dict(row) if row else None
+
+
+def find_report_job(user_id: int, start_date: datetime.date, end_date: datetime.date, data_version: int) -> Optional[dict]:
+    """The job for this report at this data version, or None if it was never requested (or its artifact is gone)."""
+    job = get_report_job(report_job_key(user_id, start_date, end_date, data_version))
+    if job and job["status"] in (JOB_QUEUED, JOB_RUNNING) and job["job_key"] not in _in_flight:
+        # Left behind by a previous app process; run it again.
+        return submit_report_job(user_id, start_date, end_date, data_version)
+    return job if _usable(job) else None
+
+
+def submit_report_job(user_id: int, start_date: datetime.date, end_date: datetime.date, data_version: int) -> dict:
+    """
+    Queues the financial report for (user, period, data version) unless it is already built or
+    being built, and returns its job row. Requests for the same key share one job and one file.
+    """
+    job_key = report_job_key(user_id, start_date, end_date, data_version)
+    with _lock:
+        with _jobs_db() as conn:
+            row = conn.execute("SELECT * FROM report_jobs WHERE job_key = ?", (job_key,)).fetchone()
+            job = dict(row) if row else None
+            if _usable(job) and (job["status"] == JOB_DONE or job_key in _in_flight):
+                return job
+            conn.execute(
+                "INSERT OR REPLACE INTO report_jobs (job_key, user_id, start_date, end_date, data_version, status, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_key, user_id, start_date.isoformat(), end_date.isoformat(), data_version, JOB_QUEUED, _now())
+            )
+        _in_flight.add(job_key)
+    _executor.submit(_run_report_job, job_key, user_id, start_date, end_date, data_version)
+    return get_report_job(job_key)
+
+
+def _set_status(job_key: str, status: str, **fields):
+    columns = {"status": status, **fields}
+    with _lock, _jobs_db() as conn:
+        conn.execute(f"UPDATE report_jobs SET {', '.join(f'{c} = ?' for c in columns)} WHERE job_key = ?", (*columns.values(), job_key))
+
+
+def _run_report_job(job_key: str, user_id: int, start_date: datetime.date, end_date: datetime.date, data_version: int):
+    artifact_path = os.path.join(REPORT_CACHE_DIR, str(user_id), f"{job_key}.xlsx")
+    try:
+        _set_status(job_key, JOB_RUNNING)
+        os.makedirs(os.path.dirname(artifact_path), exist_ok=True)
+        partial_path = f"{artifact_path}.part"
+        # Imported here so openpyxl only loads once a report is actually generated, not with the reports page.
+        from utils.excel_report import generate_excel_report
+        with SessionLocal() as db:
+            with generate_excel_report(db, user_id, start_date, end_date) as report_file, open(partial_path, "wb") as out:
+                shutil.copyfileobj(report_file, out)
+        os.replace(partial_path, artifact_path)
+        _set_status(job_key, JOB_DONE, artifact_path=artifact_path, error=None, finished_at=_now())
+    except Exception as e:
+        _set_status(job_key, JOB_FAILED, error=str(e), finished_at=_now())
+    finally:
+        with _lock:
+            _in_flight.discard(job_key)
+    # Outside the try: failing to clean up older reports must not mark this one as failed.
+    _prune_superseded(user_id, start_date, end_date, data_version)
+
+
+def _prune_superseded(user_id: int, start_date: datetime.date, end_date: datetime.date, data_version: int):
+    """
+    Removes finished reports for the same period built from older data than the newest finished
+    one (this job's data_version or later); they can never be served again. A file that cannot be
+    deleted (e.g. still open in another session on Windows) keeps its row, so a later prune retries it.
+    """
+    with _lock, _jobs_db() as conn:
+        period = (user_id, start_date.isoformat(), end_date.isoformat())
+        newest = conn.execute(
+            "SELECT MAX(data_version) FROM report_jobs WHERE user_id = ? AND start_date = ? AND end_date = ? AND status = ?", (*period, JOB_DONE)
+        ).fetchone()[0]
+        stale = conn.execute(
+            "SELECT job_key, artifact_path FROM report_jobs WHERE user_id = ? AND start_date = ? AND end_date = ? AND data_version < ? AND status IN (?, ?)",
+            (*period, max(data_version, newest or data_version), JOB_DONE, JOB_FAILED)
+        ).fetchall()
+        for row in stale:
+            if row["artifact_path"]:
+                try:
+                    os.remove(row["artifact_path"])
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    logger.warning(f"Could not remove superseded report {row['artifact_path']}: {e}")
+                    continue
+            conn.execute("DELETE FROM report_jobs WHERE job_key = ?", (row["job_key"],))
+
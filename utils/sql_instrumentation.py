@@ -0,0 +1,153 @@
+# utils/sql_instrumentation.py
+import json
+import logging
+import os
+import re
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+import streamlit as st
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# A statement shape executed more than this many times in one render is reported as a likely N+1 (lazy loads in a loop).
+SQL_REPEAT_THRESHOLD = int(os.environ.get("SQL_REPEAT_THRESHOLD", "5"))
+# Shows the per-render statement breakdown in the sidebar.
+SQL_DEBUG_PANEL = os.environ.get("SQL_DEBUG_PANEL", "").strip().lower() in ("1", "true", "yes", "on")
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+_THIS_FILE = os.path.abspath(__file__)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_PARAMETER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=2048)
+def normalize_sql(statement: str) -> str:
+    """The statement with literals replaced by ? and IN lists collapsed, so repeats of one query group together."""
+    statement = _STRING_LITERAL.sub("?", statement)
+    statement = _NUMBER_LITERAL.sub("?", statement)
+    statement = _PARAMETER_LIST.sub("(?, ...)", statement)
+    return _WHITESPACE.sub(" ", statement).strip()
+
+
+class StatementShape:
+    def __init__(self, sql: str, origin: Optional[str]):
+        self.sql = sql
+        self.origin = origin
+        self.count = 0
+        self.seconds = 0.0
+
+
+class RenderStats:
+    """Statements executed while one page rendered, grouped by normalized SQL."""
+
+    def __init__(self, page: str, user_id: Optional[int]):
+        self.page = page
+        self.user_id = user_id
+        self.statements = 0
+        self.sql_seconds = 0.0
+        self.render_seconds = 0.0
+        self.shapes: Dict[str, StatementShape] = {}
+
+    def record(self, statement: str, seconds: float):
+        sql = normalize_sql(statement)
+        shape = self.shapes.get(sql)
+        if shape is None:
+            shape = self.shapes[sql] = StatementShape(sql, _calling_location())
+        shape.count += 1
+        shape.seconds += seconds
+        self.statements += 1
+        self.sql_seconds += seconds
+
+    def repeated_shapes(self, threshold: int = SQL_REPEAT_THRESHOLD) -> List[StatementShape]:
+        return sorted((shape for shape in self.shapes.values() if shape.count > threshold), key=lambda shape: -shape.count)
+
+    def as_log_record(self, threshold: int = SQL_REPEAT_THRESHOLD) -> dict:
+        return {
+            "event": "page_render_sql",
+            "page": self.page,
+            "user_id": self.user_id,
+            "statements": self.statements,
+            "distinct_statements": len(self.shapes),
+            "sql_ms": round(self.sql_seconds * 1000, 1),
+            "render_ms": round(self.render_seconds * 1000, 1),
+            "repeated": [{"count": shape.count, "sql_ms": round(shape.seconds * 1000, 1), "origin": shape.origin, "sql": shape.sql[:500]}
+                         for shape in self.repeated_shapes(threshold)],
+        }
+
+
+_current_render: ContextVar[Optional[RenderStats]] = ContextVar("sql_render_stats", default=None)
+
+
+def _calling_location() -> Optional[str]:
+    """The innermost frame in the app's own code (not SQLAlchemy, not this module) that led to the statement."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(PROJECT_ROOT) and filename != _THIS_FILE and "site-packages" not in filename:
+            return f"{os.path.relpath(filename, PROJECT_ROOT)}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return None
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_render.get() is not None:
+        conn.info.setdefault("sql_instrumentation_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_render.get()
+    started = conn.info.get("sql_instrumentation_started")
+    if stats is not None and started:
+        stats.record(statement, time.perf_counter() - started.pop())
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute; drop its start time so the next one is timed correctly.
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("sql_instrumentation_started"):
+        connection.info["sql_instrumentation_started"].pop()
+
+
+@contextmanager
+def track_render(page: str, user_id: Optional[int] = None):
+    """
+    Counts and times every statement executed in this thread until the block exits, and logs the
+    result as one JSON line: INFO normally, WARNING when a statement shape repeats more than
+    SQL_REPEAT_THRESHOLD times.
+    """
+    stats = RenderStats(page, user_id)
+    token = _current_render.set(stats)
+    started = time.perf_counter()
+    try:
+        yield stats
+    finally:
+        stats.render_seconds = time.perf_counter() - started
+        _current_render.reset(token)
+        record = stats.as_log_record()
+        logger.log(logging.WARNING if record["repeated"] else logging.INFO, json.dumps(record))
+
+
+def render_sql_debug_panel(stats: RenderStats, threshold: int = SQL_REPEAT_THRESHOLD):
+    """Sidebar breakdown of the statements one render executed."""
+    with st.expander("🛠️ SQL debug", expanded=False):
+        st.caption(f"{stats.page}: {stats.statements} statements ({len(stats.shapes)} distinct), "
+                   f"{stats.sql_seconds * 1000:.0f} ms in SQL of {stats.render_seconds * 1000:.0f} ms")
+        for shape in stats.repeated_shapes(threshold):
+            st.warning(f"Ran {shape.count}× — likely N+1 at `{shape.origin or 'unknown'}`")
+        rows = [{"Count": shape.count, "ms": round(shape.seconds * 1000, 1), "Origin": shape.origin, "SQL": shape.sql}
+                for shape in sorted(stats.shapes.values(), key=lambda shape: (-shape.count, -shape.seconds))]
+        if rows:
+            st.dataframe(rows, hide_index=True, use_container_width=True)
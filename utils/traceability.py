@@ -0,0 +1,98 @@
+# utils/traceability.py
+from collections import defaultdict
+from decimal import Decimal
+from typing import List, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from models import (
+    BatchIngredientUsage, StockAddition, PurchaseOrder, Supplier, InventoryItem,
+    BatchRecord, ProductionRun, Product, Invoice, InvoiceLineItem, Customer
+)
+
+
+def get_traceability_graph(db: Session, user_id: int, supplier_lot_number: Optional[str] = None, batch_id: Optional[int] = None) -> dict:
+    """
+    Returns the lot -> batch -> invoice graph for a user in at most three queries
+    (lots, lot usages, invoice lines), whatever the number of lots or batches involved.
+
+    - supplier_lot_number: forward trace, starting from every lot with that supplier lot number.
+    - batch_id: backward trace, starting from the lots that went into that batch.
+    - neither: the whole graph.
+    Lots in scope bring in every batch that used them, so a backward trace also shows sibling batches.
+
+    Invoices are linked by product: a batch is considered to have possibly shipped on any invoice
+    for its product dated on or after its manufacturing date.
+
+    Returns {"lots": {lot_id: {...}}, "batches": {batch_id: {...}}, "usages": [...],
+             "invoices": {invoice_id: {...}}, "batch_invoices": {batch_id: [invoice_id, ...]}}.
+    """
+    lot_filters = [PurchaseOrder.user_id == user_id]
+    if supplier_lot_number is not None:
+        lot_filters.append(StockAddition.supplier_lot_number == supplier_lot_number)
+    if batch_id is not None:
+        lot_filters.append(StockAddition.id.in_(select(BatchIngredientUsage.stock_addition_id).where(BatchIngredientUsage.batch_record_id == batch_id)))
+
+    lot_rows = db.query(
+        StockAddition.id, StockAddition.supplier_lot_number, StockAddition.quantity_added_grams, StockAddition.quantity_remaining_grams,
+        InventoryItem.name, Supplier.name, PurchaseOrder.id, PurchaseOrder.order_date
+    ).join(PurchaseOrder, StockAddition.purchase_order_id == PurchaseOrder.id).join(InventoryItem, StockAddition.inventoryitem_id == InventoryItem.id).outerjoin(
+        Supplier, PurchaseOrder.supplier_id == Supplier.id
+    ).filter(*lot_filters).all()
+
+    lots = {
+        lot_id: {"lot_id": lot_id, "supplier_lot_number": lot_number, "item": item_name, "supplier": supplier_name or "N/A", "purchase_order_id": po_id, "order_date": order_date,
+                 "quantity_added": Decimal(str(added)), "quantity_remaining": Decimal(str(remaining)), "quantity_used": Decimal('0.0')}
+        for lot_id, lot_number, added, remaining, item_name, supplier_name, po_id, order_date in lot_rows
+    }
+    graph = {"lots": lots, "batches": {}, "usages": [], "invoices": {}, "batch_invoices": {}}
+    if not lots:
+        return graph
+
+    usage_rows = db.query(
+        BatchIngredientUsage.stock_addition_id, BatchIngredientUsage.quantity_used_grams,
+        BatchRecord.id, BatchRecord.batch_code, BatchRecord.manufacturing_date, Product.id, Product.product_name
+    ).join(BatchRecord, BatchIngredientUsage.batch_record_id == BatchRecord.id).join(ProductionRun, BatchRecord.production_run_id == ProductionRun.id).join(
+        Product, ProductionRun.product_id == Product.id
+    ).join(StockAddition, BatchIngredientUsage.stock_addition_id == StockAddition.id).join(PurchaseOrder, StockAddition.purchase_order_id == PurchaseOrder.id).filter(*lot_filters).all()
+
+    batches = graph["batches"]
+    for lot_id, qty, b_id, batch_code, mfg_date, product_id, product_name in usage_rows:
+        qty = Decimal(str(qty))
+        lots[lot_id]["quantity_used"] += qty
+        batches.setdefault(b_id, {"batch_id": b_id, "batch_code": batch_code, "manufacturing_date": mfg_date, "product_id": product_id, "product": product_name, "lot_ids": set()})["lot_ids"].add(lot_id)
+        graph["usages"].append({"lot_id": lot_id, "batch_id": b_id, "quantity_used": qty})
+    if not batches:
+        return graph
+
+    product_ids = {b["product_id"] for b in batches.values()}
+    earliest = min((b["manufacturing_date"] for b in batches.values() if b["manufacturing_date"]), default=None)
+    invoice_query = db.query(
+        Invoice.id, Invoice.invoice_number, Invoice.invoice_date, Invoice.status, Customer.name, InvoiceLineItem.product_id, func.sum(InvoiceLineItem.quantity)
+    ).join(InvoiceLineItem, InvoiceLineItem.invoice_id == Invoice.id).outerjoin(Customer, Invoice.customer_id == Customer.id).filter(
+        Invoice.user_id == user_id, InvoiceLineItem.product_id.in_(list(product_ids))
+    ).group_by(Invoice.id, Invoice.invoice_number, Invoice.invoice_date, Invoice.status, Customer.name, InvoiceLineItem.product_id)
+    if earliest:
+        invoice_query = invoice_query.filter(Invoice.invoice_date >= earliest)
+
+    invoice_lines_by_product = defaultdict(list)
+    for inv_id, number, inv_date, status, customer_name, product_id, qty in invoice_query.all():
+        invoice = graph["invoices"].setdefault(inv_id, {"invoice_id": inv_id, "invoice_number": number, "invoice_date": inv_date, "status": status.value if status else None, "customer": customer_name or "N/A", "products": {}})
+        invoice["products"][product_id] = Decimal(str(qty or 0))
+        invoice_lines_by_product[product_id].append((inv_date, inv_id))
+
+    for b_id, batch in batches.items():
+        graph["batch_invoices"][b_id] = sorted(
+            inv_id for inv_date, inv_id in invoice_lines_by_product.get(batch["product_id"], [])
+            if batch["manufacturing_date"] is None or inv_date >= batch["manufacturing_date"]
+        )
+    return graph
+
+
+def get_supplier_lot_numbers(db: Session, user_id: int) -> List[str]:
+    """Distinct supplier lot numbers a user has received, for recall lookups."""
+    rows = db.query(StockAddition.supplier_lot_number).join(PurchaseOrder).filter(
+        PurchaseOrder.user_id == user_id, StockAddition.supplier_lot_number.isnot(None), StockAddition.supplier_lot_number != ''
+    ).distinct().order_by(StockAddition.supplier_lot_number).all()
+    return [row[0] for row in rows]
@@ -0,0 +1,57 @@
+# utils/user_session.py
+from typing import Optional
+
+import streamlit as st
+
+from models import SessionLocal, User, UserLayoutEnumDef
+
+CURRENT_USER_KEY = "current_user_snapshot"
+
+
+class UserSnapshot:
+    """
+    The logged-in user's profile columns, read once per Streamlit session. Pages only read plain
+    attributes of the user (id, name, country_code, ...), so they can take this in place of a User row.
+    """
+
+    FIELDS = ("id", "username", "email", "name", "country_code", "layout_preference", "backup_retention_days", "role")
+
+    def __init__(self, id: int, username: str, email: str, name: Optional[str], country_code: Optional[str],
+                 layout_preference: UserLayoutEnumDef, backup_retention_days: int, role: Optional[str]):
+        self.id = id
+        self.username = username
+        self.email = email
+        self.name = name
+        self.country_code = country_code
+        self.layout_preference = layout_preference
+        self.backup_retention_days = backup_retention_days
+        self.role = role
+
+    def __repr__(self):
+        return f"<UserSnapshot id={self.id} username={self.username!r}>"
+
+
+def load_user_snapshot(username: str) -> Optional[UserSnapshot]:
+    with SessionLocal() as db:
+        row = db.query(*(getattr(User, field) for field in UserSnapshot.FIELDS)).filter(User.username == username).first()
+    return UserSnapshot(*row) if row else None
+
+
+def get_current_user(username: str) -> Optional[UserSnapshot]:
+    """
+    The snapshot for the logged-in user, loaded from the database only on the first rerun after
+    login (or after invalidate_current_user()); later reruns read it from st.session_state.
+    """
+    snapshot = st.session_state.get(CURRENT_USER_KEY)
+    if snapshot is None or snapshot.username != username:
+        snapshot = load_user_snapshot(username)
+        if snapshot is None:
+            st.session_state.pop(CURRENT_USER_KEY, None)
+        else:
+            st.session_state[CURRENT_USER_KEY] = snapshot
+    return snapshot
+
+
+def invalidate_current_user():
+    """Call after changing the user's row so the next rerun reloads it."""
+    st.session_state.pop(CURRENT_USER_KEY, None)